@@ -0,0 +1,76 @@
+"""Prompt-hash -> response cache for CAMEL agent steps.
+
+An in-process LRU sits in front of the ``agent_responses`` table, so a
+repeated prompt skips the model within a process and across restarts.
+Entries older than ``AGENT_CACHE_TTL_SECONDS`` are ignored and pruned; the
+table keeps at most ``AGENT_CACHE_MAX_ROWS`` rows, least recently used
+going first.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+import db
+
+AGENT_CACHE_ENABLED = os.getenv("AGENT_CACHE", "1") == "1"
+AGENT_CACHE_TTL_SECONDS = float(os.getenv("AGENT_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+AGENT_CACHE_MEMORY_SIZE = int(os.getenv("AGENT_CACHE_MEMORY_SIZE", "1024"))
+AGENT_CACHE_MAX_ROWS = int(os.getenv("AGENT_CACHE_MAX_ROWS", "50000"))
+# Prune the table once every this many stores.
+PRUNE_EVERY = 256
+
+
+class CachedResponse(NamedTuple):
+    content: str
+    tokens: int       # tokens the original call cost
+    created_at: float
+
+
+def prompt_key(agent: str, model: str, system_message: str, prompt: str) -> str:
+    return hashlib.sha256("\0".join((agent, model, system_message, prompt)).encode("utf-8")).hexdigest()
+
+
+class AgentResponseCache:
+    def __init__(self, ttl: float = AGENT_CACHE_TTL_SECONDS, memory_size: int = AGENT_CACHE_MEMORY_SIZE,
+                 max_rows: int = AGENT_CACHE_MAX_ROWS):
+        self.ttl = ttl
+        self.memory_size = memory_size
+        self.max_rows = max_rows
+        self._memory: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stores = 0
+
+    def _remember(self, key: str, entry: CachedResponse):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        oldest = time.time() - self.ttl
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry.created_at >= oldest:
+                    self._memory.move_to_end(key)
+                    return entry
+                del self._memory[key]
+        row = db.fetch_agent_response(key, oldest)
+        if row is None:
+            return None
+        entry = CachedResponse(*row)
+        with self._lock:
+            self._remember(key, entry)
+        return entry
+
+    def put(self, key: str, agent: str, content: str, tokens: int):
+        db.store_agent_response(key, agent, content, tokens)
+        with self._lock:
+            self._remember(key, CachedResponse(content, tokens, time.time()))
+            self._stores += 1
+            prune = self._stores % PRUNE_EVERY == 1
+        if prune:
+            db.prune_agent_responses(time.time() - self.ttl, self.max_rows)
@@ -1,21 +1,30 @@
+import atexit
 import os
-import sqlite3
-import json
-from datetime import datetime
-from typing import Dict, Any, List
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import lru_cache, partial
+from typing import Dict, Any, List, NamedTuple, Optional, Tuple
 from PIL import Image
-import io
-import math
-import imagehash
-from openai import OpenAI
 from dotenv import load_dotenv
-from camel.agents import ChatAgent
-from camel.models import ModelFactory
-from camel.types import ModelPlatformType, ModelType
-from camel.configs import ChatGPTConfig
-from twilio.rest import Client as TwilioClient
-import ast
-import re
+from agent_cache import AGENT_CACHE_ENABLED, AgentResponseCache, prompt_key
+from embedding_client import BatchingEmbeddingClient, EmbeddingCache
+from ann_index import backend_name, index_path, load_index, make_index, save_index
+from compaction import CompactionJob
+from geo_index import ItemPlace, PlaceIndex, make_place
+from ingest import ImageFeatures, prepare_image
+from logs import Sampler, get_logger, tracing
+from masking import POLICIES, mask_contact
+from metrics import inc, serve as serve_metrics, span
+from outbox import (
+    NotificationDispatcher, base_url_http_client, enqueue_notification, init_outbox, twilio_senders,
+)
+from phash_index import PHashIndex
+from ranking import DEFAULT_WEIGHTS, rank_candidates
+from utils import phash_to_int, phash_from_db, as_embedding_array, decode_embedding
+import db
+from db import init_db, fetch_items_by_ids, fetch_item_summaries
+
+log = get_logger("pipeline")
 
 load_dotenv("api.env")
 OPENAI_KEY = os.getenv("OPENAI_API_KEY")
@@ -24,249 +33,468 @@ TWILIO_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
 TWILIO_SMS_FROM = os.getenv("TWILIO_PHONE_NUMBER")
 TWILIO_WHATSAPP_FROM = os.getenv("TWILIO_WHATSAPP_NUMBER")
 
-client = OpenAI(api_key=OPENAI_KEY)
-_twilio_client = TwilioClient(TWILIO_SID, TWILIO_TOKEN)
-
-# ---------- Notifications ----------
-def send_notification(to_number: str, body: str, channels=["sms","whatsapp","call"]):
-    results = {}
-
-    # --- SMS ---
-    if "sms" in channels:
-        try:
-            print(f"Trying to send SMS to {to_number} from {TWILIO_SMS_FROM}")
-            sms = _twilio_client.messages.create(
-                body=body,
-                from_=TWILIO_SMS_FROM,
-                to=to_number
-            )
-            results["sms"] = f"✅ SMS sent (SID: {sms.sid})"
-            print(f"SMS sent successfully! SID: {sms.sid}")
-        except Exception as e:
-            results["sms"] = f"❌ SMS failed: {e}"
-            print(f"SMS failed: {e}")
+# Point Twilio at another host (e.g. a local stub server) for testing.
+TWILIO_API_BASE = os.getenv("TWILIO_API_BASE")
+
+# ---------- Clients ----------
+# Everything below is built on first use, and the OpenAI, Twilio and CAMEL
+# SDKs are only imported then: together they cost seconds at import time,
+# which used to delay the first Streamlit paint.
+@lru_cache(maxsize=None)
+def get_openai_client():
+    from openai import OpenAI
+    return OpenAI(api_key=OPENAI_KEY)
+
+@lru_cache(maxsize=None)
+def get_embedding_client() -> BatchingEmbeddingClient:
+    return BatchingEmbeddingClient(get_openai_client(), cache=EmbeddingCache())
+
+@lru_cache(maxsize=None)
+def get_twilio_client():
+    from twilio.rest import Client as TwilioClient
+    return TwilioClient(
+        TWILIO_SID, TWILIO_TOKEN,
+        http_client=base_url_http_client(TWILIO_API_BASE) if TWILIO_API_BASE else None
+    )
 
-    # --- WhatsApp ---
-    if "whatsapp" in channels:
-        try:
-            print(f"Trying to send WhatsApp to {to_number} from {TWILIO_WHATSAPP_FROM}")
-            whatsapp = _twilio_client.messages.create(
-                body=body,
-                from_=f"whatsapp:{TWILIO_WHATSAPP_FROM}",
-                to=f"whatsapp:{to_number}"
-            )
-            results["whatsapp"] = f"✅ WhatsApp sent (SID: {whatsapp.sid})"
-            print(f"WhatsApp sent successfully! SID: {whatsapp.sid}")
-        except Exception as e:
-            results["whatsapp"] = f"❌ WhatsApp failed: {e}"
-            print(f"WhatsApp failed: {e}")
+@lru_cache(maxsize=None)
+def get_compaction_job() -> CompactionJob:
+    return CompactionJob(on_archived=evict_items)
 
-    # --- Voice Call ---
-    if "call" in channels:
-        try:
-            print(f"Trying to make a call to {to_number} from {TWILIO_SMS_FROM}")
-            call = _twilio_client.calls.create(
-                twiml=f'<Response><Say voice="alice">{body}</Say></Response>',
-                from_=TWILIO_SMS_FROM,
-                to=to_number
-            )
-            results["call"] = f"✅ Call initiated (SID: {call.sid})"
-            print(f"Call initiated successfully! SID: {call.sid}")
-        except Exception as e:
-            results["call"] = f"❌ Call failed: {e}"
-            print(f"Call failed: {e}")
+@lru_cache(maxsize=None)
+def get_notification_dispatcher() -> NotificationDispatcher:
+    return NotificationDispatcher(
+        twilio_senders(get_twilio_client(), TWILIO_SMS_FROM, TWILIO_WHATSAPP_FROM)
+    )
 
-    return results
+# ---------- Notifications ----------
+def send_notification(to_number: str, body: str, channels=["sms","whatsapp","call"], key: str = None):
+    """Queue the message on each channel; delivery happens on the outbox workers."""
+    if not to_number:
+        return {channel: f"❌ {channel} skipped: no contact number" for channel in channels}
+    with span("notify_enqueue"):
+        return enqueue_notification(to_number, body, channels, key=key)
+
+# Matches are recorded liberally (match_pairs), but only the NOTIFY_TOP_K
+# best of an item's matches, and only those scoring NOTIFY_MIN_SCORE or
+# more, send anyone a text and a call.
+NOTIFY_TOP_K = int(os.getenv("NOTIFY_TOP_K", "3"))
+NOTIFY_MIN_SCORE = float(os.getenv("NOTIFY_MIN_SCORE", "0.75"))
+
+def eligible_for_notification(matches: List[Dict[str, Any]]) -> set:
+    """Ids of the best-first ``matches`` that are worth notifying about."""
+    return {m["id"] for m in matches[:NOTIFY_TOP_K] if m["score"] >= NOTIFY_MIN_SCORE}
+
+def match_key(lost_id: int, found_id: int) -> str:
+    """Outbox key of a pair's notification; the same whichever item came
+    second, so a lost item's owner hears about each found item once."""
+    return f"match:{lost_id}:{found_id}"
 
 # ---------- Utils ----------
 def compute_image_phash(img: Image.Image) -> str:
+    import imagehash
     return str(imagehash.phash(img))
 
 def get_text_embedding(text: str) -> list:
-    resp = client.embeddings.create(
-        model="text-embedding-3-small",
-        input=text
-    )
-    return resp.data[0].embedding
-
-def cosine_similarity(a: list, b: list) -> float:
-    dot = sum(x*y for x,y in zip(a,b))
-    norm_a = math.sqrt(sum(x*x for x in a))
-    norm_b = math.sqrt(sum(y*y for y in b))
-    if norm_a==0 or norm_b==0: return 0.0
-    return dot / (norm_a*norm_b)
-
-def phash_hamming(ph1: str, ph2: str) -> int:
-    return bin(int(ph1, 16) ^ int(ph2, 16)).count('1')
+    return get_embedding_client().embed(text).tolist()
 
 # ---------- Database ----------
-DB_PATH = "lostfound.db"
-
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS items (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        type TEXT,
-        title TEXT,
-        description TEXT,
-        owner_contact TEXT,
-        image_phash TEXT,
-        embedding_json TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    );
-    """)
-    conn.commit()
-    conn.close()
+# Thresholds and weights of the local match ranking (see ranking.RankingWeights).
+RANKING_WEIGHTS = DEFAULT_WEIGHTS
+
+# In-memory views of every item, one pair per type, kept in sync by
+# insert_item(s). A new item is matched against the opposite type.
+# Embeddings go into the ANN_BACKEND index (see ann_index).
+ANN_BACKEND = backend_name()
+INDEXES = {item_type: (make_index(ANN_BACKEND), PHashIndex()) for item_type in ("lost", "found")}
+# Where/when each item was lost or found, to prune candidates before scoring.
+PLACE_INDEXES = {item_type: PlaceIndex() for item_type in INDEXES}
+OPPOSITE_TYPE = {"lost": "found", "found": "lost"}
+
+def item_place(item: Dict[str, Any]) -> ItemPlace:
+    return make_place(item.get("latitude"), item.get("longitude"), item.get("venue"), item.get("occurred_at"))
+
+def _index_item(item_id: int, item: Dict[str, Any]):
+    indexes = INDEXES.get(item["type"].lower())
+    if indexes is None:
+        return
+    PLACE_INDEXES[item["type"].lower()].add(item_id, item_place(item))
+    embedding_index, phash_index = indexes
+    embedding = as_embedding_array(item.get("embedding"))
+    if embedding is not None:
+        embedding_index.add(item_id, embedding)
+    if item.get("image_phash"):
+        phash_index.add(item_id, phash_to_int(item["image_phash"]))
 
 def insert_item(item: Dict[str, Any]) -> int:
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("""INSERT INTO items 
-        (type, title, description, owner_contact, image_phash, embedding_json, created_at)
-        VALUES (?, ?, ?, ?, ?, ?, ?)""",
-        (item["type"], item["title"], item["description"],
-         item.get("owner_contact"), item.get("image_phash"),
-         json.dumps(item.get("embedding", [])), datetime.utcnow().isoformat()))
-    conn.commit()
-    item_id = c.lastrowid
-    conn.close()
-    return item_id
-
-def fetch_all_items() -> List[Dict[str, Any]]:
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT id, type, title, description, owner_contact, image_phash, embedding_json, created_at FROM items")
-    rows = c.fetchall()
-    conn.close()
-    return [
-        {
-            "id": r[0],
-            "type": r[1],
-            "title": r[2],
-            "description": r[3],
-            "owner_contact": r[4],
-            "image_phash": r[5],
-            "embedding": json.loads(r[6]) if r[6] else [],
-            "created_at": r[7]
-        } for r in rows
-    ]
+    return insert_items([item])[0]
+
+def insert_items(items: List[Dict[str, Any]], checkpoint=None) -> List[int]:
+    ids = db.insert_items(items, checkpoint=checkpoint)
+    for item_id, item in zip(ids, items):
+        _index_item(item_id, item)
+    return ids
+
+# Ids up to here have been read from the DB. Rows above it were written by
+# another process (e.g. bulk_import) and are indexed by refresh_indexes().
+_loaded_through = 0
+_refresh_lock = threading.Lock()
+
+def load_indexes():
+    """Fill the indexes from the DB.
+
+    Approximate indexes are expensive to build, so they are loaded from
+    their files next to the DB and only brought up to date with the rows.
+    They are saved again at exit.
+    """
+    global _loaded_through
+    # Taken first: rows committed while loading are picked up by the next refresh.
+    _loaded_through = db.max_item_id()
+    persist = ANN_BACKEND != "exact"
+    changed = False
+    for item_type, (embedding_index, phash_index) in list(INDEXES.items()):
+        place_index = PLACE_INDEXES[item_type]
+        for item_id, lat, lon, venue, occurred_at in db.fetch_places(item_type):
+            place_index.add(item_id, make_place(lat, lon, venue, occurred_at))
+        for item_id, phash_int in db.fetch_phashes(item_type):
+            phash_index.add(item_id, phash_from_db(phash_int))
+        if persist:
+            embedding_index = load_index(index_path(db.DB_PATH, item_type, ANN_BACKEND), ANN_BACKEND)
+            INDEXES[item_type] = (embedding_index, phash_index)
+        stale = set(embedding_index.ids())
+        for item_id, blob in db.fetch_embeddings(item_type):
+            stale.discard(item_id)
+            if item_id not in embedding_index:
+                changed |= embedding_index.add(item_id, decode_embedding(blob))
+        for item_id in stale:
+            changed |= embedding_index.remove(item_id)
+    if persist:
+        if changed:
+            save_indexes()
+        atexit.register(save_indexes)
+
+def refresh_indexes() -> int:
+    """Index open items that other processes added since the last load or
+    refresh; returns how many were new to this process."""
+    global _loaded_through
+    with _refresh_lock:
+        through = db.max_item_id()
+        added = 0
+        for item in db.fetch_active_items_between(_loaded_through, through):
+            place_index = PLACE_INDEXES.get(item["type"].lower())
+            # Items this process inserted itself are indexed already.
+            if place_index is not None and item["id"] not in place_index:
+                _index_item(item["id"], item)
+                added += 1
+        _loaded_through = through
+    if added:
+        log.info("indexed %d items added by other processes", added)
+    return added
+
+def evict_items(items) -> int:
+    """Drop ``(id, type)`` items from the matching indexes; returns how many were indexed."""
+    evicted = 0
+    for item_id, item_type in items:
+        indexes = INDEXES.get(item_type)
+        if indexes is None:
+            continue
+        embedding_index, phash_index = indexes
+        PLACE_INDEXES[item_type].remove(item_id)
+        had_embedding = embedding_index.remove(item_id)
+        had_phash = phash_index.remove(item_id)
+        evicted += had_embedding or had_phash
+    return evicted
+
+def set_item_status(item_id: int, status: str) -> bool:
+    """Change an item's status; only open, unexpired items stay matchable."""
+    changed = db.set_item_status([item_id], status)
+    if changed and status == "open":
+        since = db.active_since()
+        for item in fetch_items_by_ids([item_id]):
+            # Past ITEM_EXPIRY_DAYS it stays out of matching, as on a reload.
+            if item["created_at"] >= since:
+                _index_item(item_id, item)
+    elif changed:
+        evict_items(changed)
+    return bool(changed)
+
+def save_indexes():
+    for item_type, (embedding_index, _) in INDEXES.items():
+        save_index(embedding_index, index_path(db.DB_PATH, item_type, ANN_BACKEND))
 
 # ---------- AI Agents ----------
-model = ModelFactory.create(
-    model_platform=ModelPlatformType.OPENAI,
-    model_type=ModelType.GPT_4O_MINI,
-    model_config_dict=ChatGPTConfig(temperature=0).as_dict(),
-)
-
-embed_agent = ChatAgent(
-    system_message="You are EmbedAgent. Return a JSON array of floats ONLY for embedding, no explanation.",
-    model=model
-)
+AGENT_MODEL = "gpt-4o-mini"
+# Upper bound on the context a single agent call may carry.
+AGENT_CONTEXT_TOKENS = int(os.getenv("AGENT_CONTEXT_TOKENS", "4096"))
+
+@lru_cache(maxsize=None)
+def get_model():
+    from camel.configs import ChatGPTConfig
+    from camel.models import ModelFactory
+    from camel.types import ModelPlatformType, ModelType
+    return ModelFactory.create(
+        model_platform=ModelPlatformType.OPENAI,
+        model_type=ModelType(AGENT_MODEL),
+        model_config_dict=ChatGPTConfig(temperature=0).as_dict(),
+    )
 
-matcher_agent = ChatAgent(
-    system_message="""You are MatcherAgent. Return JSON array of matching items with fields:
-id, title, description, score, reasons, owner_contact. NO extra text.""",
-    model=model
-)
+@lru_cache(maxsize=None)
+def get_agent_cache():
+    return AgentResponseCache() if AGENT_CACHE_ENABLED else None
+
+class AgentReply(NamedTuple):
+    content: str
+    tokens: int
+    cached: bool
+
+def agent_step(agent: str, system_message: str, prompt: str) -> AgentReply:
+    """One stateless agent call, answered from the response cache when possible.
+
+    Every call gets a fresh ChatAgent: its memory holds only the system
+    message and this prompt, so cost does not grow with the process's
+    history, and concurrent callers never share (non-thread-safe) memory.
+    """
+    cache = get_agent_cache()
+    key = prompt_key(agent, AGENT_MODEL, system_message, prompt)
+    hit = cache.get(key) if cache else None
+    if hit is not None:
+        inc("agent_cache", agent=agent, result="hit")
+        inc("llm_tokens_saved", hit.tokens, agent=agent)
+        log.debug("%s agent: cache hit (saved %d tokens)", agent, hit.tokens)
+        return AgentReply(hit.content, 0, True)
+    from camel.agents import ChatAgent
+    chat = ChatAgent(system_message=system_message, model=get_model(), token_limit=AGENT_CONTEXT_TOKENS)
+    with span(f"{agent}_agent"):
+        resp = chat.step(prompt)
+    usage = (resp.info or {}).get("usage") or {}
+    tokens = usage.get("total_tokens", 0)
+    inc("llm_requests", agent=agent)
+    inc("llm_tokens", tokens, agent=agent)
+    log.info("%s agent: %s prompt + %s completion tokens", agent,
+             usage.get("prompt_tokens", "?"), usage.get("completion_tokens", "?"))
+    content = resp.msg.content.strip()
+    if cache:
+        inc("agent_cache", agent=agent, result="miss")
+        cache.put(key, agent, content, tokens)
+    return AgentReply(content, tokens, False)
+
+PRIVACY_SYSTEM_MESSAGE = "You are PrivacyAgent. Take a contact string and return an anonymized version ONLY."
+
+# Masking is local and deterministic; the LLM is only consulted, when enabled,
+# for contacts that are neither a phone number nor an email address.
+CONTACT_MASK_POLICY = POLICIES[os.getenv("CONTACT_MASK_POLICY", "default")]
+PRIVACY_AGENT_FALLBACK = os.getenv("PRIVACY_AGENT_FALLBACK", "0") == "1"
+
+def anonymize_contact(contact: str) -> str:
+    masked = mask_contact(contact or "", CONTACT_MASK_POLICY)
+    if masked is not None:
+        return masked
+    if not PRIVACY_AGENT_FALLBACK:
+        return "Hidden"
+    return agent_step("privacy", PRIVACY_SYSTEM_MESSAGE, f"Anonymize contact: {contact}").content
 
-privacy_agent = ChatAgent(
-    system_message="You are PrivacyAgent. Take a contact string and return an anonymized version ONLY.",
-    model=model
-)
+# ---------- Coordinator ----------
+# Per-candidate match traces are sampled (LOG_TRACE_SAMPLE_RATE) at DEBUG.
+_match_sampler = Sampler()
 
-notifier_agent = ChatAgent(
-    system_message="You are NotifierAgent. Send SMS, WhatsApp & Calls via Twilio. Return JSON with success/failure info ONLY.",
-    model=model
-)
+# Per-match work (contact masking + notifications) runs on this bounded pool.
+FANOUT_WORKERS = int(os.getenv("FANOUT_WORKERS", "6"))
+FANOUT_DEADLINE_SECONDS = float(os.getenv("FANOUT_DEADLINE_SECONDS", "20"))
+_fanout_pool = ThreadPoolExecutor(FANOUT_WORKERS, thread_name_prefix="fanout")
 
-# ---------- Coordinator ----------
 class Coordinator:
-    def __init__(self):
+    def __init__(self, dispatch: bool = True):
         init_db()
-
-    def _safe_parse(self, text: str):
-        try:
-            return json.loads(text)
-        except:
-            try:
-                return ast.literal_eval(text)
-            except:
-                m = re.search(r'(\{.*\}|\[.*\])', text, re.DOTALL)
-                if m:
-                    try:
-                        return json.loads(m.group(1))
-                    except:
-                        try:
-                            return ast.literal_eval(m.group(1))
-                        except:
-                            return []
-                return []
-
-    def run_pipeline(self, image_bytes: bytes, title: str, description: str, item_type: str, contact: str):
+        init_outbox()
+        load_indexes()
+        # Without a dispatcher, notifications stay queued in the outbox until
+        # a process that has one (e.g. the app) picks them up.
+        if dispatch:
+            get_notification_dispatcher().start()
+            get_compaction_job().start()
+        serve_metrics()
+
+    def acknowledge(self, item_id: int, item_type: str, title: str, contact: str):
+        if contact and item_type.lower() == "lost":
+            friendly_msg = (
+                f"Sorry to hear that 😔, your item '{title}' has been safely recorded. "
+                "I will notify you immediately if a match is found! 📦"
+            )
+            send_notification(contact, friendly_msg, channels=["sms","whatsapp","call"],
+                              key=f"lost-recorded:{item_id}")
+
+    def match_and_notify(self, item_id: int, item_type: str, contact: str, embedding, phash: str,
+                         timings: Dict[str, float], notify: bool = True, place: Optional[ItemPlace] = None):
+        """Rank opposite-type candidates for a stored item and notify the lost item's owner.
+
+        With a ``place``, only candidates that could have been lost/found
+        nearby and around the same time (see geo_index) are considered.
+
+        Each (lost, found) pair is recorded in ``match_pairs``; those
+        ``eligible_for_notification`` are notified under their ``match_key``,
+        so matching an item again (e.g. when an import resumes after a crash
+        between the two) queues only what was not queued before. Returns the
+        match records and, for found items, the notification status per
+        matched lost id.
+        """
+        item_type = item_type.lower()
+        matches = []
+        notified: Dict[int, Dict[str, str]] = {}
+        if item_type not in OPPOSITE_TYPE:
+            return matches, notified
+        embedding_index, phash_index = INDEXES[OPPOSITE_TYPE[item_type]]
+        with span("match", timings):
+            allowed = PLACE_INDEXES[OPPOSITE_TYPE[item_type]].candidates(place, OPPOSITE_TYPE[item_type]) \
+                if place is not None else None
+            if allowed is not None:
+                # The place index also holds items without an embedding.
+                inc("match_prefiltered", len(embedding_index) - sum(1 for i in allowed if i in embedding_index))
+            # Candidates come from index queries and are scored locally;
+            # nothing scans every item or goes to an LLM.
+            matches = rank_candidates(
+                embedding, phash_to_int(phash) if phash else None, embedding_index, phash_index,
+                partial(fetch_item_summaries, open_only=True), weights=RANKING_WEIGHTS, allowed=allowed
+            )
+            pairs = [
+                ((item_id, m["id"]) if item_type == "lost" else (m["id"], item_id), m) for m in matches
+            ]
+            new_pairs = db.record_match_pairs([
+                (lost_id, found_id, m["score"], m["text_similarity"], m["phash_distance"])
+                for (lost_id, found_id), m in pairs
+            ])
+        log.info("item %s (%s): %d candidate matches, %d new", item_id, item_type, len(pairs), len(new_pairs))
+        trace = _match_sampler if tracing(log) else None
+        eligible = eligible_for_notification(matches) if notify else set()
+        for (lost_id, found_id), m in pairs:
+            if trace and trace():
+                log.debug("match %s → %s item %s %r: diff=%s sim=%s score=%s", item_id, m["type"], m["id"],
+                          m["title"], m["phash_distance"], m["text_similarity"], m["score"])
+            if m["id"] not in eligible:
+                continue
+            if item_type == "found":
+                notify_msg = (
+                    f"🎉 Good news! Your lost item '{m['title']}' might have been found by someone. "
+                    f"Contact info of finder: {contact}"
+                )
+                notified[lost_id] = send_notification(
+                    m['owner_contact'], notify_msg, channels=["sms","whatsapp","call"],
+                    key=match_key(lost_id, found_id)
+                )
+            else:
+                notify_msg = (
+                    f"🎉 Good news! Someone already reported finding '{m['title']}', which may be your item. "
+                    f"Contact info of finder: {m['owner_contact']}"
+                )
+                send_notification(
+                    contact, notify_msg, channels=["sms","whatsapp","call"],
+                    key=match_key(lost_id, found_id)
+                )
+        return matches, notified
+
+    def _process_match(self, m: Dict[str, Any], item_id: int, title: str, contact: str,
+                       notified: Dict[int, Dict[str, str]], eligible: set) -> Dict[str, Any]:
+        with span("mask_contact"):
+            masked = anonymize_contact(m.get('owner_contact', ''))
+        notif_status = notified.get(m.get('id'), {})
+        if m.get("owner_contact") and m.get('id') in eligible and m.get('id') not in notified:
+            notif_status = send_notification(
+                m['owner_contact'],
+                f"Possible match for {title}. Contact of reporter: {contact}",
+                channels=["sms","whatsapp","call"],
+                key=f"possible-match:{item_id}:{m.get('id')}"
+            )
+        return {"match": m, "masked_contact": masked, "notif_status": notif_status}
+
+    def _fan_out(self, matches: List[Dict[str, Any]], item_id: int, title: str, contact: str,
+                 notified: Dict[int, Dict[str, str]]) -> List[Dict[str, Any]]:
+        """Process matches concurrently; anything unfinished at the deadline is
+        returned without a masked contact rather than holding up the response."""
+        eligible = eligible_for_notification(matches)
+        futures = [_fanout_pool.submit(self._process_match, m, item_id, title, contact, notified, eligible)
+                   for m in matches]
+        wait(futures, timeout=FANOUT_DEADLINE_SECONDS)
+        results = []
+        for m, fut in zip(matches, futures):
+            if fut.done() and fut.exception() is None:
+                results.append(fut.result())
+                continue
+            if not fut.done():
+                fut.cancel()
+            error = "timed out" if not fut.done() or fut.cancelled() else str(fut.exception())
+            log.warning("match %s incomplete: %s", m.get('id'), error)
+            results.append({"match": m, "masked_contact": "Not available", "notif_status": {}, "error": error})
+        return results
+
+    def run_pipeline(self, image_bytes: bytes, title: str, description: str, item_type: str, contact: str,
+                     latitude: Optional[float] = None, longitude: Optional[float] = None,
+                     venue: Optional[str] = None, occurred_at=None,
+                     prepared: Optional[Tuple[ImageFeatures, str]] = None):
+        """Store, match and notify one report.
+
+        The location (``latitude``/``longitude`` and/or ``venue``) and
+        ``occurred_at`` (when it was lost or found) are optional; when given
+        they narrow matching to nearby, plausible items. ``prepared`` is the
+        ``ingest.prepare_image`` result when the image work was already done
+        elsewhere (e.g. in the API's process pool).
+        """
+        timings: Dict[str, float] = {}
+        location = {"latitude": latitude, "longitude": longitude, "venue": venue, "occurred_at": occurred_at}
         try:
-            
-            img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-            phash = str(imagehash.phash(img))
-            print(f"[DEBUG] Computed PHASH: {phash}")
-
-           
-            emb_resp = embed_agent.step(f"Generate embedding for title: {title}, description: {description}")
-            embedding = self._safe_parse(emb_resp.msg.content)
-
-            
+            with span("total", timings):
+                result = self._run_pipeline(image_bytes, title, description, item_type, contact, location,
+                                            prepared, timings)
+            inc("pipeline_runs", outcome="ok", type=item_type.lower())
+            return result
+        except Exception as e:
+            inc("pipeline_runs", outcome="error", type=item_type.lower())
+            return {"error": f"Pipeline failed: {e}", "timings": timings}
+        finally:
+            log.info("timings %s", timings)
+
+    def _run_pipeline(self, image_bytes: bytes, title: str, description: str, item_type: str, contact: str,
+                      location: Dict[str, Any], prepared: Optional[Tuple[ImageFeatures, str]],
+                      timings: Dict[str, float]):
+        if prepared is None:
+            with span("image", timings):
+                image, image_sha256 = prepare_image(image_bytes)
+        else:
+            image, image_sha256 = prepared
+        phash = image.phash
+        log.debug("computed pHash %s (%s)", phash, image.stats)
+
+        with span("embed", timings):
+            embedding = get_embedding_client().embed(f"{title}\n{description or ''}")
+
+        with span("db_insert", timings):
             item_id = insert_item({
                 "type": item_type,
                 "title": title,
                 "description": description,
                 "owner_contact": contact,
                 "image_phash": phash,
-                "embedding": embedding
+                "image_dhash": image.dhash,
+                "color_hist": image.color_hist,
+                "image_sha256": image_sha256,
+                "embedding": embedding,
+                **location,
             })
 
-            if contact and item_type.lower() == "lost":
-                friendly_msg = (
-                    f"Sorry to hear that 😔, your item '{title}' has been safely recorded. "
-                    "I will notify you immediately if a match is found! 📦"
-                )
-                send_notification(contact, friendly_msg, channels=["sms","whatsapp","call"])
-
-            if item_type.lower() == "found":
-                all_lost_items = [item for item in fetch_all_items() if item['type'].lower() == 'lost']
-                for lost_item in all_lost_items:
-                    phash_diff = phash_hamming(phash, lost_item['image_phash'])
-                    sim = cosine_similarity(embedding, lost_item['embedding'])
-                    print(f"[DEBUG] Comparing with lost item {lost_item['title']} | diff={phash_diff}, sim={sim}")
-
-                    if phash_diff < 20 or sim > 0.6:
-                        print(f"[MATCH FOUND] Lost item {lost_item['title']} → diff={phash_diff}, sim={sim}")
-                        notify_msg = (
-                            f"🎉 Good news! Your lost item '{lost_item['title']}' might have been found by someone. "
-                            f"Contact info of finder: {contact}"
-                        )
-                        send_notification(lost_item['owner_contact'], notify_msg, channels=["sms","whatsapp","call"])
-
-
-            match_resp = matcher_agent.step(f"Find matches for type {item_type}, PHASH {phash}, embedding {embedding}")
-            matches = self._safe_parse(match_resp.msg.content)
-
-            results = []
-            for m in matches[:3]:
-                masked_contact_resp = privacy_agent.step(f"Anonymize contact: {m.get('owner_contact','')}")
-                masked = masked_contact_resp.msg.content.strip()
-                notif_status = {}
-                if m.get("owner_contact"):
-                    notif_status = send_notification(
-                        m['owner_contact'],
-                        f"Possible match for {title}. Contact of reporter: {contact}",
-                        channels=["sms","whatsapp","call"]
-                    )
-                results.append({"match": m, "masked_contact": masked, "notif_status": notif_status})
-
-            return {"item_id": item_id, "matches": results}
+        self.acknowledge(item_id, item_type, title, contact)
+        matches, notified = self.match_and_notify(item_id, item_type, contact, embedding, phash, timings,
+                                                  place=item_place(location))
 
-        except Exception as e:
-            return {"error": f"Pipeline failed: {e}"}
+        with span("fanout", timings):
+            results = self._fan_out(matches[:3], item_id, title, contact, notified)
+
+        return {"item_id": item_id, "image_sha256": image_sha256, "matches": results, "timings": timings,
+                "image": image.stats}
+
+@lru_cache(maxsize=None)
+def get_coordinator() -> Coordinator:
+    return Coordinator()
 
-coordinator = Coordinator()
+def __getattr__(name: str):
+    # Keeps `from agents import coordinator` working without building it at import.
+    if name == "coordinator":
+        return get_coordinator()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
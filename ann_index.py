@@ -0,0 +1,447 @@
+"""Approximate nearest-neighbour backends with the EmbeddingIndex interface.
+
+Every backend offers ``add``, ``add_many``, ``remove``, ``get``, ``ids``,
+``search(query, k, min_score)``, ``save`` and ``load``, so ranking code can
+use any of them. Pick one with ``ANN_BACKEND``:
+
+- ``exact``: EmbeddingIndex, one matrix-vector product per query.
+- ``ivf``: pure-NumPy inverted file. Vectors are bucketed under k-means
+  centroids and a query only scans the ``nprobe`` closest buckets.
+- ``hnsw``: hnswlib graph index, if the library is installed.
+"""
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from embedding_index import EmbeddingIndex, normalize
+from logs import get_logger
+
+log = get_logger("ann")
+
+ANN_BACKEND = os.getenv("ANN_BACKEND", "exact")
+IVF_NPROBE = int(os.getenv("ANN_IVF_NPROBE", "8"))
+# Below this many vectors an IVF index just scans everything.
+IVF_MIN_TRAIN = int(os.getenv("ANN_IVF_MIN_TRAIN", "20000"))
+HNSW_EF = int(os.getenv("ANN_HNSW_EF", "128"))
+# Neighbours fetched when a caller asks for "everything above min_score".
+DEFAULT_SEARCH_K = int(os.getenv("ANN_SEARCH_K", "200"))
+
+
+# ---------- Exact ----------
+class ExactIndex(EmbeddingIndex):
+    """EmbeddingIndex with the persistence methods of the other backends."""
+
+    def save(self, path: str):
+        with self._lock:
+            np.savez(path, ids=self._ids[:self._size], vectors=self._matrix[:self._size]
+                     if self._matrix is not None else np.empty((0, 0), dtype=np.float32))
+
+    @classmethod
+    def load(cls, path: str) -> "ExactIndex":
+        data = np.load(path)
+        index = cls(capacity=max(len(data["ids"]), 1024))
+        index.add_many(zip(data["ids"].tolist(), data["vectors"]))
+        return index
+
+
+# ---------- IVF ----------
+def spherical_kmeans(vectors: np.ndarray, nlist: int, iterations: int = 10,
+                     seed: int = 0) -> np.ndarray:
+    """Unit-length centroids of ``nlist`` clusters under cosine similarity."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, vectors)
+        counts = np.bincount(assign, minlength=nlist)
+        empty = counts == 0
+        # Re-seed empty clusters from random points rather than losing them.
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = sums / np.maximum(norms, 1e-12)
+    return centroids.astype(np.float32)
+
+
+class IVFIndex:
+    """Inverted-file index: each vector lives in the list of its nearest centroid.
+
+    The index is exact until it holds ``min_train`` vectors. It then trains
+    about ``4 * sqrt(n)`` centroids on a sample and redistributes the vectors.
+    It retrains whenever it has grown ``retrain_factor`` times since the
+    last training. That retraining runs on a background thread. Adds,
+    removes and searches carry on against the current lists meanwhile, and
+    the new lists are swapped in once they are built.
+    """
+
+    def __init__(self, nprobe: int = IVF_NPROBE, min_train: int = IVF_MIN_TRAIN,
+                 nlist: Optional[int] = None, retrain_factor: float = 4.0):
+        self.nprobe = nprobe
+        self.min_train = min_train
+        self.nlist = nlist
+        self.retrain_factor = retrain_factor
+        self.dim: Optional[int] = None
+        self.centroids: Optional[np.ndarray] = None
+        self._lists: List[EmbeddingIndex] = [EmbeddingIndex()]
+        self._where: Dict[int, int] = {}
+        self._trained_size = 0
+        self._training: Optional[threading.Thread] = None
+        # Ids added or removed while a training runs, replayed at the swap.
+        self._changed: Optional[set] = None
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def __contains__(self, item_id: int) -> bool:
+        return item_id in self._where
+
+    def ids(self) -> List[int]:
+        with self._lock:
+            return list(self._where)
+
+    def _list_for(self, vec: np.ndarray) -> int:
+        return 0 if self.centroids is None else int(np.argmax(self.centroids @ vec))
+
+    def add(self, item_id: int, embedding: Sequence[float]) -> bool:
+        vec = normalize(embedding)
+        if vec is None:
+            return False
+        with self._lock:
+            if self.dim is None:
+                self.dim = vec.size
+            if vec.size != self.dim:
+                return False
+            old = self._where.get(item_id)
+            target = self._list_for(vec)
+            if old is not None and old != target:
+                self._lists[old].remove(item_id)
+            self._lists[target].add(item_id, vec)
+            self._where[item_id] = target
+            if self._changed is not None:
+                self._changed.add(item_id)
+            if self._training is None and \
+                    len(self._where) >= max(self.min_train, self._trained_size * self.retrain_factor):
+                self._training = threading.Thread(target=self._train_in_background, name="ivf-train",
+                                                  daemon=True)
+                self._training.start()
+            return True
+
+    def add_many(self, items: Iterable[Tuple[int, Sequence[float]]]) -> int:
+        added = 0
+        for item_id, embedding in items:
+            added += self.add(item_id, embedding)
+        return added
+
+    def remove(self, item_id: int) -> bool:
+        with self._lock:
+            where = self._where.pop(item_id, None)
+            if where is not None and self._changed is not None:
+                self._changed.add(item_id)
+            return where is not None and self._lists[where].remove(item_id)
+
+    def get(self, item_id: int) -> Optional[np.ndarray]:
+        with self._lock:
+            where = self._where.get(item_id)
+            return None if where is None else self._lists[where].get(item_id)
+
+    def _all(self) -> Tuple[List[int], np.ndarray]:
+        """Copies of every id and vector, list by list (call with the lock held)."""
+        ids, blocks = [], []
+        for lst in self._lists:
+            with lst._lock:
+                ids.extend(lst._ids[:lst._size].tolist())
+                if lst._size:
+                    blocks.append(lst._matrix[:lst._size].copy())
+        return ids, np.concatenate(blocks) if blocks else np.empty((0, 0))
+
+    def train(self, sample: int = 65536):
+        """Retrain the centroids and redistribute every vector.
+
+        Only the snapshot at the start and the final swap hold the lock; the
+        k-means and the redistribution run without it.
+        """
+        with self._lock:
+            ids, vectors = self._all()
+            self._changed = set()
+        try:
+            if not ids:
+                return
+            nlist = self.nlist or max(1, int(4 * np.sqrt(len(ids))))
+            nlist = min(nlist, len(ids))
+            rng = np.random.default_rng(0)
+            train_set = vectors[rng.choice(len(ids), min(sample, len(ids)), replace=False)]
+            centroids = spherical_kmeans(train_set, nlist)
+            lists, where = self._build_lists(centroids, ids, vectors)
+            # Bring the new lists up to date with what changed meanwhile: in
+            # rounds without the lock, and the last few under it with the swap.
+            while True:
+                with self._lock:
+                    changed, self._changed = self._changed, set()
+                    current = {i: self._lists[self._where[i]].get(i) for i in changed if i in self._where}
+                    if len(changed) <= 1024:
+                        self._replay(centroids, lists, where, changed, current)
+                        self.centroids, self._lists, self._where = centroids, lists, where
+                        self._trained_size = len(where)
+                        return
+                self._replay(centroids, lists, where, changed, current)
+        finally:
+            with self._lock:
+                self._changed = None
+
+    @staticmethod
+    def _replay(centroids: np.ndarray, lists: List[EmbeddingIndex], where: Dict[int, int],
+                changed: set, current: Dict[int, np.ndarray]):
+        for item_id in changed:
+            old = where.pop(item_id, None)
+            if old is not None:
+                lists[old].remove(item_id)
+        if current:
+            ids = list(current)
+            vectors = np.stack([current[i] for i in ids])
+            for item_id, vec, target in zip(ids, vectors, np.argmax(vectors @ centroids.T, axis=1)):
+                lists[target].add(item_id, vec)
+                where[item_id] = int(target)
+
+    def _train_in_background(self):
+        try:
+            start = time.perf_counter()
+            self.train()
+            log.info("ivf retrained on %d vectors in %.1f s", self._trained_size, time.perf_counter() - start)
+        except Exception:
+            log.exception("ivf training failed")
+        finally:
+            with self._lock:
+                self._training = None
+
+    def wait_for_training(self, timeout: Optional[float] = None):
+        """Block until a background retraining, if one is running, has finished."""
+        thread = self._training
+        if thread is not None:
+            thread.join(timeout)
+
+    def _build_lists(self, centroids: np.ndarray, ids: List[int],
+                     vectors: np.ndarray) -> Tuple[List[EmbeddingIndex], Dict[int, int]]:
+        lists = [EmbeddingIndex(self.dim, capacity=16) for _ in range(len(centroids))]
+        where: Dict[int, int] = {}
+        # Assign in chunks so the score matrix stays small.
+        for start in range(0, len(ids), 8192):
+            chunk = vectors[start:start + 8192]
+            for item_id, vec, target in zip(ids[start:start + 8192], chunk,
+                                            np.argmax(chunk @ centroids.T, axis=1)):
+                lists[target].add(item_id, vec)
+                where[item_id] = int(target)
+        return lists, where
+
+    def search(self, query: Sequence[float], k: Optional[int] = None,
+               min_score: Optional[float] = None) -> List[Tuple[int, float]]:
+        q = normalize(query)
+        with self._lock:
+            if q is None or not self._where or q.size != self.dim:
+                return []
+            if self.centroids is None:
+                probes = [0]
+            else:
+                scores = self.centroids @ q
+                n = min(self.nprobe, len(scores))
+                probes = np.argpartition(-scores, n - 1)[:n]
+            hits = []
+            for p in probes:
+                hits.extend(self._lists[p].search(q, k, min_score))
+        hits.sort(key=lambda h: -h[1])
+        return hits[:k] if k is not None else hits
+
+    def save(self, path: str):
+        with self._lock:
+            ids, vectors = self._all()
+            np.savez(path, ids=np.asarray(ids, dtype=np.int64), vectors=vectors,
+                     centroids=self.centroids if self.centroids is not None else np.empty((0, 0)),
+                     meta=np.array([self.nprobe, self.min_train, self._trained_size]))
+
+    @classmethod
+    def load(cls, path: str) -> "IVFIndex":
+        data = np.load(path)
+        nprobe, min_train, trained_size = (int(v) for v in data["meta"])
+        index = cls(nprobe=nprobe, min_train=min_train)
+        ids = data["ids"].tolist()
+        if not ids:
+            return index
+        index.dim = data["vectors"].shape[1]
+        index._trained_size = trained_size
+        if data["centroids"].size:
+            index.centroids = data["centroids"].astype(np.float32)
+            index._lists, index._where = index._build_lists(index.centroids, ids, data["vectors"])
+        else:
+            index._lists[0].add_many(zip(ids, data["vectors"]))
+            index._where = dict.fromkeys(ids, 0)
+        return index
+
+
+# ---------- HNSW ----------
+class HNSWIndex:
+    """hnswlib graph over cosine distance.
+
+    Removals are lazy deletes (the node stays in the graph for routing but
+    is never returned); a removed id that comes back is revived in place.
+    """
+
+    def __init__(self, dim: Optional[int] = None, capacity: int = 1024, ef: int = HNSW_EF,
+                 m: int = 16, ef_construction: int = 200):
+        import hnswlib  # optional dependency
+        self._hnswlib = hnswlib
+        self.dim = dim
+        self.ef = ef
+        self.m = m
+        self.ef_construction = ef_construction
+        self._capacity = capacity
+        self._index = None
+        self._live: set = set()
+        self._deleted: set = set()
+        self._lock = threading.RLock()
+        if dim:
+            self._init(dim)
+
+    def _init(self, dim: int):
+        self.dim = dim
+        self._index = self._hnswlib.Index(space="cosine", dim=dim)
+        self._index.init_index(max_elements=self._capacity, ef_construction=self.ef_construction,
+                               M=self.m)
+        self._index.set_ef(self.ef)
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    def __contains__(self, item_id: int) -> bool:
+        return item_id in self._live
+
+    def ids(self) -> List[int]:
+        with self._lock:
+            return list(self._live)
+
+    def add(self, item_id: int, embedding: Sequence[float]) -> bool:
+        vec = normalize(embedding)
+        if vec is None:
+            return False
+        with self._lock:
+            if self._index is None:
+                self._init(vec.size)
+            if vec.size != self.dim:
+                return False
+            if item_id in self._deleted:
+                self._index.unmark_deleted(item_id)
+                self._deleted.discard(item_id)
+            elif item_id not in self._live and self._index.get_current_count() >= self._index.get_max_elements():
+                self._index.resize_index(self._index.get_max_elements() * 2)
+            # Existing ids are updated in place.
+            self._index.add_items(vec[None, :], np.array([item_id]))
+            self._live.add(item_id)
+            return True
+
+    def add_many(self, items: Iterable[Tuple[int, Sequence[float]]]) -> int:
+        added = 0
+        for item_id, embedding in items:
+            added += self.add(item_id, embedding)
+        return added
+
+    def remove(self, item_id: int) -> bool:
+        with self._lock:
+            if item_id not in self._live:
+                return False
+            self._index.mark_deleted(item_id)
+            self._live.discard(item_id)
+            self._deleted.add(item_id)
+            return True
+
+    def get(self, item_id: int) -> Optional[np.ndarray]:
+        with self._lock:
+            if item_id not in self._live:
+                return None
+            return np.asarray(self._index.get_items([item_id])[0], dtype=np.float32)
+
+    def search(self, query: Sequence[float], k: Optional[int] = None,
+               min_score: Optional[float] = None) -> List[Tuple[int, float]]:
+        q = normalize(query)
+        with self._lock:
+            if q is None or not self._live or q.size != self.dim:
+                return []
+            n = min(k or DEFAULT_SEARCH_K, len(self._live))
+            self._index.set_ef(max(self.ef, n))
+            labels, distances = self._index.knn_query(q[None, :], k=n)
+        hits = [(int(i), 1.0 - float(d)) for i, d in zip(labels[0], distances[0])]
+        if min_score is not None:
+            hits = [h for h in hits if h[1] > min_score]
+        return hits
+
+    def save(self, path: str):
+        with self._lock:
+            if self._index is None:
+                return
+            self._index.save_index(path)
+            np.savez(path + ".meta.npz", dim=self.dim, live=np.fromiter(self._live, dtype=np.int64),
+                     deleted=np.fromiter(self._deleted, dtype=np.int64))
+
+    @classmethod
+    def load(cls, path: str) -> "HNSWIndex":
+        meta = np.load(path + ".meta.npz")
+        index = cls()
+        index.dim = int(meta["dim"])
+        index._index = index._hnswlib.Index(space="cosine", dim=index.dim)
+        index._index.load_index(path)
+        index._index.set_ef(index.ef)
+        index._live = set(meta["live"].tolist())
+        index._deleted = set(meta["deleted"].tolist())
+        return index
+
+
+# ---------- Factory ----------
+BACKENDS = {"exact": ExactIndex, "ivf": IVFIndex, "hnsw": HNSWIndex}
+
+
+def backend_name(name: Optional[str] = None) -> str:
+    name = (name or ANN_BACKEND).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown ANN backend {name!r}; choose one of {sorted(BACKENDS)}")
+    if name == "hnsw":
+        try:
+            import hnswlib  # noqa: F401
+        except ImportError:
+            log.warning("hnswlib is not installed; using the ivf backend")
+            return "ivf"
+    return name
+
+
+def make_index(name: Optional[str] = None):
+    return BACKENDS[backend_name(name)]()
+
+
+def index_path(db_path: str, item_type: str, name: Optional[str] = None) -> str:
+    """Where the index for ``item_type`` is persisted, next to the database."""
+    return f"{os.path.splitext(db_path)[0]}.{item_type}.{backend_name(name)}.idx"
+
+
+def load_index(path: str, name: Optional[str] = None):
+    """The index saved at ``path``, or an empty one if there is none (or it is unreadable)."""
+    cls = BACKENDS[backend_name(name)]
+    stored = path + ".npz" if cls is not HNSWIndex else path
+    if os.path.exists(stored):
+        try:
+            return cls.load(stored)
+        except Exception as e:
+            log.warning("could not load %s, rebuilding: %s", stored, e)
+    return cls()
+
+
+def save_index(index, path: str):
+    """Write atomically so a crash mid-save never leaves a truncated index."""
+    tmp = path + ".tmp"
+    if isinstance(index, HNSWIndex):
+        index.save(tmp)
+        if os.path.exists(tmp):
+            os.replace(tmp + ".meta.npz", path + ".meta.npz")
+            os.replace(tmp, path)
+        return
+    index.save(tmp + ".npz")
+    os.replace(tmp + ".npz", path + ".npz")
@@ -0,0 +1,388 @@
+"""Headless HTTP API: report submission, job status, search and item status.
+
+    python api.py [--host 127.0.0.1] [--port 8600] [--image-workers N]
+
+    POST /items                   multipart report -> 202 {"job_id", "status_url"}
+    GET  /jobs/{job_id}           job status, and the pipeline result once done
+                                  (?wait=N holds the request up to N seconds for it)
+    GET  /items                   newest items (?type=&limit=&offset=)
+    GET  /items/search            full-text search (?q=&type=&limit=&offset=)
+    POST /items/{item_id}/status  {"status": "open" | "matched" | "closed"}
+    GET  /images/{digest}         stored WebP thumbnail (?size=)
+    GET  /stats                   item counts per type
+    GET  /metrics, /metrics.json, /logs, /health
+
+A report has ``type``, ``title``, ``image`` (the file) and optionally
+``description``, ``contact``, ``latitude``/``longitude``, ``venue`` and
+``occurred_at`` (ISO 8601). Each submission runs as an asyncio task:
+decoding and hashing go to a process pool (whose workers write the
+thumbnails in the background), and the rest of the
+pipeline (embedding, DB writes, matching, agent calls) to a thread, as the
+OpenAI, CAMEL and Twilio SDKs block. The event loop only awaits them, so
+status and search requests are served while reports are processed.
+Notifications are delivered by this process's outbox dispatcher.
+
+Jobs are kept in memory for API_JOB_TTL_SECONDS after they finish (the
+items themselves are in the DB); a restart forgets unfinished jobs.
+
+Matching runs against in-memory indexes. Items written by other processes,
+e.g. a bulk_import run, are indexed every API_INDEX_REFRESH_SECONDS, so
+reports start matching them within that interval; status changes made
+elsewhere (closing an item) only take effect here after a restart.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import multiprocessing
+import os
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from aiohttp import web
+
+import agents
+import db
+from geo_index import parse_location
+from image_store import get_image_store
+from ingest import MAX_UPLOAD_BYTES, prepare_image
+from logs import get_logger, recent
+from metrics import METRICS, inc, span
+
+log = get_logger("api")
+
+API_HOST = os.getenv("API_HOST", "127.0.0.1")
+API_PORT = int(os.getenv("API_PORT", "8600"))
+# Worker processes for image work (0: one per CPU).
+API_IMAGE_WORKERS = int(os.getenv("API_IMAGE_WORKERS", "0"))
+# Reports in the post-image pipeline at once; the rest wait for a slot.
+API_PIPELINE_CONCURRENCY = int(os.getenv("API_PIPELINE_CONCURRENCY", "8"))
+# Beyond this many unfinished jobs, submissions get 503 instead of queueing.
+API_MAX_PENDING_JOBS = int(os.getenv("API_MAX_PENDING_JOBS", "256"))
+API_JOB_TTL_SECONDS = float(os.getenv("API_JOB_TTL_SECONDS", "3600"))
+# How often items written by other processes (bulk_import) are indexed; 0 never.
+API_INDEX_REFRESH_SECONDS = float(os.getenv("API_INDEX_REFRESH_SECONDS", "30"))
+MAX_JOB_WAIT_SECONDS = 30.0
+MAX_PAGE_SIZE = 100
+# Match fields a job result may carry; owners' raw contacts and the scoring
+# internals stay server-side (the masked contact is alongside each match).
+PUBLIC_MATCH_FIELDS = ("id", "type", "title", "description", "score", "reasons", "image_sha256")
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+json_response = partial(web.json_response, dumps=partial(json.dumps, default=_json_default))
+
+
+def _bad_request(message: str) -> web.HTTPBadRequest:
+    return web.HTTPBadRequest(text=json.dumps({"error": message}), content_type="application/json")
+
+
+def _int_param(request: web.Request, name: str, default: int, low: int, high: int) -> int:
+    try:
+        value = int(request.query.get(name, default))
+    except ValueError:
+        raise _bad_request(f"{name} must be an integer")
+    return min(max(value, low), high)
+
+
+def _type_param(request: web.Request) -> Optional[str]:
+    item_type = request.query.get("type", "").strip().lower() or None
+    if item_type not in (None, *agents.OPPOSITE_TYPE):
+        raise _bad_request(f"unknown type {item_type!r}")
+    return item_type
+
+
+def _public_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """``result`` with each match reduced to ``PUBLIC_MATCH_FIELDS``."""
+    matches = [{**m, "match": {k: m["match"][k] for k in PUBLIC_MATCH_FIELDS if k in m["match"]}}
+               for m in result.get("matches", [])]
+    return {**result, "matches": matches} if "matches" in result else result
+
+
+# ---------- Jobs ----------
+# Jobs are only touched from the event loop, so nothing here is locked.
+class Job:
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.status = "queued"  # -> running -> done | failed
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.finished = asyncio.Event()
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"job_id": self.id, "status": self.status, "created_at": self.created_at,
+                "finished_at": self.finished_at, "result": self.result, "error": self.error}
+
+
+class JobStore:
+    """Jobs by id, oldest first; finished ones are dropped ``ttl`` seconds on."""
+
+    def __init__(self, ttl: float = API_JOB_TTL_SECONDS):
+        self.ttl = ttl
+        self.pending = 0
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def add(self) -> Job:
+        self._prune()
+        job = Job()
+        self._jobs[job.id] = job
+        self.pending += 1
+        return job
+
+    def finish(self, job: Job, result: Dict[str, Any]):
+        job.status = "failed" if result.get("error") else "done"
+        job.error = result.get("error")
+        job.result = result
+        job.finished_at = time.time()
+        job.finished.set()
+        self.pending -= 1
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl
+        # A job can only have finished before the cutoff if it was created before it.
+        for job in list(self._jobs.values()):
+            if job.created_at >= cutoff:
+                break
+            if job.finished_at is not None and job.finished_at < cutoff:
+                del self._jobs[job.id]
+
+
+# ---------- Service ----------
+class ReportService:
+    def __init__(self, image_workers: int = API_IMAGE_WORKERS,
+                 concurrency: int = API_PIPELINE_CONCURRENCY, max_pending: int = API_MAX_PENDING_JOBS):
+        self.jobs = JobStore()
+        self.max_pending = max_pending
+        # Spawned, not forked: the coordinator's threads are already running.
+        self.image_pool = ProcessPoolExecutor(image_workers or None, mp_context=multiprocessing.get_context("spawn"))
+        self.pipeline_slots = asyncio.Semaphore(concurrency)
+        self.coordinator: Optional[agents.Coordinator] = None
+        self._tasks = set()
+        self._refresher: Optional[asyncio.Task] = None
+
+    async def start(self, app: web.Application):
+        self.coordinator = await asyncio.to_thread(agents.get_coordinator)
+        if API_INDEX_REFRESH_SECONDS > 0:
+            self._refresher = asyncio.create_task(self._refresh_indexes(API_INDEX_REFRESH_SECONDS))
+
+    async def _refresh_indexes(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(agents.refresh_indexes)
+            except Exception as e:
+                log.warning("index refresh failed: %s", e)
+
+    async def stop(self, app: web.Application):
+        if self._refresher is not None:
+            self._refresher.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._refresher
+        if self._tasks:
+            log.info("waiting for %d running jobs", len(self._tasks))
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        await asyncio.to_thread(self.image_pool.shutdown)
+
+    def routes(self) -> List[web.RouteDef]:
+        return [
+            web.post("/items", self.submit),
+            web.get(r"/jobs/{job_id:[0-9a-f]{32}}", self.job_status),
+            web.get("/items", self.list_items),
+            web.get("/items/search", self.search),
+            web.post(r"/items/{item_id:\d+}/status", self.set_status),
+            web.get(r"/images/{digest:[0-9a-f]{64}}", self.image),
+            web.get("/stats", self.stats),
+            web.get("/metrics", self.metrics),
+            web.get("/metrics.json", self.metrics_json),
+            web.get("/logs", self.logs),
+            web.get("/health", self.health),
+        ]
+
+    # ----- Reports -----
+    async def _read_report(self, request: web.Request) -> Dict[str, Any]:
+        form = await request.post()
+        item_type = str(form.get("type", "")).strip().lower()
+        if item_type not in agents.OPPOSITE_TYPE:
+            raise _bad_request("type must be 'lost' or 'found'")
+        title = str(form.get("title", "")).strip()
+        if not title:
+            raise _bad_request("title is required")
+        image = form.get("image")
+        if not isinstance(image, web.FileField):
+            raise _bad_request("image file is required")
+        try:
+            location = parse_location(form)
+        except ValueError as e:
+            raise _bad_request(f"bad location or time: {e}")
+        return {
+            "image_bytes": await asyncio.to_thread(image.file.read),
+            "title": title,
+            "description": str(form.get("description", "")),
+            "item_type": item_type,
+            "contact": str(form.get("contact", "")).strip(),
+            **location,
+        }
+
+    async def submit(self, request: web.Request) -> web.Response:
+        if self.jobs.pending >= self.max_pending:
+            inc("api_jobs", outcome="rejected")
+            raise web.HTTPServiceUnavailable(headers={"Retry-After": "5"}, text="too many pending reports")
+        report = await self._read_report(request)
+        job = self.jobs.add()
+        task = asyncio.create_task(self._run(job, report))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return json_response({"job_id": job.id, "status": job.status, "status_url": f"/jobs/{job.id}"},
+                             status=202)
+
+    async def _run(self, job: Job, report: Dict[str, Any]):
+        timings: Dict[str, float] = {}
+        job.status = "running"
+        try:
+            loop = asyncio.get_running_loop()
+            with span("image_worker", timings):
+                prepared = await loop.run_in_executor(self.image_pool, prepare_image, report["image_bytes"])
+            async with self.pipeline_slots:
+                result = _public_result(
+                    await asyncio.to_thread(self.coordinator.run_pipeline, **report, prepared=prepared))
+            result["timings"] = {**timings, **result.get("timings", {})}
+        except Exception as e:
+            log.warning("job %s failed: %s", job.id, e)
+            result = {"error": f"Pipeline failed: {e}", "timings": timings}
+        self.jobs.finish(job, result)
+        inc("api_jobs", outcome=job.status)
+
+    async def job_status(self, request: web.Request) -> web.Response:
+        job = self.jobs.get(request.match_info["job_id"])
+        if job is None:
+            raise web.HTTPNotFound(text="unknown or expired job")
+        try:
+            wait = min(float(request.query.get("wait", 0) or 0), MAX_JOB_WAIT_SECONDS)
+        except ValueError:
+            raise _bad_request("wait must be a number")
+        if wait > 0 and not job.finished.is_set():
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(job.finished.wait(), wait)
+        return json_response(job.as_dict())
+
+    # ----- Items -----
+    async def list_items(self, request: web.Request) -> web.Response:
+        item_type = _type_param(request)
+        limit = _int_param(request, "limit", 20, 0, MAX_PAGE_SIZE)
+        offset = _int_param(request, "offset", 0, 0, 2 ** 31)
+
+        def query() -> Tuple[List[Dict[str, Any]], int]:
+            counts = db.count_by_type()
+            total = counts.get(item_type, 0) if item_type else sum(counts.values())
+            return (db.recent_items(limit, offset, item_type) if limit else []), total
+
+        items, total = await asyncio.to_thread(query)
+        return json_response({"items": items, "total": total})
+
+    async def search(self, request: web.Request) -> web.Response:
+        text = request.query.get("q", "").strip()
+        item_type = _type_param(request)
+        limit = _int_param(request, "limit", 20, 0, MAX_PAGE_SIZE)
+        offset = _int_param(request, "offset", 0, 0, 2 ** 31)
+
+        def query() -> Tuple[List[Dict[str, Any]], int]:
+            items = db.search_items(text, limit, offset, item_type) if limit else []
+            return items, db.count_search_results(text, item_type)
+
+        items, total = await asyncio.to_thread(query)
+        return json_response({"items": items, "total": total})
+
+    async def set_status(self, request: web.Request) -> web.Response:
+        item_id = int(request.match_info["item_id"])
+        try:
+            status = (await request.json()).get("status")
+        except (ValueError, AttributeError):
+            raise _bad_request('body must be JSON like {"status": "closed"}')
+        if status not in db.ITEM_STATUSES:
+            raise _bad_request(f"status must be one of {', '.join(db.ITEM_STATUSES)}")
+        changed = await asyncio.to_thread(agents.set_item_status, item_id, status)
+        return json_response({"item_id": item_id, "status": status, "changed": changed})
+
+    async def image(self, request: web.Request) -> web.StreamResponse:
+        store = get_image_store()
+        size = _int_param(request, "size", max(store.sizes), 1, 4096)
+        path = await asyncio.to_thread(store.thumbnail_path, request.match_info["digest"], size)
+        if path is None:
+            raise web.HTTPNotFound()
+        # Content-addressed, so a thumbnail never changes.
+        return web.FileResponse(path, headers={"Content-Type": "image/webp",
+                                               "Cache-Control": "public, max-age=31536000, immutable"})
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return json_response(await asyncio.to_thread(db.count_by_type))
+
+    # ----- Operations -----
+    async def metrics(self, request: web.Request) -> web.Response:
+        return web.Response(text=METRICS.render_prometheus(), content_type="text/plain")
+
+    async def metrics_json(self, request: web.Request) -> web.Response:
+        return json_response(METRICS.snapshot())
+
+    async def logs(self, request: web.Request) -> web.Response:
+        limit = _int_param(request, "limit", 0, 0, 100000)
+        return web.Response(text="\n".join(recent(limit or None)))
+
+    async def health(self, request: web.Request) -> web.Response:
+        return json_response({"status": "ok" if self.coordinator else "starting",
+                              "pending_jobs": self.jobs.pending})
+
+
+@web.middleware
+async def count_requests(request: web.Request, handler):
+    route = request.match_info.route.resource
+    name = route.canonical if route is not None else "unmatched"
+    status = 500
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        inc("api_requests", route=f"{request.method} {name}", status=status)
+
+
+def make_app(image_workers: int = API_IMAGE_WORKERS, concurrency: int = API_PIPELINE_CONCURRENCY) -> web.Application:
+    service = ReportService(image_workers, concurrency)
+    app = web.Application(client_max_size=MAX_UPLOAD_BYTES + 1024 * 1024, middlewares=[count_requests])
+    app.add_routes(service.routes())
+    app.on_startup.append(service.start)
+    app.on_cleanup.append(service.stop)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    parser.add_argument("--image-workers", type=int, default=API_IMAGE_WORKERS, help="0: one per CPU")
+    parser.add_argument("--concurrency", type=int, default=API_PIPELINE_CONCURRENCY)
+    args = parser.parse_args()
+    web.run_app(make_app(args.image_workers, args.concurrency), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Blocking client for the HTTP API in api.py, used by the Streamlit UI."""
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+API_URL = os.getenv("API_URL", "http://127.0.0.1:8600")
+API_TIMEOUT_SECONDS = float(os.getenv("API_TIMEOUT_SECONDS", "10"))
+# How long a UI submission waits for its job before giving up on the result.
+API_JOB_WAIT_SECONDS = float(os.getenv("API_JOB_WAIT_SECONDS", "120"))
+# Per status request; the server holds each one until the job finishes or this passes.
+LONG_POLL_SECONDS = 25.0
+
+Page = Tuple[List[Dict[str, Any]], int]
+
+
+class ApiError(Exception):
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class ApiClient:
+    def __init__(self, base_url: str = API_URL, timeout: float = API_TIMEOUT_SECONDS):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def _request(self, method: str, path: str, timeout: Optional[float] = None, **kwargs) -> requests.Response:
+        try:
+            resp = requests.request(method, self.base_url + path, timeout=timeout or self.timeout, **kwargs)
+        except requests.RequestException as e:
+            raise ApiError(f"API not reachable at {self.base_url} ({type(e).__name__})") from e
+        if resp.status_code >= 400:
+            try:
+                message = resp.json().get("error") or resp.text
+            except ValueError:
+                message = resp.text
+            raise ApiError(f"{resp.status_code}: {message}", resp.status_code)
+        return resp
+
+    # ---------- Reports ----------
+    def submit(self, image_bytes: bytes, filename: str, fields: Dict[str, Any]) -> str:
+        """Queue a report; returns its job id. ``None`` fields are left out."""
+        data = {k: str(v) for k, v in fields.items() if v is not None}
+        resp = self._request("POST", "/items", data=data, files={"image": (filename, image_bytes)})
+        return resp.json()["job_id"]
+
+    def job(self, job_id: str, wait: float = 0) -> Dict[str, Any]:
+        return self._request("GET", f"/jobs/{job_id}", params={"wait": wait} if wait else None,
+                             timeout=self.timeout + wait).json()
+
+    def wait(self, job_id: str, timeout: float = API_JOB_WAIT_SECONDS) -> Dict[str, Any]:
+        """Long-poll a job until it is done or failed."""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            job = self.job(job_id, wait=max(0.0, min(LONG_POLL_SECONDS, remaining)))
+            if job["status"] in ("done", "failed"):
+                return job
+            if remaining <= 0:
+                raise ApiError(f"job {job_id} still {job['status']} after {timeout:.0f}s")
+
+    # ---------- Items ----------
+    def recent_items(self, limit: int = 20, offset: int = 0, item_type: Optional[str] = None) -> Page:
+        body = self._request("GET", "/items", params={"limit": limit, "offset": offset,
+                                                      "type": item_type or ""}).json()
+        return body["items"], body["total"]
+
+    def search_items(self, text: str, limit: int = 20, offset: int = 0, item_type: Optional[str] = None) -> Page:
+        body = self._request("GET", "/items/search", params={"q": text, "limit": limit, "offset": offset,
+                                                             "type": item_type or ""}).json()
+        return body["items"], body["total"]
+
+    def count_by_type(self) -> Dict[str, int]:
+        return self._request("GET", "/stats").json()
+
+    def set_status(self, item_id: int, status: str) -> bool:
+        return self._request("POST", f"/items/{item_id}/status", json={"status": status}).json()["changed"]
+
+    def thumbnail(self, digest: str, size: int) -> Optional[bytes]:
+        try:
+            return self._request("GET", f"/images/{digest}", params={"size": size}).content
+        except ApiError as e:
+            if e.status == 404:
+                return None
+            raise
+
+    # ---------- Operations ----------
+    def metrics(self) -> Dict[str, Any]:
+        return self._request("GET", "/metrics.json").json()
+
+    def prometheus(self) -> str:
+        return self._request("GET", "/metrics").text
+
+    def logs(self, limit: int = 200) -> str:
+        return self._request("GET", "/logs", params={"limit": limit}).text
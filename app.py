@@ -1,16 +1,45 @@
+import base64
 import os
 import streamlit as st
-from PIL import Image
-import io
-from agents import coordinator, fetch_all_items, init_db
+from api_client import ApiClient, ApiError
 from dotenv import load_dotenv
 import json
+from datetime import datetime, time as dt_time
 
 # Load environment variables
 load_dotenv("api.env")
 
-# ---------- Ensure DB exists ----------
-init_db()
+# ---------- Shared resources ----------
+# The UI is a client of the HTTP API (api.py), which owns the database, the
+# matching indexes and the pipeline; start it with `python api.py`.
+@st.cache_resource
+def get_api():
+    return ApiClient()
+
+@st.cache_data(max_entries=4096, show_spinner=False)
+def thumbnail_uri(digest, size):
+    # Thumbnails are content-addressed, so a cached one never goes stale.
+    data = get_api().thumbnail(digest, size)
+    return "data:image/webp;base64," + base64.b64encode(data).decode("ascii") if data else None
+
+def show_thumbnail(digest, size):
+    """Stored WebP thumbnail, sent to the browser as-is (no decode on the server)."""
+    try:
+        uri = thumbnail_uri(digest, size) if digest else None
+    except ApiError:
+        uri = None
+    if uri:
+        st.markdown(f'<img src="{uri}" class="thumb" style="max-width:{size}px">', unsafe_allow_html=True)
+    else:
+        st.caption("No image")
+
+def parse_coordinates(text):
+    """(lat, lon) from 'lat, lon', or None if it isn't a valid pair."""
+    try:
+        lat, lon = (float(part) for part in text.replace(";", ",").split(","))
+    except ValueError:
+        return None
+    return (lat, lon) if -90 <= lat <= 90 and -180 <= lon <= 180 else None
 
 # ---------- Streamlit page config ----------
 st.set_page_config(
@@ -44,6 +73,10 @@ st.markdown("""
         border-left: 4px solid #1f77b4;
         margin-bottom: 1rem;
     }
+    .thumb {
+        width: 100%;
+        border-radius: 6px;
+    }
     .success-notification {
         background-color: #d4edda;
         color: #155724;
@@ -85,7 +118,7 @@ with st.sidebar:
     
     page = st.radio(
         "Go to:",
-        ["🏠 Home", "📤 Report Item", "📋 Recent Items", "ℹ️ About"],
+        ["🏠 Home", "📤 Report Item", "📋 Recent Items", "📈 Metrics", "ℹ️ About"],
         key="navigation"
     )
     
@@ -93,9 +126,13 @@ with st.sidebar:
     st.markdown("### 📊 Stats")
     
     # Quick stats in sidebar
-    items = fetch_all_items()
-    lost_count = len([item for item in items if item['type'] == 'lost'])
-    found_count = len([item for item in items if item['type'] == 'found'])
+    try:
+        type_counts = get_api().count_by_type()
+    except ApiError as e:
+        st.error(f"❌ {e}. Start it with `python api.py`.")
+        st.stop()
+    lost_count = type_counts.get('lost', 0)
+    found_count = type_counts.get('found', 0)
     
     col1, col2 = st.columns(2)
     with col1:
@@ -200,6 +237,20 @@ elif page == "📤 Report Item":
                 placeholder="Provide additional details like brand, color, distinctive features, location found/lost, etc.",
                 height=100
             )
+
+            st.markdown("**Where & when** (optional, narrows matching to nearby items)")
+            where1, where2 = st.columns(2)
+            with where1:
+                venue = st.text_input("Venue", placeholder="e.g., 'Central Library', 'Bus 42'")
+                coordinates = st.text_input(
+                    "Coordinates",
+                    placeholder="lat, lon  e.g. 51.5072, -0.1276",
+                    help="Items further apart than a few km are not matched"
+                )
+            with where2:
+                known_when = st.checkbox("I know when it was lost/found")
+                when_date = st.date_input("Date", value=datetime.now().date())
+                when_time = st.time_input("Time", value=dt_time(12, 0))
         
         with col2:
             st.subheader("Contact & Image")
@@ -233,17 +284,26 @@ elif page == "📤 Report Item":
             st.error("❌ Please upload an image to continue.")
         elif not title.strip():
             st.error("❌ Please enter a title for the item.")
+        elif coordinates.strip() and parse_coordinates(coordinates) is None:
+            st.error("❌ Coordinates should look like '51.5072, -0.1276'.")
         else:
+            latitude, longitude = parse_coordinates(coordinates) or (None, None)
+            # Read the form in this server's local zone (TZ); naive times would be taken as UTC.
+            occurred_at = datetime.combine(when_date, when_time).astimezone() if known_when else None
             img_bytes = uploaded_file.read()
-            pil_img = Image.open(io.BytesIO(img_bytes)).convert("RGB")
             
             with st.spinner("🔍 Processing with multi-agent pipeline..."):
                 try:
-                    # Coordinator multi-agent call
-                    res = coordinator.run_pipeline(img_bytes, title, description, item_type, owner_contact)
-                except json.JSONDecodeError:
-                    st.error("Error decoding response from agent. Please try again.")
-                    res = {}
+                    job_id = get_api().submit(img_bytes, uploaded_file.name, {
+                        "type": item_type, "title": title, "description": description,
+                        "contact": owner_contact, "latitude": latitude, "longitude": longitude,
+                        "venue": venue.strip() or None,
+                        "occurred_at": occurred_at.isoformat() if occurred_at else None,
+                    })
+                    job = get_api().wait(job_id)
+                    res = job["result"] or {"error": job["error"]}
+                except ApiError as e:
+                    res = {"error": str(e)}
 
             if res.get("error"):
                 st.error(f"❌ {res['error']}")
@@ -254,6 +314,14 @@ elif page == "📤 Report Item":
                 st.markdown("---")
                 st.markdown("## 📊 Results")
                 
+                timings = res.get("timings", {})
+                if timings:
+                    with st.expander(f"⏱️ Processed in {timings.get('total', 0):.0f} ms"):
+                        st.json(timings)
+                        if res.get("image"):
+                            st.caption("Image ingestion")
+                            st.json(res["image"])
+                
                 if not matches:
                     st.markdown('<div class="info-notification">ℹ️ No matches found yet. Item stored in database; system will automatically match with future uploads.</div>', unsafe_allow_html=True)
                 else:
@@ -279,6 +347,7 @@ elif page == "📤 Report Item":
                                         st.markdown(f"- {reason}")
                             
                             with col2:
+                                show_thumbnail(itm.get('image_sha256'), 256)
                                 st.markdown(f"**Item ID:** `{itm.get('id')}`")
                                 st.markdown(f"**Type:** `{itm.get('type')}`")
                                 st.markdown(f"**Contact:** {m.get('masked_contact', 'Not available')}")
@@ -292,6 +361,8 @@ elif page == "📤 Report Item":
                                     with notif_cols[idx]:
                                         if "success" in status.lower():
                                             st.success(f"{channel.upper()} ✅")
+                                        elif "queued" in status.lower():
+                                            st.info(f"{channel.upper()} ⏳")
                                         else:
                                             st.error(f"{channel.upper()} ❌")
                                         st.caption(status)
@@ -302,30 +373,41 @@ elif page == "📤 Report Item":
 elif page == "📋 Recent Items":
     st.markdown("## 📋 Recent Items")
     
-    items = fetch_all_items()
-    recent_items = items[-20:][::-1]  
+    page_size = 20
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        search_term = st.text_input("🔍 Search items...", placeholder="Search by title or description").strip()
+    with col2:
+        type_filter = st.selectbox("Type", ["all", "lost", "found"])
+    item_type = None if type_filter == "all" else type_filter
     
-    if not recent_items:
-        st.info("No items found in the database.")
+    # Search covers the whole table through the FTS index, not just one page
+    if search_term:
+        _, total_items = get_api().search_items(search_term, limit=0, item_type=item_type)
+    elif item_type:
+        total_items = type_counts.get(item_type, 0)
     else:
-        search_term = st.text_input("🔍 Search items...", placeholder="Search by title, description, or type")
-        
-        # Filter items based on search
-        if search_term:
-            filtered_items = [
-                item for item in recent_items 
-                if search_term.lower() in item['title'].lower() 
-                or search_term.lower() in str(item.get('description', '')).lower()
-                or search_term.lower() in item['type'].lower()
-            ]
-        else:
-            filtered_items = recent_items
-        
-        st.markdown(f"**Showing {len(filtered_items)} items**")
+        total_items = sum(type_counts.values())
+    page_count = max(1, (total_items + page_size - 1) // page_size)
+    page_no = st.number_input("Page", min_value=1, max_value=page_count, value=1, step=1)
+    offset = (page_no - 1) * page_size
+    
+    if search_term:
+        filtered_items, _ = get_api().search_items(search_term, limit=page_size, offset=offset, item_type=item_type)
+    else:
+        filtered_items, _ = get_api().recent_items(limit=page_size, offset=offset, item_type=item_type)
+    
+    if not filtered_items:
+        st.info("No items match your search." if search_term else "No items found in the database.")
+    else:
+        st.markdown(f"**Showing {len(filtered_items)} of {total_items} items**")
         
         for item in filtered_items:
             with st.container():
-                col1, col2, col3, col4 = st.columns([3, 1, 1, 1])
+                col0, col1, col2, col3, col4 = st.columns([1, 3, 1, 1, 1])
+                
+                with col0:
+                    show_thumbnail(item.get('image_sha256'), 96)
                 
                 with col1:
                     st.write(f"**{item['title']}**")
@@ -346,9 +428,43 @@ elif page == "📋 Recent Items":
                 with col4:
                     st.write(f"**Date:**")
                     st.caption(item['created_at'].split(' ')[0] if ' ' in item['created_at'] else item['created_at'])
+                    st.caption(f"Status: {item.get('status', 'open')}")
+                    # Closed items leave matching now and move to the archive on the next compaction.
+                    if item.get('status', 'open') != 'closed' and st.button("Mark returned", key=f"close-{item['id']}"):
+                        get_api().set_status(item['id'], "closed")
+                        st.experimental_rerun()
                 
                 st.markdown("---")
 
+# ---------- Metrics Page ----------
+elif page == "📈 Metrics":
+    st.markdown("## 📈 Pipeline Metrics")
+    st.caption("Per-stage latency over the most recent submissions handled by the API server.")
+
+    snapshot = get_api().metrics()
+    if not snapshot["stages"]:
+        st.info("No submissions processed yet.")
+    else:
+        st.dataframe(
+            [{"stage": stage, **values} for stage, values in sorted(snapshot["stages"].items())],
+            use_container_width=True
+        )
+
+    if snapshot["counters"]:
+        st.markdown("### 🔢 Counters")
+        st.dataframe(
+            [{"counter": name, "labels": labels, "value": value}
+             for name, by_label in snapshot["counters"].items() for labels, value in by_label.items()],
+            use_container_width=True
+        )
+
+    st.download_button("⬇️ Download JSON", json.dumps(snapshot, indent=2),
+                       file_name="metrics.json", mime="application/json")
+    with st.expander("Prometheus text"):
+        st.code(get_api().prometheus())
+    with st.expander("Recent log"):
+        st.code(get_api().logs(200) or "No log records yet.")
+
 # ---------- About Page ----------
 elif page == "ℹ️ About":
     st.markdown("## ℹ️ About Lost & Found 2.0")
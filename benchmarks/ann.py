@@ -0,0 +1,75 @@
+"""Recall@k vs query latency of the ANN backends against exact search.
+
+Run from the repo root:  python -m benchmarks.ann --items 100000
+"""
+import argparse
+import time
+
+import numpy as np
+
+import ann_index
+
+
+def clustered(n: int, dim: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    """Unit vectors scattered around random topics, like item descriptions."""
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    vecs = centers[rng.integers(0, clusters, n)] + 0.8 * rng.standard_normal((n, dim), dtype=np.float32)
+    return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+
+
+def measure(index, queries: np.ndarray, truth, k: int):
+    latencies, hits = [], 0
+    for q, expected in zip(queries, truth):
+        t0 = time.perf_counter()
+        got = index.search(q, k)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        hits += len(expected & {i for i, _ in got})
+    return hits / (len(queries) * k), np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--clusters", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    data = clustered(args.items, args.dim, args.clusters, rng)
+    queries = data[rng.integers(0, args.items, args.queries)] \
+        + 0.05 * rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+
+    def build(index):
+        t0 = time.perf_counter()
+        index.add_many(enumerate(data))
+        if isinstance(index, ann_index.IVFIndex):
+            index.wait_for_training()  # retraining runs in the background
+        return index, time.perf_counter() - t0
+
+    exact, build_s = build(ann_index.ExactIndex(dim=args.dim, capacity=args.items))
+    truth = [{i for i, _ in exact.search(q, args.k)} for q in queries]
+    recall, p50, p99 = measure(exact, queries, truth, args.k)
+    print(f"{'backend':<18} | {'build s':>8} | recall@{args.k:<3} | {'p50 ms':>7} | {'p99 ms':>7}")
+    print(f"{'exact':<18} | {build_s:8.1f} | {recall:9.3f} | {p50:7.2f} | {p99:7.2f}")
+
+    ivf, build_s = build(ann_index.IVFIndex(min_train=min(ann_index.IVF_MIN_TRAIN, args.items)))
+    for nprobe in (1, 4, 8, 16, 32):
+        ivf.nprobe = nprobe
+        recall, p50, p99 = measure(ivf, queries, truth, args.k)
+        print(f"{f'ivf nprobe={nprobe}':<18} | {build_s:8.1f} | {recall:9.3f} | {p50:7.2f} | {p99:7.2f}")
+
+    try:
+        hnsw, build_s = build(ann_index.HNSWIndex(dim=args.dim, capacity=args.items))
+    except ImportError:
+        print("hnsw               | hnswlib not installed")
+        return
+    for ef in (16, 32, 64, 128):
+        hnsw.ef = ef
+        recall, p50, p99 = measure(hnsw, queries, truth, args.k)
+        print(f"{f'hnsw ef={ef}':<18} | {build_s:8.1f} | {recall:9.3f} | {p50:7.2f} | {p99:7.2f}")
+
+
+if __name__ == "__main__":
+    main()
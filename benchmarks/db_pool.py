@@ -0,0 +1,122 @@
+"""Load test: per-call sqlite3.connect (the old functions) vs the pooled WAL layer.
+
+Each worker thread interleaves single-row inserts with full-table reads, the
+pattern concurrent Streamlit sessions produce. Run from the repo root:
+
+    python -m benchmarks.db_pool
+"""
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+import db
+
+
+def make_item(rng: np.random.Generator, dim: int) -> dict:
+    return {
+        "type": "lost",
+        "title": "Black wallet",
+        "description": "Leather, two cards inside",
+        "owner_contact": "+15550000000",
+        "image_phash": f"{int(rng.integers(0, 2**63)):016x}",
+        "embedding": rng.standard_normal(dim, dtype=np.float32),
+    }
+
+
+# The pre-pool implementation: a fresh rollback-journal connection per call.
+def legacy_insert(path: str, item: dict):
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "INSERT INTO items (type, title, description, owner_contact, image_phash, embedding_json, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (item["type"], item["title"], item["description"], item["owner_contact"],
+         item["image_phash"], json.dumps(item["embedding"].tolist()), datetime.utcnow().isoformat()))
+    conn.commit()
+    conn.close()
+
+def legacy_count(path: str):
+    conn = sqlite3.connect(path)
+    conn.execute("SELECT id, type, title, description, owner_contact, image_phash, embedding_json, created_at FROM items").fetchall()
+    conn.close()
+
+
+def pooled_insert(path: str, item: dict):
+    db.insert_item(item)
+
+def pooled_count(path: str):
+    with db.get_pool().connection() as conn:
+        conn.execute(f"SELECT {db.ITEM_COLUMNS} FROM items").fetchall()
+
+
+def run(label, path, insert, read, threads, ops, dim):
+    errors = []
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(seed):
+        rng = np.random.default_rng(seed)
+        for i in range(ops):
+            t0 = time.perf_counter()
+            try:
+                insert(path, make_item(rng, dim))
+                if i % 10 == 0:
+                    read(path)
+            except sqlite3.OperationalError as e:
+                with lock:
+                    errors.append(str(e))
+            with lock:
+                latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(s,)) for s in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    wall = time.perf_counter() - t0
+    lat = np.array(latencies) * 1000
+    print(f"{label:>10} | {threads * ops / wall:8.0f} ops/s | p50 {np.percentile(lat, 50):7.2f} ms | "
+          f"p99 {np.percentile(lat, 99):7.2f} ms | errors {len(errors)}")
+
+
+def run_bulk(path, n, dim):
+    rng = np.random.default_rng(1)
+    items = [make_item(rng, dim) for _ in range(n)]
+    t0 = time.perf_counter()
+    db.insert_items(items)
+    wall = time.perf_counter() - t0
+    print(f"{'bulk':>10} | {n / wall:8.0f} rows/s | {n} rows in one transaction")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=200)
+    parser.add_argument("--bulk", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=1536)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = os.path.join(tmp, "pooled.db")
+        db.init_db()
+        legacy_path = os.path.join(tmp, "legacy.db")
+        conn = sqlite3.connect(legacy_path)
+        conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY AUTOINCREMENT, type TEXT, title TEXT, "
+                     "description TEXT, owner_contact TEXT, image_phash TEXT, embedding_json TEXT, created_at TIMESTAMP)")
+        conn.close()
+
+        run("legacy", legacy_path, legacy_insert, legacy_count, args.threads, args.ops, args.dim)
+        run("pooled", db.DB_PATH, pooled_insert, pooled_count, args.threads, args.ops, args.dim)
+        run_bulk(db.DB_PATH, args.bulk, args.dim)
+        db.get_pool().close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Concurrent embedding requests: one API call per text vs BatchingEmbeddingClient.
+
+Runs entirely against benchmarks.fake_servers.FakeOpenAIServer. Run from the
+repo root:  python -m benchmarks.embedding_client
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from openai import OpenAI
+
+import db
+from benchmarks.fake_servers import FakeOpenAIServer
+from embedding_client import BatchingEmbeddingClient, EmbeddingCache
+
+
+def workload(n: int, duplicate_rate: float, rng: random.Random):
+    texts = []
+    for i in range(n):
+        if texts and rng.random() < duplicate_rate:
+            texts.append(rng.choice(texts))
+        else:
+            texts.append(f"Item {i}\nBlack wallet found near platform {rng.randrange(20)}")
+    return texts
+
+
+def run(label, embed, texts, threads, server):
+    before = server.stats["requests"]
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(embed, texts))
+    wall = time.perf_counter() - t0
+    calls = server.stats["requests"] - before
+    print(f"{label:>14} | {len(texts) / wall:8.0f} texts/s | {calls:5} API calls")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--duplicates", type=float, default=0.3)
+    args = parser.parse_args()
+
+    texts = workload(args.texts, args.duplicates, random.Random(0))
+    with tempfile.TemporaryDirectory() as tmp, FakeOpenAIServer(latency=args.latency) as server:
+        db.DB_PATH = os.path.join(tmp, "cache.db")
+        db.init_db()
+        client = OpenAI(api_key="fake", base_url=server.base_url, max_retries=0)
+
+        def direct(text):
+            return client.embeddings.create(model="text-embedding-3-small", input=text).data[0].embedding
+
+        batching = BatchingEmbeddingClient(client, cache=EmbeddingCache())
+        run("direct", direct, texts, args.threads, server)
+        run("batched cold", batching.embed, texts, args.threads, server)
+        run("batched warm", batching.embed, texts, args.threads, server)
+        print(f"stats: {batching.stats}")
+        db.get_pool().close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Compare the per-row cosine loop with EmbeddingIndex.search.
+
+Run from the repo root:  python -m benchmarks.embedding_index
+"""
+import argparse
+import time
+
+import numpy as np
+
+from embedding_index import EmbeddingIndex
+from utils import cosine_similarity
+
+
+def bench(n: int, dim: int, loop_limit: int, repeats: int, rng: np.random.Generator):
+    data = rng.standard_normal((n, dim), dtype=np.float32)
+    query = rng.standard_normal(dim, dtype=np.float32)
+
+    # The old loop works on Python lists; building them for 100k x 1536 floats
+    # needs several GB, so time a prefix and scale linearly.
+    sample = min(n, loop_limit)
+    rows = data[:sample].tolist()
+    q_list = query.tolist()
+    t0 = time.perf_counter()
+    for row in rows:
+        cosine_similarity(q_list, row)
+    loop_s = (time.perf_counter() - t0) * n / sample
+
+    index = EmbeddingIndex(dim=dim, capacity=n)
+    t0 = time.perf_counter()
+    index.add_many(enumerate(data))
+    build_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        index.search(query, k=10, min_score=0.6)
+    index_s = (time.perf_counter() - t0) / repeats
+
+    extrapolated = "*" if sample < n else " "
+    print(f"{n:>7} | loop {loop_s * 1000:10.1f} ms{extrapolated} | "
+          f"index {index_s * 1000:8.2f} ms | build {build_s:6.2f} s | "
+          f"speedup {loop_s / index_s:8.0f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--loop-limit", type=int, default=10_000)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"dim={args.dim}  (* = loop time extrapolated from {args.loop_limit} rows)")
+    for n in args.sizes:
+        bench(n, args.dim, args.loop_limit, args.repeats, rng)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Compare JSON text embeddings with packed blobs: file size and load time.
+
+Run from the repo root:  python -m benchmarks.embedding_storage
+"""
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+
+from utils import EMBEDDING_FORMATS, decode_embedding, encode_embedding
+
+
+def build(path: str, data: np.ndarray, fmt: str):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, emb)")
+    if fmt == "json":
+        rows = ((i, json.dumps(v.tolist())) for i, v in enumerate(data))
+    else:
+        rows = ((i, encode_embedding(v, fmt)) for i, v in enumerate(data))
+    conn.executemany("INSERT INTO items VALUES (?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+
+def load(path: str, fmt: str) -> float:
+    t0 = time.perf_counter()
+    conn = sqlite3.connect(path)
+    rows = conn.execute("SELECT id, emb FROM items").fetchall()
+    decode = json.loads if fmt == "json" else decode_embedding
+    for _, raw in rows:
+        decode(raw)
+    conn.close()
+    return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--dim", type=int, default=1536)
+    args = parser.parse_args()
+
+    data = np.random.default_rng(0).standard_normal((args.rows, args.dim), dtype=np.float32)
+    with tempfile.TemporaryDirectory() as tmp:
+        baseline = None
+        for fmt in ("json",) + EMBEDDING_FORMATS:
+            path = os.path.join(tmp, f"{fmt}.db")
+            build(path, data, fmt)
+            size = os.path.getsize(path)
+            secs = load(path, fmt)
+            baseline = baseline or (size, secs)
+            print(f"{fmt:>8} | {size / 2**20:8.1f} MiB ({baseline[0] / size:4.1f}x smaller) | "
+                  f"load {secs:6.2f} s ({baseline[1] / secs:5.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""Local stand-ins for the HTTP APIs the app talks to.
+
+Point the OpenAI SDK at ``FakeOpenAIServer(...).base_url`` (or set
+OPENAI_BASE_URL) and Twilio at ``FakeTwilioServer(...).url`` (or set
+TWILIO_API_BASE) to exercise the real client code without network access,
+API credits or real SMS.
+"""
+import hashlib
+import json
+import random
+import re
+import threading
+import uuid
+from urllib.parse import parse_qs
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+@lru_cache(maxsize=65536)
+def _token_vector(token: str, dim: int) -> np.ndarray:
+    seed = int.from_bytes(hashlib.sha256(token.encode("utf-8")).digest()[:8], "little")
+    return np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+
+
+def fake_embedding(text: str, dim: int = 1536) -> np.ndarray:
+    """Deterministic bag-of-words embedding: texts sharing words point the same way."""
+    vec = np.zeros(dim, dtype=np.float32)
+    for token in re.findall(r"\w+", text.lower()):
+        vec += _token_vector(token, dim)
+    norm = float(np.linalg.norm(vec))
+    return vec / norm if norm else vec
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+
+class _FakeServer:
+    """Threaded HTTP server with configurable latency and error rate."""
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, port: int = 0, seed: int = 0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.stats = {"requests": 0, "errors": 0}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = _HTTPServer(("127.0.0.1", port), self._handler_class())
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self.stats[key] = self.stats.get(key, 0) + n
+
+    def _should_fail(self) -> bool:
+        with self._lock:
+            return self._rng.random() < self.error_rate
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status: int, payload: dict):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length)
+                server._count("requests")
+                if server.latency:
+                    time.sleep(server.latency)
+                if server._should_fail():
+                    server._count("errors")
+                    self._reply(500, {"error": {"message": "injected failure", "type": "server_error"}})
+                    return
+                status, payload = server.handle(self.path, raw, self.headers.get("Content-Type", ""))
+                self._reply(status, payload)
+
+        return Handler
+
+    def handle(self, path: str, raw: bytes, content_type: str):
+        return 404, {"error": {"message": f"no route for {path}"}}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def fake_chat_reply(prompt: str) -> str:
+    """Keeps what follows the prompt's first colon, with each word masked
+    down to its first and last character, e.g. ``t***m @a***e``."""
+    text = prompt.split(":", 1)[-1].strip()
+    return " ".join(w if len(w) < 3 else w[0] + "*" * (len(w) - 2) + w[-1] for w in text.split())
+
+
+class FakeOpenAIServer(_FakeServer):
+    """Serves ``POST /v1/embeddings`` with deterministic bag-of-words vectors
+    and ``POST /v1/chat/completions`` with ``fake_chat_reply``."""
+
+    def __init__(self, dim: int = 1536, **kwargs):
+        super().__init__(**kwargs)
+        self.dim = dim
+
+    @property
+    def base_url(self) -> str:
+        return f"{self.url}/v1"
+
+    def handle(self, path: str, raw: bytes, content_type: str):
+        if path.rstrip("/").endswith("/embeddings"):
+            req = json.loads(raw or b"{}")
+            inputs = req.get("input", [])
+            if isinstance(inputs, str):
+                inputs = [inputs]
+            self._count("embedding_texts", len(inputs))
+            data = [
+                {"object": "embedding", "index": i, "embedding": fake_embedding(text, self.dim).tolist()}
+                for i, text in enumerate(inputs)
+            ]
+            tokens = sum(len(text.split()) for text in inputs)
+            return 200, {
+                "object": "list",
+                "data": data,
+                "model": req.get("model", "text-embedding-3-small"),
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            }
+        if path.rstrip("/").endswith("/chat/completions"):
+            req = json.loads(raw or b"{}")
+            messages = req.get("messages", [])
+            prompt = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+            reply = fake_chat_reply(prompt if isinstance(prompt, str) else json.dumps(prompt))
+            self._count("chat_completions")
+            prompt_tokens = sum(len(str(m.get("content") or "").split()) for m in messages)
+            completion_tokens = len(reply.split())
+            return 200, {
+                "id": "chatcmpl-" + uuid.uuid4().hex,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": req.get("model", "gpt-4o-mini"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": reply},
+                    "finish_reason": "stop",
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            }
+        return super().handle(path, raw, content_type)
+
+
+class FakeTwilioServer(_FakeServer):
+    """Accepts Twilio ``Messages.json`` and ``Calls.json`` creates and records them."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.sent = []
+
+    def handle(self, path: str, raw: bytes, content_type: str):
+        m = re.match(r"^/2010-04-01/Accounts/([^/]+)/(Messages|Calls)\.json$", path)
+        if not m:
+            return super().handle(path, raw, content_type)
+        form = {k: v[0] for k, v in parse_qs(raw.decode("utf-8")).items()}
+        kind = "message" if m.group(2) == "Messages" else "call"
+        sid = ("SM" if kind == "message" else "CA") + uuid.uuid4().hex
+        with self._lock:
+            self.sent.append({"kind": kind, "sid": sid, **form})
+        self._count(kind)
+        return 201, {
+            "sid": sid,
+            "account_sid": m.group(1),
+            "to": form.get("To"),
+            "from": form.get("From"),
+            "body": form.get("Body"),
+            "status": "queued",
+        }
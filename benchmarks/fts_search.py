@@ -0,0 +1,76 @@
+"""Compare FTS5 search with a LIKE scan over a synthetic items table.
+
+Run from the repo root:  python -m benchmarks.fts_search
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import db
+
+COLOURS = ["black", "red", "blue", "silver", "green", "brown", "white", "pink"]
+THINGS = ["wallet", "phone", "umbrella", "backpack", "keys", "headphones", "jacket", "laptop", "watch", "passport"]
+PLACES = ["station", "library", "bus", "cafe", "park", "gym", "airport", "office", "cinema", "school"]
+QUERIES = ["wallet", "blue umbrella", "head", "airport passport", "silver watch library", "ref 123456"]
+
+
+def synthetic_items(n: int, rng: random.Random):
+    for _ in range(n):
+        colour, thing, place = rng.choice(COLOURS), rng.choice(THINGS), rng.choice(PLACES)
+        yield {
+            "type": rng.choice(["lost", "found"]),
+            "title": f"{colour.title()} {thing}",
+            "description": f"{colour} {thing} left near the {place}, ref {rng.randrange(10**6)}",
+        }
+
+
+def like_search(text: str, limit: int):
+    """One results page plus the total, as the Recent Items page needs."""
+    words = text.split()
+    where = " AND ".join("(title LIKE ? OR description LIKE ?)" for _ in words)
+    params = [p for w in words for p in (f"%{w}%", f"%{w}%")]
+    with db.get_pool().connection() as conn:
+        rows = conn.execute(
+            f"SELECT id, type, title, description, created_at FROM items WHERE {where} "
+            "ORDER BY created_at DESC LIMIT ?", params + [limit]).fetchall()
+        total = conn.execute(f"SELECT COUNT(*) FROM items WHERE {where}", params).fetchone()[0]
+    return rows, total
+
+
+def fts_search(text: str, limit: int):
+    return db.search_items(text, limit=limit), db.count_search_results(text)
+
+
+def timed(fn, repeats: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - t0) / repeats * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = os.path.join(tmp, "fts.db")
+        db.init_db()
+        t0 = time.perf_counter()
+        db.insert_items(list(synthetic_items(args.rows, random.Random(0))))
+        print(f"inserted {args.rows} rows (with FTS triggers) in {time.perf_counter() - t0:.1f} s")
+
+        for q in QUERIES:
+            like_ms = timed(lambda: like_search(q, 20), args.repeats)
+            fts_ms = timed(lambda: fts_search(q, 20), args.repeats)
+            hits = db.count_search_results(q)
+            print(f"{q!r:>22} | {hits:6} hits | LIKE {like_ms:8.2f} ms | FTS5 {fts_ms:8.2f} ms | "
+                  f"{like_ms / fts_ms:6.1f}x")
+        db.get_pool().close()
+
+
+if __name__ == "__main__":
+    main()
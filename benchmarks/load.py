@@ -0,0 +1,273 @@
+"""End-to-end load test of Coordinator.run_pipeline against local OpenAI and
+Twilio stand-ins.
+
+Run from the repo root:
+
+    python -m benchmarks.load --items 400 --concurrency 8 --save-baseline load.json
+    python -m benchmarks.load --items 400 --concurrency 8 --baseline load.json
+
+Half of the synthetic items are lost, half found; ``--dup-rate`` of the
+found items are near-duplicates of a lost item (same object, reworded
+description, shifted/re-lit/re-encoded photo). Those pairs are the ground
+truth that the recorded match pairs are scored against. Submissions run in
+random order from ``--concurrency`` threads, in a fresh database and image
+store. The report (throughput, latency percentiles, per-stage p50/p99,
+storage and precision/recall) can be saved as a baseline and compared
+against later runs.
+"""
+import argparse
+import io
+import json
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageEnhance
+
+from benchmarks.fake_servers import FakeOpenAIServer, FakeTwilioServer
+
+COLORS = ["black", "brown", "red", "blue", "green", "silver", "white", "pink", "grey", "yellow"]
+MATERIALS = ["leather", "plastic", "metal", "canvas", "wool", "denim", "rubber", "suede"]
+OBJECTS = ["wallet", "backpack", "phone", "umbrella", "keys", "jacket", "laptop", "watch", "scarf",
+           "headphones", "glasses", "bottle", "notebook", "bracelet", "camera", "charger"]
+BRANDS = ["acme", "nordic", "zenith", "orbit", "atlas", "lumen", "vertex", "kestrel", "juniper", "halcyon"]
+PLACES = ["library", "station", "cafeteria", "gym", "park", "bus", "lecture hall", "parking lot", "museum"]
+DETAILS = ["sticker", "scratch", "keychain", "initials", "strap", "zipper", "dent", "tag", "patch", "logo"]
+
+
+class Spec(NamedTuple):
+    """One synthetic object; a lost item and its duplicate share a Spec."""
+    seed: int
+    color: str
+    material: str
+    obj: str
+    brand: str
+    place: str
+    detail: str
+
+
+def random_spec(rng: random.Random) -> Spec:
+    return Spec(rng.getrandbits(32), rng.choice(COLORS), rng.choice(MATERIALS), rng.choice(OBJECTS),
+                rng.choice(BRANDS), rng.choice(PLACES), rng.choice(DETAILS))
+
+
+def describe(spec: Spec, rng: random.Random, noise: float) -> Tuple[str, str]:
+    """Title and description; ``noise`` is the fraction of words dropped."""
+    title = f"{spec.color} {spec.material} {spec.obj}"
+    words = (f"{spec.brand} {spec.obj} in {spec.color} {spec.material} with a {spec.detail} "
+             f"near the {spec.place}").split()
+    kept = [w for w in words if rng.random() >= noise] or words[:1]
+    return title, " ".join(kept)
+
+
+def render(spec: Spec, size: Tuple[int, int] = (640, 480)) -> Image.Image:
+    """A deterministic 'photo' of the object: shapes on a background, per spec."""
+    rng = random.Random(spec.seed)
+    img = Image.new("RGB", size, tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(img)
+    w, h = size
+    for _ in range(rng.randint(4, 9)):
+        x0, y0 = rng.randrange(w), rng.randrange(h)
+        box = (x0, y0, x0 + rng.randint(w // 8, w // 2), y0 + rng.randint(h // 8, h // 2))
+        fill = tuple(rng.randrange(256) for _ in range(3))
+        (draw.ellipse if rng.random() < 0.5 else draw.rectangle)(box, fill=fill)
+    return img
+
+
+def photograph(spec: Spec, rng: random.Random, noise: float) -> bytes:
+    """JPEG of the object; ``noise`` scales shift, lighting and compression changes."""
+    img = render(spec)
+    if noise:
+        w, h = img.size
+        dx, dy = (int(rng.uniform(-1, 1) * noise * w * 0.05) for _ in range(2))
+        img = img.transform(img.size, Image.Transform.AFFINE, (1, 0, dx, 0, 1, dy), fillcolor=img.getpixel((0, 0)))
+        img = ImageEnhance.Brightness(img).enhance(1 + rng.uniform(-1, 1) * noise * 0.2)
+        pixels = np.asarray(img, dtype=np.float32)
+        pixels += np.random.default_rng(rng.getrandbits(32)).normal(0, 25 * noise, pixels.shape)
+        img = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+    buf = io.BytesIO()
+    img.save(buf, "JPEG", quality=rng.randint(70, 95) if noise else 90)
+    return buf.getvalue()
+
+
+class Submission(NamedTuple):
+    item_type: str
+    title: str
+    description: str
+    contact: str
+    image: bytes
+    lost_index: Optional[int]  # for lost items their own index, for duplicates the lost item copied
+
+
+def make_workload(n: int, dup_rate: float, text_noise: float, image_noise: float,
+                  handle_rate: float, seed: int) -> List[Submission]:
+    rng = random.Random(seed)
+    lost_specs = [random_spec(rng) for _ in range(n // 2)]
+
+    def contact() -> str:
+        if rng.random() < handle_rate:  # neither phone nor email: exercises the privacy agent
+            return f"telegram @{rng.choice(BRANDS)}{rng.randrange(1000)}"
+        return f"+1555{rng.randrange(10 ** 7):07d}"
+
+    subs = []
+    for i, spec in enumerate(lost_specs):
+        title, desc = describe(spec, rng, 0.0)
+        subs.append(Submission("lost", title, desc, contact(), photograph(spec, rng, 0.0), i))
+    for _ in range(n - len(lost_specs)):
+        if lost_specs and rng.random() < dup_rate:
+            i = rng.randrange(len(lost_specs))
+            spec, source = lost_specs[i], i
+        else:
+            spec, source = random_spec(rng), None
+        title, desc = describe(spec, rng, text_noise if source is not None else 0.0)
+        subs.append(Submission("found", title, desc, contact(),
+                               photograph(spec, rng, image_noise if source is not None else 0.0), source))
+    rng.shuffle(subs)
+    return subs
+
+
+def _dir_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+def run(args) -> Dict[str, float]:
+    workload = make_workload(args.items, args.dup_rate, args.text_noise, args.image_noise,
+                             args.handle_rate, args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp, \
+            FakeOpenAIServer(latency=args.openai_latency, error_rate=args.error_rate, dim=args.dim) as openai_server, \
+            FakeTwilioServer(latency=args.twilio_latency, error_rate=args.error_rate) as twilio_server:
+        # Everything below reads its settings at import time.
+        os.environ.update({
+            "OPENAI_API_KEY": "sk-fake", "OPENAI_BASE_URL": openai_server.base_url,
+            "OPENAI_API_BASE_URL": openai_server.base_url,
+            "TWILIO_ACCOUNT_SID": "ACfake", "TWILIO_AUTH_TOKEN": "fake", "TWILIO_API_BASE": twilio_server.url,
+            "TWILIO_PHONE_NUMBER": "+15550000000", "TWILIO_WHATSAPP_NUMBER": "+15550000001",
+            "PRIVACY_AGENT_FALLBACK": "1" if args.handle_rate else "0",
+            "IMAGE_STORE_DIR": os.path.join(tmp, "images"),
+        })
+        import db
+        db.DB_PATH = os.path.join(tmp, "load.db")
+        import agents
+        import outbox
+        from metrics import METRICS
+
+        coordinator = agents.Coordinator()
+        METRICS.reset()
+        latencies: List[float] = []
+        item_ids: Dict[int, int] = {}
+        truth_sources: List[Tuple[int, int]] = []
+        errors = 0
+
+        def submit(sub: Submission):
+            t0 = time.perf_counter()
+            res = coordinator.run_pipeline(sub.image, sub.title, sub.description, sub.item_type, sub.contact)
+            return sub, res, (time.perf_counter() - t0) * 1000
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            for sub, res, ms in pool.map(submit, workload):
+                latencies.append(ms)
+                if res.get("error"):
+                    errors += 1
+                elif sub.item_type == "lost":
+                    item_ids[sub.lost_index] = res["item_id"]
+                elif sub.lost_index is not None:
+                    truth_sources.append((sub.lost_index, res["item_id"]))
+        elapsed = time.perf_counter() - t0
+
+        truth = {(item_ids[i], found) for i, found in truth_sources if i in item_ids}
+        with db.get_pool().connection() as conn:
+            predicted = set(conn.execute("SELECT lost_id, found_id FROM match_pairs").fetchall())
+            # Match notifications are keyed "match:<lost_id>:<found_id>:<channel>".
+            notified = {tuple(int(i) for i in key.split(":")[1:3]) for (key,) in conn.execute(
+                "SELECT idempotency_key FROM notification_outbox WHERE idempotency_key LIKE 'match:%'")}
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        hits = len(predicted & truth)
+        notified_hits = len(notified & truth)
+
+        # Give the dispatcher a moment to drain before counting sends.
+        deadline = time.monotonic() + args.drain_seconds
+        while time.monotonic() < deadline and outbox.outbox_counts().get("pending", 0):
+            time.sleep(0.05)
+
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        report = {
+            "items": len(workload),
+            "errors": errors,
+            "throughput_items_per_s": len(workload) / elapsed,
+            "latency_p50_ms": p50, "latency_p95_ms": p95, "latency_p99_ms": p99,
+            "db_kb": sum(os.path.getsize(os.path.join(tmp, f)) for f in os.listdir(tmp)
+                         if f.startswith("load.db")) / 1024,
+            "image_store_kb": _dir_bytes(os.path.join(tmp, "images")) / 1024,
+            "true_pairs": len(truth),
+            "predicted_pairs": len(predicted),
+            "precision": hits / len(predicted) if predicted else 1.0,
+            "recall": hits / len(truth) if truth else 1.0,
+            "notified_pairs": len(notified),
+            "notify_precision": notified_hits / len(notified) if notified else 1.0,
+            "notify_recall": notified_hits / len(truth) if truth else 1.0,
+            "openai_requests": openai_server.stats["requests"],
+            "twilio_requests": twilio_server.stats["requests"],
+        }
+        for stage, values in sorted(METRICS.snapshot()["stages"].items()):
+            report[f"stage_{stage}_p50_ms"] = values["p50_ms"]
+            report[f"stage_{stage}_p99_ms"] = values["p99_ms"]
+        agents.get_notification_dispatcher().stop()
+        db.get_pool().close()
+    return report
+
+
+def print_report(report: Dict[str, float], baseline: Optional[Dict[str, float]] = None):
+    header = f"{'metric':<34} | {'value':>12}"
+    print(header + (f" | {'baseline':>12} | {'change':>8}" if baseline else ""))
+    for key, value in report.items():
+        line = f"{key:<34} | {value:12.2f}" if isinstance(value, float) else f"{key:<34} | {value:12}"
+        if baseline and key in baseline:
+            old = baseline[key]
+            change = f"{(value - old) / old:+8.1%}" if old else f"{'n/a':>8}"
+            line += f" | {old:12.2f} | {change}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--dup-rate", type=float, default=0.3, help="share of found items copying a lost one")
+    parser.add_argument("--text-noise", type=float, default=0.2, help="share of description words dropped")
+    parser.add_argument("--image-noise", type=float, default=0.5, help="0 = identical photo, 1 = heavy changes")
+    parser.add_argument("--handle-rate", type=float, default=0.0,
+                        help="share of contacts that are chat handles, masked by the privacy agent")
+    parser.add_argument("--openai-latency", type=float, default=0.05, help="seconds per OpenAI request")
+    parser.add_argument("--twilio-latency", type=float, default=0.1, help="seconds per Twilio request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="injected 500s on both stand-ins")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--drain-seconds", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", help="JSON report of an earlier run to compare against")
+    parser.add_argument("--save-baseline", help="write this run's report to this JSON file")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            saved = json.load(f)
+        baseline = saved["report"]
+        ignored = ("baseline", "save_baseline")
+        changed = {k: v for k, v in saved["args"].items() if k not in ignored and getattr(args, k, v) != v}
+        if changed:
+            print(f"note: the baseline ran with different settings: {changed}")
+    report = run(args)
+    print_report(report, baseline)
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "report": report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
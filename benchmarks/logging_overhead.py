@@ -0,0 +1,67 @@
+"""Cost of per-candidate logging in a 50k-candidate matching loop.
+
+Run from the repo root:  python -m benchmarks.logging_overhead
+Log output goes to a line-buffered /dev/null, which behaves like a
+terminal (one write per line); results are printed to the real stdout.
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--candidates", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--sample-rate", type=float, default=0.01)
+    parser.add_argument("--repeat", type=int, default=5, help="best of N runs per variant")
+    args = parser.parse_args()
+
+    out = sys.stdout
+    sys.stdout = open(os.devnull, "w", buffering=1)
+    import logs  # the console handler binds to the redirected stdout
+    log = logs.get_logger("bench")
+    root = logging.getLogger(logs.ROOT)
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.candidates, args.dim), dtype=np.float32)
+    hashes = [int(h) for h in rng.integers(0, 2 ** 63, args.candidates)]
+    query, query_hash = vectors[0], hashes[0]
+
+    def loop(printing=False, trace=None):
+        # Same shape as Coordinator.match_and_notify: one branch per candidate.
+        for i in range(args.candidates):
+            dist = (hashes[i] ^ query_hash).bit_count()
+            sim = float(vectors[i] @ query)
+            if printing:
+                print(f"[DEBUG] Comparing with lost item {i}: phash_diff={dist}, sim={sim:.3f}")
+            elif trace and trace():
+                log.debug("candidate %s: diff=%s sim=%.3f", i, dist, sim)
+
+    def run(label, printing=False, level=logging.INFO, rate=None):
+        root.setLevel(level)
+        logs.TRACE_SAMPLE_RATE = args.sample_rate if rate is None else rate
+        hot = drained = float("inf")
+        for _ in range(args.repeat):
+            trace = logs.Sampler(logs.TRACE_SAMPLE_RATE, seed=0) if logs.tracing(log) else None
+            t0 = time.perf_counter()
+            loop(printing, trace)
+            hot = min(hot, time.perf_counter() - t0)
+            logs._listener.stop()  # wait for queued records to be written
+            logs._listener.start()
+            drained = min(drained, time.perf_counter() - t0)
+        print(f"{label:<36} | loop {hot * 1000:8.1f} ms | incl. log drain {drained * 1000:8.1f} ms", file=out)
+
+    run("no logging", rate=0.0)
+    run("print per candidate (old)", printing=True)
+    run("logs at INFO (traces off)")
+    run(f"logs at DEBUG, {args.sample_rate:.0%} sampled", level=logging.DEBUG)
+    run("logs at DEBUG, every candidate", level=logging.DEBUG, rate=1.0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Inline Twilio sends vs the notification outbox, against a local Twilio stub.
+
+Run from the repo root:  python -m benchmarks.outbox
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from twilio.rest import Client as TwilioClient
+
+import db
+import outbox
+from benchmarks.fake_servers import FakeTwilioServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--recipients", type=int, default=30)
+    parser.add_argument("--latency", type=float, default=0.15)
+    parser.add_argument("--error-rate", type=float, default=0.1)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=50.0, help="sends/sec per channel")
+    args = parser.parse_args()
+
+    outbox.RETRY_BASE_SECONDS = 0.05
+    with tempfile.TemporaryDirectory() as tmp, \
+            FakeTwilioServer(latency=args.latency, error_rate=args.error_rate) as server:
+        db.DB_PATH = os.path.join(tmp, "outbox.db")
+        db.init_db()
+        outbox.init_outbox()
+        client = TwilioClient("ACfake", "token", http_client=outbox.base_url_http_client(server.url))
+        senders = outbox.twilio_senders(client, "+15550000000", "+15550000001")
+        recipients = [f"+1555{i:07d}" for i in range(args.recipients)]
+
+        # What run_pipeline used to do: every channel, serially, inline.
+        t0 = time.perf_counter()
+        failures = 0
+        for to in recipients:
+            for channel in outbox.CHANNELS:
+                try:
+                    senders[channel](to, "Your item may have been found")
+                except Exception:
+                    failures += 1
+        inline = time.perf_counter() - t0
+        print(f"inline   | caller blocked {inline:7.2f} s | {failures} sends lost to errors")
+
+        dispatcher = outbox.NotificationDispatcher(
+            senders, workers=args.workers, rates={ch: args.rate for ch in outbox.CHANNELS}, poll_interval=0.05
+        ).start()
+        t0 = time.perf_counter()
+        for i, to in enumerate(recipients):
+            outbox.enqueue_notification(to, "Your item may have been found", key=f"bench:{i}")
+        enqueued = time.perf_counter() - t0
+        total = len(recipients) * len(outbox.CHANNELS)
+        while outbox.outbox_counts().get("sent", 0) + outbox.outbox_counts().get("failed", 0) < total:
+            time.sleep(0.02)
+        drained = time.perf_counter() - t0
+        dispatcher.stop()
+        # Enqueueing the same keys again must not send anything new.
+        before = server.stats["requests"]
+        for i, to in enumerate(recipients):
+            outbox.enqueue_notification(to, "Your item may have been found", key=f"bench:{i}")
+        print(f"outbox   | caller blocked {enqueued:7.2f} s | drained in {drained:.2f} s | "
+              f"{outbox.outbox_counts()} | duplicate enqueues sent {server.stats['requests'] - before}")
+        db.get_pool().close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Match latency with and without the place/time pre-filter.
+
+Run from the repo root:  python -m benchmarks.prefilter --items 100000 --sites 200
+
+Spreads ``--items`` found items over ``--sites`` sites a few hundred km
+apart and over a year, then times matching a lost item against the whole
+index and against only the candidates ``PlaceIndex`` lets through. No
+database is involved; summaries come from a dict.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from embedding_index import EmbeddingIndex
+from geo_index import ItemPlace, PlaceIndex
+from phash_index import PHashIndex
+from ranking import rank_candidates
+
+YEAR = 365 * 86400.0
+T0 = 1.7e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=100000)
+    parser.add_argument("--sites", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    sites = np.column_stack([rng.uniform(-60, 60, args.sites), rng.uniform(-180, 180, args.sites)])
+    site = rng.integers(0, args.sites, args.items)
+    # Within ~2 km of the site centre, at any time in the year.
+    lats = sites[site, 0] + rng.normal(0, 0.01, args.items)
+    lons = sites[site, 1] + rng.normal(0, 0.01, args.items)
+    times = T0 + rng.uniform(0, YEAR, args.items)
+    vecs = rng.standard_normal((args.items, args.dim), dtype=np.float32)
+    hashes = rng.integers(0, 2 ** 63, args.items, dtype=np.uint64)
+
+    t0 = time.perf_counter()
+    embedding_index, phash_index, place_index = EmbeddingIndex(), PHashIndex(), PlaceIndex()
+    embedding_index.add_many(enumerate(vecs))
+    for i in range(args.items):
+        phash_index.add(i, int(hashes[i]))
+        place_index.add(i, ItemPlace(float(lats[i]), float(lons[i]), None, float(times[i])))
+    print(f"indexed {args.items} items in {time.perf_counter() - t0:.1f} s")
+
+    summaries = {i: {"id": i, "type": "found", "title": f"item {i}", "description": "", "owner_contact": ""}
+                 for i in range(args.items)}
+
+    def fetch(ids):
+        return [summaries[i] for i in ids]
+
+    picks = rng.integers(0, args.items, args.queries)
+    queries = [(vecs[i], int(hashes[i]), ItemPlace(float(lats[i]), float(lons[i]), None, float(times[i]) - 86400))
+               for i in picks]
+
+    t0 = time.perf_counter()
+    for vec, ph, _ in queries:
+        rank_candidates(vec, ph, embedding_index, phash_index, fetch)
+    full_ms = (time.perf_counter() - t0) / args.queries * 1000
+
+    t0 = time.perf_counter()
+    allowed_sizes = []
+    for vec, ph, place in queries:
+        allowed = place_index.candidates(place, "found")
+        allowed_sizes.append(len(allowed))
+        rank_candidates(vec, ph, embedding_index, phash_index, fetch, allowed=allowed)
+    filtered_ms = (time.perf_counter() - t0) / args.queries * 1000
+
+    print(f"{'matching':<11} | {'candidates':>10} | {'ms/match':>8}")
+    print(f"{'full index':<11} | {args.items:10} | {full_ms:8.2f}")
+    print(f"{'prefiltered':<11} | {np.mean(allowed_sizes):10.0f} | {filtered_ms:8.2f}")
+
+
+if __name__ == "__main__":
+    main()
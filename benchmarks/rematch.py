@@ -0,0 +1,68 @@
+"""All-pairs lost x found matching throughput on synthetic data.
+
+Run from the repo root:  python -m benchmarks.rematch --lost 100000 --found 100000
+"""
+import argparse
+import time
+
+import numpy as np
+
+import rematch
+from ranking import DEFAULT_WEIGHTS
+
+
+def synthetic(n: int, dim: int, base: np.ndarray, base_ph: np.ndarray, dup_rate: float,
+              rng: np.random.Generator) -> rematch.ItemMatrix:
+    """Random items, ``dup_rate`` of which are noisy copies of rows of ``base``."""
+    vecs = rng.standard_normal((n, dim), dtype=np.float32)
+    ph = rng.integers(0, 2 ** 63, n, dtype=np.uint64) * np.uint64(2) + rng.integers(0, 2, n, dtype=np.uint64)
+    dups = rng.random(n) < dup_rate
+    src = rng.integers(0, base.shape[0], dups.sum())
+    vecs[dups] = base[src] + 0.3 * rng.standard_normal((dups.sum(), dim), dtype=np.float32)
+    flips = np.zeros(dups.sum(), dtype=np.uint64)
+    for _ in range(6):
+        flips |= np.uint64(1) << rng.integers(0, 64, dups.sum()).astype(np.uint64)
+    ph[dups] = base_ph[src] ^ flips
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    return rematch.ItemMatrix(np.arange(n), vecs, ph, np.ones(n, dtype=bool))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lost", type=int, default=20000)
+    parser.add_argument("--found", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--block", type=int, default=rematch.BLOCK_SIZE)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--dup-rate", type=float, default=0.01)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    base = rng.standard_normal((args.lost, args.dim), dtype=np.float32)
+    base /= np.linalg.norm(base, axis=1, keepdims=True)
+    base_ph = rng.integers(0, 2 ** 63, args.lost, dtype=np.uint64)
+    lost = rematch.ItemMatrix(np.arange(args.lost), base, base_ph, np.ones(args.lost, dtype=bool))
+    found = synthetic(args.found, args.dim, base, base_ph, args.dup_rate, rng)
+    pairs = args.lost * args.found
+
+    # Reference: what per-item incremental matching costs when run for every found item.
+    sample = min(200, args.found)
+    t0 = time.perf_counter()
+    for j in range(sample):
+        sim = lost.embeddings @ found.embeddings[j]
+        dist = rematch.popcount64(lost.phashes ^ found.phashes[j])
+        np.flatnonzero((sim > DEFAULT_WEIGHTS.min_text_similarity) | (dist <= DEFAULT_WEIGHTS.max_phash_distance))
+    per_item = (time.perf_counter() - t0) / sample
+    print(f"per-item scan | {args.lost / per_item:14,.0f} pairs/s | est. {per_item * args.found:8.1f} s total")
+
+    t0 = time.perf_counter()
+    candidates = 0
+    for lost_ids, *_ in rematch.candidate_pairs(lost, found, DEFAULT_WEIGHTS, args.block, args.workers):
+        candidates += lost_ids.size
+    elapsed = time.perf_counter() - t0
+    print(f"blocked       | {pairs / elapsed:14,.0f} pairs/s | {elapsed:8.1f} s total | "
+          f"{args.lost:,} x {args.found:,} | {candidates:,} candidates")
+
+
+if __name__ == "__main__":
+    main()
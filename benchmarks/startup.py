@@ -0,0 +1,59 @@
+"""Cold-start cost of the app: importing agents, and running app.py to first paint.
+
+Each measurement runs in a fresh interpreter against a scratch copy of the
+tree. "First paint" executes app.py top to bottom in Streamlit's bare mode,
+which is everything that happens before the first page reaches the browser.
+Pass ``--tree`` to measure another checkout (e.g. a ``git worktree`` of an
+older commit) for a before/after comparison. Run from the repo root:
+
+    python -m benchmarks.startup
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+IMPORT_AGENTS = "import time; t = time.perf_counter(); import agents; print(time.perf_counter() - t)"
+FIRST_PAINT = (
+    "import time, runpy, logging; logging.disable(logging.WARNING); t = time.perf_counter(); "
+    "runpy.run_path('app.py', run_name='__main__'); print(time.perf_counter() - t)"
+)
+
+
+def measure(tree: str, code: str, runs: int) -> list:
+    times = []
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as tmp:
+            work = os.path.join(tmp, "tree")
+            shutil.copytree(tree, work, ignore=shutil.ignore_patterns(".git", "__pycache__"))
+            out = subprocess.run(
+                [sys.executable, "-c", code], cwd=work, capture_output=True, text=True,
+                env={**os.environ, "PYTHONPATH": work, "PYTHONDONTWRITEBYTECODE": "1"},
+            )
+            if out.returncode != 0:
+                raise RuntimeError(out.stderr.strip().splitlines()[-1] if out.stderr else "failed")
+            times.append(float(out.stdout.strip().splitlines()[-1]))
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tree", default=".")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    for label, code in (("import agents", IMPORT_AGENTS), ("first paint", FIRST_PAINT)):
+        try:
+            times = measure(args.tree, code, args.runs)
+        except RuntimeError as e:
+            print(f"{label:>14} | failed: {e}")
+            continue
+        print(f"{label:>14} | median {statistics.median(times) * 1000:8.1f} ms | "
+              f"min {min(times) * 1000:8.1f} ms | max {max(times) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Match latency and DB size with the whole history indexed vs open items only.
+
+Run from the repo root:  python -m benchmarks.tiering --items 100000 --open 0.1
+
+Builds a database in which only ``--open`` of the lost items are still
+open and recent (the rest are closed or older than ITEM_EXPIRY_DAYS),
+times a found-item match against indexes of all lost items and against
+the tiered indexes, then runs compaction and reports the file sizes.
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import db
+from compaction import compact
+from embedding_index import EmbeddingIndex
+from phash_index import PHashIndex
+from ranking import rank_candidates
+from utils import decode_embedding, phash_from_db
+
+
+def build_indexes(rows_emb, rows_ph):
+    embedding_index, phash_index = EmbeddingIndex(), PHashIndex()
+    embedding_index.add_many((i, decode_embedding(blob)) for i, blob in rows_emb)
+    for i, ph in rows_ph:
+        phash_index.add(i, phash_from_db(ph))
+    return embedding_index, phash_index
+
+
+def time_matches(indexes, queries, phashes) -> float:
+    embedding_index, phash_index = indexes
+    t0 = time.perf_counter()
+    for q, ph in zip(queries, phashes):
+        rank_candidates(q, ph, embedding_index, phash_index, lambda ids: db.fetch_item_summaries(ids, True))
+    return (time.perf_counter() - t0) / len(queries) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=100000)
+    parser.add_argument("--open", type=float, default=0.1, help="share of items still open and recent")
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = os.path.join(tmp, "tiering.db")
+        db.init_db()
+        now = datetime.utcnow()
+        vecs = rng.standard_normal((args.items, args.dim), dtype=np.float32)
+        hashes = rng.integers(0, 2 ** 63, args.items, dtype=np.uint64)
+        is_open = rng.random(args.items) < args.open
+        t0 = time.perf_counter()
+        # Half of the inactive items are closed, the other half are stale.
+        ages = np.where(~is_open & (np.arange(args.items) % 2 == 0), 400, rng.integers(0, 30, args.items))
+        for start in range(0, args.items, 5000):
+            rows = range(start, min(start + 5000, args.items))
+            ids = db.insert_items([{
+                "type": "lost", "title": f"item {i}", "description": "synthetic", "owner_contact": "",
+                "image_phash": f"{int(hashes[i]):016x}", "embedding": vecs[i],
+            } for i in rows])
+            with db.get_pool().transaction(immediate=True) as conn:
+                conn.executemany("UPDATE items SET created_at = ? WHERE id = ?",
+                                 [((now - timedelta(days=int(ages[i]))).isoformat(), item_id)
+                                  for item_id, i in zip(ids, rows)])
+            db.set_item_status([item_id for item_id, i in zip(ids, rows) if not is_open[i] and i % 2 == 1],
+                               "closed")
+        print(f"built {args.items} items in {time.perf_counter() - t0:.1f} s")
+
+        queries = vecs[rng.integers(0, args.items, args.queries)]
+        phashes = [int(h) for h in hashes[rng.integers(0, args.items, args.queries)]]
+
+        with db.get_pool().connection() as conn:
+            all_emb = conn.execute("SELECT id, embedding_blob FROM items").fetchall()
+            all_ph = conn.execute("SELECT id, image_phash_int FROM items").fetchall()
+        t0 = time.perf_counter()
+        everything = build_indexes(all_emb, all_ph)
+        full_load = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        tiered = build_indexes(db.fetch_embeddings("lost"), db.fetch_phashes("lost"))
+        tiered_load = time.perf_counter() - t0
+
+        print(f"{'indexes':<10} | {'items':>7} | {'load s':>7} | {'match ms':>8}")
+        print(f"{'all':<10} | {len(everything[0]):7} | {full_load:7.2f} | "
+              f"{time_matches(everything, queries, phashes):8.2f}")
+        print(f"{'tiered':<10} | {len(tiered[0]):7} | {tiered_load:7.2f} | "
+              f"{time_matches(tiered, queries, phashes):8.2f}")
+
+        before = os.path.getsize(db.DB_PATH)
+        stats = compact()
+        print(f"compaction: {stats} | hot DB {before / 2**20:.1f} -> {os.path.getsize(db.DB_PATH) / 2**20:.1f} MB"
+              f" | archive {os.path.getsize(db.archive_path()) / 2**20:.1f} MB")
+        db.get_pool().close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""Bulk import of lost/found reports from a JSONL or CSV manifest.
+
+Each record needs ``type`` (lost/found) and ``title``, and may carry
+``description``, ``owner_contact`` (or ``contact``), ``image`` (a path,
+relative to the manifest) and where/when it was lost or found:
+``latitude``/``longitude``, ``venue`` and ``occurred_at`` (ISO 8601). Usage:
+
+    python bulk_import.py partner_dump.jsonl [--batch-size 256] [--workers 4]
+
+Images are hashed and copied into the image store in a process pool while
+the previous batch is embedded, every batch is written in one transaction
+together with its checkpoint, and matching runs once the batch is
+committed. Re-running the same command resumes after the last committed batch
+(first matching it, if the previous run stopped before it was matched).
+
+A running api.py picks up the imported items on its next index refresh
+(API_INDEX_REFRESH_SECONDS), without a restart.
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from geo_index import parse_location
+from ingest import ImageFeatures, prepare_image
+from logs import get_logger
+
+log = get_logger("import")
+
+REQUIRED_FIELDS = ("type", "title")
+ITEM_TYPES = ("lost", "found")
+
+
+# ---------- Manifest ----------
+def read_manifest(path: str) -> Iterator[Dict[str, Any]]:
+    """Stream records from a .jsonl or .csv manifest without loading it whole."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            yield from csv.DictReader(f)
+            return
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def _validate(record: Dict[str, Any]) -> Optional[str]:
+    for field in REQUIRED_FIELDS:
+        if not str(record.get(field) or "").strip():
+            return f"missing {field}"
+    if record["type"].strip().lower() not in ITEM_TYPES:
+        return f"unknown type {record['type']!r}"
+    try:
+        parse_location(record)
+    except ValueError as e:
+        return f"bad location or time: {e}"
+    return None
+
+
+def _image_path(record: Dict[str, Any], base_dir: str) -> Optional[str]:
+    path = record.get("image") or record.get("image_path")
+    return os.path.join(base_dir, path) if path else None
+
+
+# ---------- Image hashing and storage (runs in worker processes) ----------
+def hash_image_file(path: Optional[str]) -> Tuple[Optional[ImageFeatures], Optional[str], Optional[str]]:
+    """Features, image-store digest and error message for one image file."""
+    if not path:
+        return None, None, None
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        image, digest = prepare_image(data)
+        return image, digest, None
+    except Exception as e:
+        return None, None, f"{path}: {e}"
+
+
+# ---------- Import ----------
+class ImportStats:
+    def __init__(self):
+        self.items = 0
+        self.skipped = 0
+        self.image_errors = 0
+        self.matches = 0
+        self.stages = {"hash_wait": 0.0, "embed": 0.0, "insert": 0.0, "match": 0.0}
+        self.start = time.perf_counter()
+
+    def report(self) -> str:
+        elapsed = time.perf_counter() - self.start
+        rate = self.items / elapsed if elapsed else 0.0
+        stages = ", ".join(f"{k} {v:.1f}s" for k, v in self.stages.items())
+        return (f"{self.items} items in {elapsed:.1f}s ({rate:.1f} items/s) | skipped {self.skipped} | "
+                f"image errors {self.image_errors} | matches {self.matches} | {stages}")
+
+
+def run_import(manifest: str, batch_size: int = 256, workers: Optional[int] = None,
+               notify: bool = True, restart: bool = False) -> ImportStats:
+    import agents
+    import db
+
+    source = os.path.abspath(manifest)
+    base_dir = os.path.dirname(source)
+    coordinator = agents.Coordinator(dispatch=False)
+    if restart:
+        db.reset_import_checkpoint(source)
+    done = db.fetch_import_checkpoint(source)
+    if done:
+        log.info("resuming %s after record %d", manifest, done)
+
+    stats = ImportStats()
+
+    def match_batch(ids: List[int], items: List[Dict[str, Any]]):
+        t0 = time.perf_counter()
+        timings: Dict[str, float] = {}
+        for item_id, item in zip(ids, items):
+            if notify:
+                coordinator.acknowledge(item_id, item["type"], item["title"], item["owner_contact"])
+            matches, _ = coordinator.match_and_notify(
+                item_id, item["type"], item["owner_contact"], item["embedding"], item["image_phash"],
+                timings, notify, place=agents.item_place(item)
+            )
+            stats.matches += len(matches)
+        db.mark_import_matched(source)
+        stats.stages["match"] += time.perf_counter() - t0
+
+    # A batch committed just before the last run stopped was never matched;
+    # re-running is safe, as every pair is notified under its match_key
+    # and the outbox drops keys it already holds.
+    unmatched = sorted(db.fetch_unmatched_import_ids(source))
+    if unmatched:
+        log.info("matching %d items committed before the last run stopped", len(unmatched))
+        items_by_id = {item["id"]: item for item in db.fetch_items_by_ids(unmatched)}
+        found = [i for i in unmatched if i in items_by_id]
+        match_batch(found, [items_by_id[i] for i in found])
+
+    records = islice(read_manifest(manifest), done, None)
+    position = done
+
+    def next_batch(pool):
+        batch = list(islice(records, batch_size))
+        # Executor.map submits every task now, so hashing overlaps the
+        # embedding and insert of the batch before it.
+        return batch, pool.map(hash_image_file, [_image_path(r, base_dir) for r in batch], chunksize=8)
+
+    # Spawned, not forked: the coordinator already runs threads (log listener,
+    # fan-out pool, index trainer) whose held locks a fork would copy.
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        batch, hashed = next_batch(pool)
+        while batch:
+            upcoming, upcoming_hashed = next_batch(pool)
+
+            t0 = time.perf_counter()
+            features = list(hashed)
+            stats.stages["hash_wait"] += time.perf_counter() - t0
+
+            items: List[Dict[str, Any]] = []
+            for i, (record, (image, digest, error)) in enumerate(zip(batch, features)):
+                problem = _validate(record)
+                if problem:
+                    stats.skipped += 1
+                    log.warning("skipping record %d: %s", position + i + 1, problem)
+                    continue
+                if error:
+                    stats.image_errors += 1
+                    log.warning("image not hashed, importing without it: %s", error)
+                items.append({
+                    "type": record["type"].strip().lower(),
+                    "title": record["title"].strip(),
+                    "description": record.get("description") or "",
+                    "owner_contact": record.get("owner_contact") or record.get("contact") or "",
+                    "image_phash": image.phash if image else None,
+                    "image_dhash": image.dhash if image else None,
+                    "color_hist": image.color_hist if image else None,
+                    "image_sha256": digest,
+                    **parse_location(record),
+                })
+
+            t0 = time.perf_counter()
+            embeddings = agents.get_embedding_client().embed_many(
+                [f"{item['title']}\n{item['description']}" for item in items]
+            )
+            for item, embedding in zip(items, embeddings):
+                item["embedding"] = embedding
+            stats.stages["embed"] += time.perf_counter() - t0
+
+            position += len(batch)
+            t0 = time.perf_counter()
+            ids = agents.insert_items(items, checkpoint=(source, position))
+            stats.stages["insert"] += time.perf_counter() - t0
+
+            # Lost items of this batch are indexed by now, so found items
+            # in the same batch can match them.
+            match_batch(ids, items)
+
+            stats.items += len(items)
+            log.info("%d records committed | %s", position, stats.report())
+            batch, hashed = upcoming, upcoming_hashed
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("manifest", help="path to a .jsonl or .csv manifest")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--workers", type=int, default=None, help="image hashing processes (default: CPU count)")
+    parser.add_argument("--no-notify", action="store_true",
+                        help="store and match without queueing any SMS/WhatsApp/call notifications")
+    parser.add_argument("--restart", action="store_true", help="ignore the saved checkpoint and start over")
+    args = parser.parse_args()
+
+    stats = run_import(args.manifest, args.batch_size, args.workers, notify=not args.no_notify, restart=args.restart)
+    print(f"[IMPORT] done: {stats.report()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Moves closed and expired items out of the hot database.
+
+Closed items, and items older than ITEM_EXPIRY_DAYS, are copied to the
+archive database, deleted from ``items`` (and so from full-text search)
+and evicted from the in-memory matching indexes. The hot DB is then
+VACUUMed once enough of it is free pages. The app runs this on a
+background thread every COMPACTION_INTERVAL_SECONDS; it can also be run
+by hand:
+
+    python compaction.py [--expiry-days 90] [--force-vacuum]
+"""
+import argparse
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import db
+from logs import get_logger
+from metrics import inc, span
+
+log = get_logger("compaction")
+
+COMPACTION_INTERVAL_SECONDS = float(os.getenv("COMPACTION_INTERVAL_SECONDS", "3600"))
+VACUUM_MIN_FREE_RATIO = float(os.getenv("VACUUM_MIN_FREE_RATIO", "0.2"))
+
+ArchivedCallback = Callable[[List[Tuple[int, str]]], Any]
+
+
+def compact(expiry_days: float = db.ITEM_EXPIRY_DAYS, vacuum_min_free: float = VACUUM_MIN_FREE_RATIO,
+            on_archived: Optional[ArchivedCallback] = None) -> Dict[str, Any]:
+    """Archive closed/expired items, then VACUUM if worthwhile; returns stats."""
+    start = time.perf_counter()
+    with span("compaction"):
+        archived = db.archive_items(db.active_since(expiry_days))
+        if archived and on_archived is not None:
+            on_archived(archived)
+        vacuumed = db.vacuum(vacuum_min_free)
+    inc("items_archived", len(archived))
+    stats = {
+        "archived": len(archived),
+        "vacuumed": vacuumed,
+        "db_kb": round(os.path.getsize(db.DB_PATH) / 1024, 1),
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+    log.info("compaction: %s", stats)
+    return stats
+
+
+class CompactionJob:
+    """Runs ``compact`` every ``interval`` seconds on a daemon thread."""
+
+    def __init__(self, interval: float = COMPACTION_INTERVAL_SECONDS,
+                 on_archived: Optional[ArchivedCallback] = None):
+        self.interval = interval
+        self.on_archived = on_archived
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "CompactionJob":
+        if self.interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="compaction", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                compact(on_archived=self.on_archived)
+            except Exception:
+                log.exception("compaction failed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--expiry-days", type=float, default=db.ITEM_EXPIRY_DAYS,
+                        help="archive items older than this (0: only closed items)")
+    parser.add_argument("--force-vacuum", action="store_true", help="VACUUM even with few free pages")
+    args = parser.parse_args()
+    db.init_db()
+    stats = compact(args.expiry_days, 0.0 if args.force_vacuum else VACUUM_MIN_FREE_RATIO)
+    print(f"[COMPACT] {stats} | {db.count_archived()} items in {db.archive_path()}")
+
+
+if __name__ == "__main__":
+    main()
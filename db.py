@@ -0,0 +1,731 @@
+import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
+
+from metrics import inc
+
+from utils import (
+    phash_to_int, phash_to_db,
+    as_embedding_array, encode_embedding, decode_embedding,
+)
+
+DB_PATH = "lostfound.db"
+# On-disk embedding encoding: float32, float16 or int8 (see utils.encode_embedding).
+EMBEDDING_FORMAT = os.getenv("EMBEDDING_FORMAT", "float32")
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+
+ITEM_STATUSES = ("open", "matched", "closed")
+# Items older than this drop out of matching and are moved to the archive
+# by archive_items(); 0 keeps items active until they are closed.
+ITEM_EXPIRY_DAYS = float(os.getenv("ITEM_EXPIRY_DAYS", "90"))
+# Defaults to lostfound.archive.db next to DB_PATH.
+ARCHIVE_DB_PATH = os.getenv("ARCHIVE_DB_PATH")
+
+# Applied to every pooled connection. WAL lets readers run alongside the
+# single writer; NORMAL sync is durable across app crashes in WAL mode.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=268435456",
+)
+
+# ---------- Connection pool ----------
+@contextmanager
+def in_transaction(conn: sqlite3.Connection, immediate: bool = False) -> Iterator[sqlite3.Connection]:
+    """Run a block in one transaction on an autocommit connection."""
+    conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+class ConnectionPool:
+    """Fixed-size, thread-safe pool of tuned SQLite connections.
+
+    Connections run in autocommit mode so transactions are always explicit
+    (see ``transaction``). SQL text is kept in module constants so each
+    connection's statement cache reuses the compiled statements.
+    """
+
+    def __init__(self, path: str, size: int = POOL_SIZE, timeout: float = 30.0):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.timeout,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=256,
+        )
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+        if create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return self._idle.get(timeout=self.timeout)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    @contextmanager
+    def transaction(self, immediate: bool = False) -> Iterator[sqlite3.Connection]:
+        """Run a block in one transaction; IMMEDIATE takes the write lock up front."""
+        with self.connection() as conn, in_transaction(conn, immediate):
+            yield conn
+
+    def close(self):
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+                self._created -= 1
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+    """Pool for the current DB_PATH (created on first use)."""
+    with _pools_lock:
+        pool = _pools.get(DB_PATH)
+        if pool is None:
+            pool = _pools[DB_PATH] = ConnectionPool(DB_PATH)
+        return pool
+
+# ---------- Schema ----------
+ITEM_COLUMNS = ("id, type, title, description, owner_contact, image_phash, embedding_blob, created_at, embedding_json, "
+                "latitude, longitude, venue, occurred_at")
+
+SQL_INSERT_ITEM = """INSERT INTO items
+    (type, title, description, owner_contact, image_phash, image_phash_int, embedding_blob, created_at,
+     image_dhash, color_hist, image_sha256, latitude, longitude, venue, occurred_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+
+def _decode_row_embedding(blob, legacy_json):
+    if blob is not None:
+        return decode_embedding(blob)
+    # Rows not yet converted by migrate_embeddings().
+    return json.loads(legacy_json) if legacy_json else []
+
+def _row_to_item(r) -> Dict[str, Any]:
+    return {
+        "id": r[0],
+        "type": r[1],
+        "title": r[2],
+        "description": r[3],
+        "owner_contact": r[4],
+        "image_phash": r[5],
+        "embedding": _decode_row_embedding(r[6], r[8]),
+        "created_at": r[7],
+        "latitude": r[9],
+        "longitude": r[10],
+        "venue": r[11],
+        "occurred_at": r[12],
+    }
+
+def init_db():
+    with get_pool().transaction(immediate=True) as conn:
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            type TEXT,
+            title TEXT,
+            description TEXT,
+            owner_contact TEXT,
+            image_phash TEXT,
+            embedding_json TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            image_phash_int INTEGER,
+            embedding_blob BLOB,
+            image_dhash TEXT,
+            color_hist BLOB,
+            image_sha256 TEXT,
+            status TEXT NOT NULL DEFAULT 'open',
+            status_changed_at TIMESTAMP,
+            latitude REAL,
+            longitude REAL,
+            venue TEXT,
+            occurred_at TIMESTAMP
+        );
+        """)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(items)")}
+        if "image_phash_int" not in columns:
+            conn.execute("ALTER TABLE items ADD COLUMN image_phash_int INTEGER")
+        if "embedding_blob" not in columns:
+            conn.execute("ALTER TABLE items ADD COLUMN embedding_blob BLOB")
+        if "image_dhash" not in columns:
+            conn.execute("ALTER TABLE items ADD COLUMN image_dhash TEXT")
+        if "color_hist" not in columns:
+            conn.execute("ALTER TABLE items ADD COLUMN color_hist BLOB")
+        if "image_sha256" not in columns:
+            conn.execute("ALTER TABLE items ADD COLUMN image_sha256 TEXT")
+        if "status" not in columns:
+            conn.execute("ALTER TABLE items ADD COLUMN status TEXT NOT NULL DEFAULT 'open'")
+            conn.execute("ALTER TABLE items ADD COLUMN status_changed_at TIMESTAMP")
+        if "latitude" not in columns:
+            # Where and when the item was lost or found; all optional.
+            conn.execute("ALTER TABLE items ADD COLUMN latitude REAL")
+            conn.execute("ALTER TABLE items ADD COLUMN longitude REAL")
+            conn.execute("ALTER TABLE items ADD COLUMN venue TEXT")
+            conn.execute("ALTER TABLE items ADD COLUMN occurred_at TIMESTAMP")
+        # Listing and per-type counts are answered from these indexes alone.
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_items_type_created ON items (type, created_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_items_created ON items (created_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_items_status_created ON items (status, created_at)")
+        _init_fts(conn)
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS embedding_cache (
+            key TEXT PRIMARY KEY,
+            embedding BLOB NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )""")
+        # Agent replies keyed by prompt hash; times are Unix seconds so the
+        # TTL and LRU checks are plain comparisons.
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS agent_responses (
+            key TEXT PRIMARY KEY,
+            agent TEXT NOT NULL,
+            response TEXT NOT NULL,
+            tokens INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL,
+            used_at REAL NOT NULL
+        )""")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_agent_responses_used ON agent_responses (used_at)")
+        # Every (lost, found) pair the matcher has scored, so no pair is
+        # evaluated or notified twice.
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS match_pairs (
+            lost_id INTEGER NOT NULL,
+            found_id INTEGER NOT NULL,
+            score REAL,
+            text_similarity REAL,
+            phash_distance INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            scored_at REAL,
+            PRIMARY KEY (lost_id, found_id)
+        ) WITHOUT ROWID""")
+        if "scored_at" not in {row[1] for row in conn.execute("PRAGMA table_info(match_pairs)")}:
+            conn.execute("ALTER TABLE match_pairs ADD COLUMN scored_at REAL")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_match_pairs_found ON match_pairs (found_id)")
+        # Bulk imports record how far into each manifest they have committed.
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS import_checkpoints (
+            source TEXT PRIMARY KEY,
+            position INTEGER NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            unmatched_ids TEXT
+        )""")
+        if "unmatched_ids" not in {row[1] for row in conn.execute("PRAGMA table_info(import_checkpoints)")}:
+            conn.execute("ALTER TABLE import_checkpoints ADD COLUMN unmatched_ids TEXT")
+        # Backfill rows written before the integer column existed.
+        rows = conn.execute(
+            "SELECT id, image_phash FROM items WHERE image_phash_int IS NULL AND image_phash IS NOT NULL AND image_phash != ''"
+        ).fetchall()
+        conn.executemany(
+            "UPDATE items SET image_phash_int = ? WHERE id = ?",
+            [(phash_to_db(phash_to_int(ph)), item_id) for item_id, ph in rows]
+        )
+    migrate_embeddings()
+
+def _init_fts(conn: sqlite3.Connection):
+    """External-content FTS5 index over title/description, kept in sync by triggers."""
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'items_fts'").fetchone()
+    conn.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+        title, description, content='items', content_rowid='id', tokenize='unicode61'
+    )""")
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS items_fts_ai AFTER INSERT ON items BEGIN
+        INSERT INTO items_fts (rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""")
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS items_fts_ad AFTER DELETE ON items BEGIN
+        INSERT INTO items_fts (items_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END""")
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS items_fts_au AFTER UPDATE OF title, description ON items BEGIN
+        INSERT INTO items_fts (items_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO items_fts (rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""")
+    if not exists:
+        # Index rows that predate the FTS table.
+        conn.execute("INSERT INTO items_fts (items_fts) VALUES ('rebuild')")
+
+def migrate_embeddings(fmt: str = None, batch_size: int = 1000) -> int:
+    """Convert legacy embedding_json rows to packed blobs. Returns rows converted."""
+    fmt = fmt or EMBEDDING_FORMAT
+    pool = get_pool()
+    converted = 0
+    while True:
+        with pool.transaction(immediate=True) as conn:
+            rows = conn.execute(
+                "SELECT id, embedding_json FROM items WHERE embedding_json IS NOT NULL LIMIT ?",
+                (batch_size,)
+            ).fetchall()
+            updates = []
+            for item_id, raw in rows:
+                try:
+                    vec = as_embedding_array(json.loads(raw))
+                except ValueError:
+                    vec = None
+                updates.append((encode_embedding(vec, fmt) if vec is not None else None, item_id))
+            conn.executemany("UPDATE items SET embedding_blob = ?, embedding_json = NULL WHERE id = ?", updates)
+        if not rows:
+            break
+        converted += len(rows)
+    if converted:
+        # Give the space held by the JSON text back to the filesystem.
+        with pool.connection() as conn:
+            conn.execute("VACUUM")
+    return converted
+
+# ---------- Items ----------
+def _item_params(item: Dict[str, Any], created_at: str) -> Tuple:
+    phash = item.get("image_phash")
+    embedding = as_embedding_array(item.get("embedding"))
+    color_hist = as_embedding_array(item.get("color_hist"))
+    occurred_at = item.get("occurred_at") or None
+    if isinstance(occurred_at, datetime):
+        occurred_at = occurred_at.isoformat()
+    return (
+        item["type"], item["title"], item["description"],
+        item.get("owner_contact"), phash,
+        phash_to_db(phash_to_int(phash)) if phash else None,
+        encode_embedding(embedding, EMBEDDING_FORMAT) if embedding is not None else None,
+        created_at,
+        item.get("image_dhash"),
+        encode_embedding(color_hist, "float16") if color_hist is not None else None,
+        item.get("image_sha256"),
+        item.get("latitude"),
+        item.get("longitude"),
+        item.get("venue") or None,
+        occurred_at,
+    )
+
+def insert_item(item: Dict[str, Any]) -> int:
+    return insert_items([item])[0]
+
+def insert_items(items: List[Dict[str, Any]], checkpoint: Optional[Tuple[str, int]] = None) -> List[int]:
+    """Insert many items in a single write transaction; returns their ids in order.
+
+    ``checkpoint`` is a ``(source, position)`` pair saved in the same
+    transaction, so a resumed import never writes a batch twice. The new
+    ids are saved with it as not yet matched, until mark_import_matched.
+    """
+    now = datetime.utcnow().isoformat()
+    params = [_item_params(item, now) for item in items]
+    ids = []
+    with get_pool().transaction(immediate=True) as conn:
+        c = conn.cursor()
+        for p in params:
+            c.execute(SQL_INSERT_ITEM, p)
+            ids.append(c.lastrowid)
+        if checkpoint is not None:
+            c.execute("""INSERT INTO import_checkpoints (source, position, updated_at, unmatched_ids)
+                VALUES (?, ?, CURRENT_TIMESTAMP, ?)
+                ON CONFLICT(source) DO UPDATE SET position = excluded.position, updated_at = excluded.updated_at,
+                    unmatched_ids = excluded.unmatched_ids""",
+                (*checkpoint, json.dumps(ids)))
+    inc("db_rows_written", len(ids), table="items")
+    return ids
+
+def fetch_import_checkpoint(source: str) -> int:
+    """Number of manifest records already committed for ``source`` (0 if none)."""
+    with get_pool().connection() as conn:
+        row = conn.execute("SELECT position FROM import_checkpoints WHERE source = ?", (source,)).fetchone()
+    return row[0] if row else 0
+
+def fetch_unmatched_import_ids(source: str) -> List[int]:
+    """Ids committed by the last batch of ``source`` but not matched yet
+    (the import stopped in between)."""
+    with get_pool().connection() as conn:
+        row = conn.execute("SELECT unmatched_ids FROM import_checkpoints WHERE source = ?", (source,)).fetchone()
+    return json.loads(row[0]) if row and row[0] else []
+
+def mark_import_matched(source: str):
+    with get_pool().transaction() as conn:
+        conn.execute("UPDATE import_checkpoints SET unmatched_ids = NULL WHERE source = ?", (source,))
+
+def reset_import_checkpoint(source: str):
+    with get_pool().transaction() as conn:
+        conn.execute("DELETE FROM import_checkpoints WHERE source = ?", (source,))
+
+def fetch_items_by_ids(ids: List[int]) -> List[Dict[str, Any]]:
+    rows = []
+    with get_pool().connection() as conn:
+        # Stay well under SQLite's bound-parameter limit.
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows.extend(conn.execute(f"SELECT {ITEM_COLUMNS} FROM items WHERE id IN ({placeholders})", chunk))
+    inc("db_rows_read", len(rows), query="fetch_items_by_ids")
+    return [_row_to_item(r) for r in rows]
+
+def fetch_item_summaries(ids: List[int], open_only: bool = False) -> List[Dict[str, Any]]:
+    """Like fetch_items_by_ids but without the embedding, for match cards.
+
+    ``open_only`` skips items another process has closed or matched since
+    they were indexed here.
+    """
+    columns = ("id", "type", "title", "description", "owner_contact", "image_sha256")
+    status_filter = " AND status = 'open'" if open_only else ""
+    rows = []
+    with get_pool().connection() as conn:
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows.extend(conn.execute(
+                f"SELECT {', '.join(columns)} FROM items WHERE id IN ({placeholders}){status_filter}", chunk
+            ))
+    inc("db_rows_read", len(rows), query="fetch_item_summaries")
+    return [dict(zip(columns, r)) for r in rows]
+
+def active_since(expiry_days: float = ITEM_EXPIRY_DAYS) -> str:
+    """Oldest ``created_at`` (as a date) that still counts as active."""
+    if expiry_days <= 0:
+        return ""
+    return (datetime.utcnow() - timedelta(days=expiry_days)).date().isoformat()
+
+# Only open, unexpired items take part in matching.
+ACTIVE_FILTER = "lower(type) = ? AND status = 'open' AND created_at >= ?"
+
+def fetch_phashes(item_type: str, since: Optional[str] = None) -> List[Tuple[int, int]]:
+    """``(id, signed phash)`` for every active item of ``item_type`` that has a hash."""
+    with get_pool().connection() as conn:
+        rows = conn.execute(
+            f"SELECT id, image_phash_int FROM items WHERE {ACTIVE_FILTER} AND image_phash_int IS NOT NULL",
+            (item_type.lower(), active_since() if since is None else since)
+        ).fetchall()
+    inc("db_rows_read", len(rows), query="fetch_phashes")
+    return rows
+
+def fetch_embeddings(item_type: str, since: Optional[str] = None) -> List[Tuple[int, bytes]]:
+    """``(id, embedding blob)`` for every active item of ``item_type`` that has one."""
+    with get_pool().connection() as conn:
+        rows = conn.execute(
+            f"SELECT id, embedding_blob FROM items WHERE {ACTIVE_FILTER} AND embedding_blob IS NOT NULL",
+            (item_type.lower(), active_since() if since is None else since)
+        ).fetchall()
+    inc("db_rows_read", len(rows), query="fetch_embeddings")
+    return rows
+
+def fetch_places(item_type: str, since: Optional[str] = None) -> List[Tuple]:
+    """``(id, latitude, longitude, venue, occurred_at)`` for every active item of ``item_type``."""
+    with get_pool().connection() as conn:
+        rows = conn.execute(
+            f"SELECT id, latitude, longitude, venue, occurred_at FROM items WHERE {ACTIVE_FILTER}",
+            (item_type.lower(), active_since() if since is None else since)
+        ).fetchall()
+    inc("db_rows_read", len(rows), query="fetch_places")
+    return rows
+
+def max_item_id() -> int:
+    with get_pool().connection() as conn:
+        return conn.execute("SELECT COALESCE(MAX(id), 0) FROM items").fetchone()[0]
+
+def fetch_active_items_between(after_id: int, through_id: int) -> List[Dict[str, Any]]:
+    """Open, unexpired items with ``after_id < id <= through_id``, oldest first.
+
+    Ids are handed out under the write lock and committed in order, so an
+    id range that is fully committed never gains rows later.
+    """
+    with get_pool().connection() as conn:
+        rows = conn.execute(
+            f"SELECT {ITEM_COLUMNS} FROM items WHERE id > ? AND id <= ? AND status = 'open' AND created_at >= ? "
+            "ORDER BY id", (after_id, through_id, active_since())
+        ).fetchall()
+    inc("db_rows_read", len(rows), query="fetch_active_items_between")
+    return [_row_to_item(r) for r in rows]
+
+def set_item_status(ids: List[int], status: str) -> List[Tuple[int, str]]:
+    """Set ``status`` on the given items; returns ``(id, type)`` of those changed."""
+    if status not in ITEM_STATUSES:
+        raise ValueError(f"Unknown status {status!r}; expected one of {', '.join(ITEM_STATUSES)}")
+    changed = []
+    with get_pool().transaction(immediate=True) as conn:
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            where = f"id IN ({placeholders}) AND status != ?"
+            changed.extend(conn.execute(f"SELECT id, lower(type) FROM items WHERE {where}", (*chunk, status)))
+            conn.execute(f"UPDATE items SET status = ?, status_changed_at = CURRENT_TIMESTAMP WHERE {where}",
+                         (status, *chunk, status))
+    inc("db_rows_written", len(changed), table="items")
+    return changed
+
+# ---------- Match pairs ----------
+def record_match_pairs(rows: List[Tuple[int, int, float, Optional[float], Optional[int]]]) -> set:
+    """Store ``(lost_id, found_id, score, text_similarity, phash_distance)`` rows.
+
+    A pair recorded before gets the new score. Returns the
+    ``(lost_id, found_id)`` pairs that were not recorded before.
+    """
+    new_pairs = set()
+    if not rows:
+        return new_pairs
+    scored_at = time.time()
+    with get_pool().transaction(immediate=True) as conn:
+        c = conn.cursor()
+        for row in rows:
+            if c.execute("SELECT 1 FROM match_pairs WHERE lost_id = ? AND found_id = ?", row[:2]).fetchone() is None:
+                new_pairs.add((row[0], row[1]))
+            c.execute("""INSERT INTO match_pairs
+                (lost_id, found_id, score, text_similarity, phash_distance, scored_at) VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (lost_id, found_id) DO UPDATE SET score = excluded.score,
+                    text_similarity = excluded.text_similarity, phash_distance = excluded.phash_distance,
+                    scored_at = excluded.scored_at""", (*row, scored_at))
+    inc("db_rows_written", len(rows), table="match_pairs")
+    return new_pairs
+
+def prune_match_pairs(scored_before: float, lost_ids: Iterable[int], found_ids: Iterable[int]) -> int:
+    """Delete pairs of the given lost and found items not scored since ``scored_before``.
+
+    For a full rematch that has just re-scored every pair among these items,
+    these are the pairs that no longer clear the thresholds.
+    """
+    lost_ids, found_ids = set(lost_ids), set(found_ids)
+    with get_pool().transaction(immediate=True) as conn:
+        stale = [
+            pair for pair in conn.execute(
+                "SELECT lost_id, found_id FROM match_pairs WHERE scored_at IS NULL OR scored_at < ?",
+                (scored_before,))
+            if pair[0] in lost_ids and pair[1] in found_ids
+        ]
+        conn.executemany("DELETE FROM match_pairs WHERE lost_id = ? AND found_id = ?", stale)
+    inc("db_rows_written", len(stale), table="match_pairs")
+    return len(stale)
+
+# ---------- Embedding cache ----------
+def fetch_cached_embeddings(keys: List[str]) -> List[Tuple[str, bytes]]:
+    rows = []
+    with get_pool().connection() as conn:
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows.extend(conn.execute(
+                f"SELECT key, embedding FROM embedding_cache WHERE key IN ({placeholders})", chunk
+            ))
+    return rows
+
+def store_cached_embeddings(rows: List[Tuple[str, bytes]]):
+    with get_pool().transaction(immediate=True) as conn:
+        conn.executemany("INSERT OR REPLACE INTO embedding_cache (key, embedding) VALUES (?, ?)", rows)
+
+# ---------- Agent response cache ----------
+def fetch_agent_response(key: str, min_created_at: float) -> Optional[Tuple[str, int, float]]:
+    """``(response, tokens, created_at)`` for a fresh entry, touching its ``used_at``."""
+    with get_pool().transaction(immediate=True) as conn:
+        row = conn.execute(
+            "SELECT response, tokens, created_at FROM agent_responses WHERE key = ? AND created_at >= ?",
+            (key, min_created_at),
+        ).fetchone()
+        if row is not None:
+            conn.execute("UPDATE agent_responses SET used_at = ? WHERE key = ?", (time.time(), key))
+    return tuple(row) if row is not None else None
+
+def store_agent_response(key: str, agent: str, response: str, tokens: int):
+    now = time.time()
+    with get_pool().transaction(immediate=True) as conn:
+        conn.execute("""INSERT OR REPLACE INTO agent_responses
+            (key, agent, response, tokens, created_at, used_at) VALUES (?, ?, ?, ?, ?, ?)""",
+            (key, agent, response, tokens, now, now))
+    inc("db_rows_written", 1, table="agent_responses")
+
+def prune_agent_responses(min_created_at: float, max_rows: int) -> int:
+    """Drop expired entries, then the least recently used beyond ``max_rows``."""
+    with get_pool().transaction(immediate=True) as conn:
+        deleted = conn.execute("DELETE FROM agent_responses WHERE created_at < ?", (min_created_at,)).rowcount
+        deleted += conn.execute("""DELETE FROM agent_responses WHERE key IN (
+            SELECT key FROM agent_responses ORDER BY used_at DESC LIMIT -1 OFFSET ?)""", (max_rows,)).rowcount
+    return deleted
+
+# ---------- Archive ----------
+def archive_path() -> str:
+    return ARCHIVE_DB_PATH or os.path.splitext(DB_PATH)[0] + ".archive.db"
+
+def _sync_archive_schema(conn: sqlite3.Connection):
+    """Create ``archive.items`` like ``main.items``, adding columns added since."""
+    columns = [(r[1], r[2]) for r in conn.execute("PRAGMA main.table_info(items)")]
+    existing = {r[1] for r in conn.execute("PRAGMA archive.table_info(items)")}
+    if not existing:
+        defs = ", ".join(f"{name} {ctype}" + (" PRIMARY KEY" if name == "id" else "") for name, ctype in columns)
+        conn.execute(f"CREATE TABLE archive.items ({defs}, archived_at TIMESTAMP)")
+        return
+    for name, ctype in columns:
+        if name not in existing:
+            conn.execute(f"ALTER TABLE archive.items ADD COLUMN {name} {ctype}")
+
+def archive_items(expired_before: str) -> List[Tuple[int, str]]:
+    """Move closed items, and items created before ``expired_before``, into
+    the archive database; returns ``(id, type)`` of the moved rows.
+
+    The archive is a separate file (attached for the move), so the hot DB
+    can shrink on the next VACUUM. A transaction spanning both files is not
+    atomic in WAL mode, so each step commits to one file only: rows are
+    copied with INSERT OR REPLACE and committed, then deleted from the hot
+    DB if they still qualify. A move interrupted in between leaves the rows
+    in both files and is simply redone next time; archive copies of rows
+    that stopped qualifying meanwhile (e.g. reopened) are dropped again.
+    """
+    where = "(status = 'closed' OR created_at < ?)"
+    with get_pool().connection() as conn:
+        conn.execute("ATTACH DATABASE ? AS archive", (archive_path(),))
+        try:
+            _sync_archive_schema(conn)
+            columns = ", ".join(r[1] for r in conn.execute("PRAGMA main.table_info(items)"))
+            with in_transaction(conn, immediate=True):
+                ids = [r[0] for r in conn.execute(f"SELECT id FROM main.items WHERE {where}", (expired_before,))]
+                for start in range(0, len(ids), 500):
+                    chunk = ids[start:start + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    conn.execute(f"""INSERT OR REPLACE INTO archive.items ({columns}, archived_at)
+                        SELECT {columns}, CURRENT_TIMESTAMP FROM main.items WHERE id IN ({placeholders})""", chunk)
+            moved = []
+            with in_transaction(conn, immediate=True):
+                for start in range(0, len(ids), 500):
+                    chunk = ids[start:start + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    match = f"id IN ({placeholders}) AND {where}"
+                    moved.extend(conn.execute(f"SELECT id, lower(type) FROM main.items WHERE {match}",
+                                              (*chunk, expired_before)))
+                    conn.execute(f"DELETE FROM main.items WHERE {match}", (*chunk, expired_before))
+            # Copies of rows still in the hot DB are stale: rows reopened
+            # since they were copied, by this run or by an interrupted one.
+            # Ids are AUTOINCREMENT, so an archived id is never reused.
+            with in_transaction(conn, immediate=True):
+                conn.execute("DELETE FROM archive.items WHERE id IN (SELECT id FROM main.items)")
+        finally:
+            conn.execute("DETACH DATABASE archive")
+    inc("db_rows_written", len(moved), table="items_archive")
+    return moved
+
+def count_archived() -> int:
+    if not os.path.exists(archive_path()):
+        return 0
+    conn = sqlite3.connect(archive_path())
+    try:
+        return conn.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+    except sqlite3.OperationalError:  # no item archived yet
+        return 0
+    finally:
+        conn.close()
+
+def vacuum(min_free_ratio: float = 0.0) -> bool:
+    """VACUUM the hot DB if at least ``min_free_ratio`` of its pages are free.
+
+    VACUUM rewrites the whole file and holds the write lock meanwhile, so it
+    is skipped while there is little to reclaim.
+    """
+    with get_pool().connection() as conn:
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        total = conn.execute("PRAGMA page_count").fetchone()[0]
+        if not total or free / total < min_free_ratio:
+            return False
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return True
+
+# ---------- UI queries ----------
+DISPLAY_COLUMNS = ("id", "type", "title", "description", "created_at", "image_sha256", "status")
+
+def count_by_type() -> Dict[str, int]:
+    with get_pool().connection() as conn:
+        return dict(conn.execute("SELECT type, COUNT(*) FROM items GROUP BY type").fetchall())
+
+def recent_items(limit: int = 20, offset: int = 0, item_type: str = None) -> List[Dict[str, Any]]:
+    """Newest items first, display columns only (no embeddings are read)."""
+    sql = f"SELECT {', '.join(DISPLAY_COLUMNS)} FROM items"
+    params: List[Any] = []
+    if item_type:
+        sql += " WHERE type = ?"
+        params.append(item_type)
+    sql += " ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?"
+    params += [limit, offset]
+    with get_pool().connection() as conn:
+        rows = conn.execute(sql, params).fetchall()
+    inc("db_rows_read", len(rows), query="recent_items")
+    return [dict(zip(DISPLAY_COLUMNS, r)) for r in rows]
+
+# ---------- Full-text search ----------
+# bm25() weights per FTS column: a title hit counts more than a description hit.
+SEARCH_WEIGHTS = (2.0, 1.0)
+
+def _fts_query(text: str) -> str:
+    """Turn free text into an FTS5 query: every word must match, as a prefix."""
+    terms = re.findall(r"\w+", text)
+    return " ".join(f'"{t}"*' for t in terms)
+
+def _search_sql(select: str, item_type: str = None) -> str:
+    sql = f"SELECT {select} FROM items_fts JOIN items i ON i.id = items_fts.rowid WHERE items_fts MATCH ?"
+    if item_type:
+        sql += " AND i.type = ?"
+    return sql
+
+def search_items(text: str, limit: int = 20, offset: int = 0, item_type: str = None) -> List[Dict[str, Any]]:
+    """BM25-ranked items whose title or description match every word of ``text``."""
+    query = _fts_query(text)
+    if not query:
+        return []
+    params: List[Any] = [query] + ([item_type] if item_type else [])
+    weights = ", ".join(str(w) for w in SEARCH_WEIGHTS)
+    sql = (_search_sql(", ".join(f"i.{c}" for c in DISPLAY_COLUMNS), item_type)
+           + f" ORDER BY bm25(items_fts, {weights}) LIMIT ? OFFSET ?")
+    with get_pool().connection() as conn:
+        rows = conn.execute(sql, params + [limit, offset]).fetchall()
+    inc("db_rows_read", len(rows), query="search_items")
+    return [dict(zip(DISPLAY_COLUMNS, r)) for r in rows]
+
+def count_search_results(text: str, item_type: str = None) -> int:
+    query = _fts_query(text)
+    if not query:
+        return 0
+    params: List[Any] = [query] + ([item_type] if item_type else [])
+    with get_pool().connection() as conn:
+        return conn.execute(_search_sql("COUNT(*)", item_type), params).fetchone()[0]
@@ -0,0 +1,156 @@
+import hashlib
+import queue
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import db
+from metrics import inc, span
+from utils import decode_embedding, encode_embedding
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form used both for the cache key and for the API input."""
+    return " ".join(unicodedata.normalize("NFC", text or "").split())
+
+
+def cache_key(text: str, model: str = EMBEDDING_MODEL) -> str:
+    return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Content-addressed embedding cache: an in-process LRU in front of the
+    ``embedding_cache`` table, so duplicates survive restarts too."""
+
+    def __init__(self, memory_size: int = 4096):
+        self.memory_size = memory_size
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, key: str, vec: np.ndarray):
+        self._memory[key] = vec
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, np.ndarray]:
+        found, missing = {}, []
+        with self._lock:
+            for key in keys:
+                vec = self._memory.get(key)
+                if vec is None:
+                    missing.append(key)
+                else:
+                    self._memory.move_to_end(key)
+                    found[key] = vec
+        if missing:
+            stored = {key: decode_embedding(blob) for key, blob in db.fetch_cached_embeddings(missing)}
+            with self._lock:
+                for key, vec in stored.items():
+                    self._remember(key, vec)
+            found.update(stored)
+        return found
+
+    def put_many(self, items: Iterable[Tuple[str, np.ndarray]]):
+        items = list(items)
+        db.store_cached_embeddings([(key, encode_embedding(vec)) for key, vec in items])
+        with self._lock:
+            for key, vec in items:
+                self._remember(key, vec)
+
+
+class BatchingEmbeddingClient:
+    """Embeddings-endpoint client that coalesces concurrent requests.
+
+    Callers block on a future while a single worker thread gathers queued
+    texts for up to ``max_wait`` seconds (or ``max_batch`` texts) and sends
+    them in one API call. Texts already cached, or already in flight for
+    another caller, never reach the network.
+    """
+
+    def __init__(self, client, model: str = EMBEDDING_MODEL, max_batch: int = 128,
+                 max_wait: float = 0.01, cache: Optional[EmbeddingCache] = None):
+        self.client = client
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.cache = cache
+        self.stats = {"texts": 0, "cache_hits": 0, "coalesced": 0, "api_calls": 0, "api_texts": 0}
+        self._queue: "queue.Queue[Tuple[str, str]]" = queue.Queue()
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+
+    def embed(self, text: str, timeout: Optional[float] = None) -> np.ndarray:
+        return self.embed_many([text], timeout=timeout)[0]
+
+    def embed_many(self, texts: Sequence[str], timeout: Optional[float] = None) -> List[np.ndarray]:
+        keys = [cache_key(t, self.model) for t in texts]
+        results = self.cache.get_many(set(keys)) if self.cache else {}
+        waiting: Dict[str, Future] = {}
+        with self._lock:
+            self.stats["texts"] += len(keys)
+            self.stats["cache_hits"] += sum(1 for k in keys if k in results)
+            for key, text in zip(keys, texts):
+                if key in results or key in waiting:
+                    continue
+                fut = self._pending.get(key)
+                if fut is None:
+                    fut = self._pending[key] = Future()
+                    self._queue.put((key, normalize_text(text)))
+                else:
+                    self.stats["coalesced"] += 1
+                waiting[key] = fut
+            if waiting and (self._worker is None or not self._worker.is_alive()):
+                self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._worker.start()
+        for key, fut in waiting.items():
+            results[key] = fut.result(timeout)
+        return [results[k] for k in keys]
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._send(batch)
+
+    def _send(self, batch: List[Tuple[str, str]]):
+        keys = [key for key, _ in batch]
+        try:
+            with span("embedding_api"):
+                resp = self.client.embeddings.create(model=self.model, input=[text for _, text in batch])
+            inc("llm_requests", agent="embedding")
+            inc("llm_tokens", getattr(getattr(resp, "usage", None), "total_tokens", 0) or 0, agent="embedding")
+            data = sorted(resp.data, key=lambda d: d.index)
+            vectors = [np.asarray(d.embedding, dtype=np.float32) for d in data]
+            if len(vectors) != len(keys):
+                raise RuntimeError(f"Expected {len(keys)} embeddings, got {len(vectors)}")
+            # Cache before releasing the futures so a caller arriving in
+            # between finds the vector instead of queueing it again.
+            if self.cache:
+                self.cache.put_many(zip(keys, vectors))
+        except Exception as e:
+            with self._lock:
+                for key in keys:
+                    self._pending.pop(key).set_exception(e)
+            return
+        with self._lock:
+            self.stats["api_calls"] += 1
+            self.stats["api_texts"] += len(keys)
+            for key, vec in zip(keys, vectors):
+                self._pending.pop(key).set_result(vec)
@@ -0,0 +1,125 @@
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def normalize(vec: Sequence[float]) -> Optional[np.ndarray]:
+    """Unit-length float32 copy of ``vec``, or None if it has no direction."""
+    arr = np.asarray(vec, dtype=np.float32).ravel()
+    if arr.size == 0:
+        return None
+    norm = float(np.linalg.norm(arr))
+    if norm == 0.0 or not np.isfinite(norm):
+        return None
+    return arr / norm
+
+
+class EmbeddingIndex:
+    """In-memory matrix of L2-normalized float32 embeddings keyed by item id.
+
+    Rows are normalized on insert, so a query is a single matrix-vector
+    product that yields cosine similarities for every stored item at once.
+    """
+
+    def __init__(self, dim: Optional[int] = None, capacity: int = 1024):
+        self.dim = dim
+        self._capacity = max(1, capacity)
+        self._matrix = np.empty((self._capacity, dim), dtype=np.float32) if dim else None
+        self._ids = np.empty(self._capacity, dtype=np.int64)
+        self._pos: Dict[int, int] = {}
+        self._size = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, item_id: int) -> bool:
+        return item_id in self._pos
+
+    def ids(self) -> List[int]:
+        with self._lock:
+            return self._ids[:self._size].tolist()
+
+    def _grow(self, needed: int):
+        capacity = self._capacity
+        while capacity < needed:
+            capacity *= 2
+        if capacity == self._capacity:
+            return
+        matrix = np.empty((capacity, self.dim), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        ids = np.empty(capacity, dtype=np.int64)
+        ids[:self._size] = self._ids[:self._size]
+        self._matrix, self._ids, self._capacity = matrix, ids, capacity
+
+    def add(self, item_id: int, embedding: Sequence[float]) -> bool:
+        """Insert or replace one vector. Returns False if it was unusable."""
+        vec = normalize(embedding)
+        if vec is None:
+            return False
+        with self._lock:
+            if self.dim is None:
+                self.dim = vec.size
+                self._matrix = np.empty((self._capacity, self.dim), dtype=np.float32)
+            if vec.size != self.dim:
+                return False
+            pos = self._pos.get(item_id)
+            if pos is None:
+                self._grow(self._size + 1)
+                pos = self._size
+                self._size += 1
+                self._pos[item_id] = pos
+                self._ids[pos] = item_id
+            self._matrix[pos] = vec
+            return True
+
+    def add_many(self, items: Iterable[Tuple[int, Sequence[float]]]) -> int:
+        added = 0
+        for item_id, embedding in items:
+            added += self.add(item_id, embedding)
+        return added
+
+    def remove(self, item_id: int) -> bool:
+        with self._lock:
+            pos = self._pos.pop(item_id, None)
+            if pos is None:
+                return False
+            last = self._size - 1
+            if pos != last:
+                # Move the last row into the hole to keep the matrix dense.
+                self._matrix[pos] = self._matrix[last]
+                moved = int(self._ids[last])
+                self._ids[pos] = moved
+                self._pos[moved] = pos
+            self._size = last
+            return True
+
+    def get(self, item_id: int) -> Optional[np.ndarray]:
+        """The stored (normalized) vector for ``item_id``."""
+        with self._lock:
+            pos = self._pos.get(item_id)
+            return None if pos is None else self._matrix[pos].copy()
+
+    def search(self, query: Sequence[float], k: Optional[int] = None,
+               min_score: Optional[float] = None) -> List[Tuple[int, float]]:
+        """Return ``(item_id, cosine)`` pairs, best first.
+
+        ``min_score`` keeps only scores strictly above it; ``k`` caps the
+        number of results using a partial sort instead of a full one.
+        """
+        q = normalize(query)
+        with self._lock:
+            if q is None or self._size == 0 or q.size != self.dim:
+                return []
+            scores = self._matrix[:self._size] @ q
+            ids = self._ids[:self._size].copy()
+
+        if min_score is not None:
+            keep = np.flatnonzero(scores > min_score)
+            scores, ids = scores[keep], ids[keep]
+        if k is not None and k < scores.size:
+            top = np.argpartition(-scores, k)[:k]
+            scores, ids = scores[top], ids[top]
+        order = np.argsort(-scores, kind="stable")
+        return [(int(ids[i]), float(scores[i])) for i in order]
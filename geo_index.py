@@ -0,0 +1,255 @@
+"""Where/when pre-filter for matching.
+
+Items may carry coordinates, a venue name and the time they were lost or
+found. A lost and a found item are a plausible pair unless that
+information rules it out:
+
+* both have coordinates and are more than GEO_RADIUS_KM apart, or
+* neither comparison by coordinates is possible, both name a venue and the
+  venues differ, or
+* both have a time and the item was found more than MATCH_TIME_WINDOW_DAYS
+  after it was lost, or more than MATCH_TIME_SLACK_DAYS before.
+
+``PlaceIndex`` answers "which indexed items are plausible for this one"
+from a lat/lon grid whose cells are at least the radius wide (so only the
+3x3 neighbourhood is probed), venue buckets and a sorted timeline, without
+looking at embeddings or image hashes.
+"""
+import bisect
+import math
+import os
+import re
+import threading
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple
+
+GEO_RADIUS_KM = float(os.getenv("GEO_RADIUS_KM", "5"))
+TIME_WINDOW_DAYS = float(os.getenv("MATCH_TIME_WINDOW_DAYS", "30"))
+TIME_SLACK_DAYS = float(os.getenv("MATCH_TIME_SLACK_DAYS", "1"))
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+DAY = 86400.0
+
+
+class ItemPlace(NamedTuple):
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    venue: Optional[str] = None       # normalized, see normalize_venue
+    occurred_at: Optional[float] = None  # Unix seconds
+
+    @property
+    def has_coords(self) -> bool:
+        return self.latitude is not None and self.longitude is not None
+
+
+def normalize_venue(venue: Optional[str]) -> Optional[str]:
+    words = re.findall(r"\w+", (venue or "").casefold())
+    return " ".join(words) or None
+
+
+def parse_time(value) -> Optional[float]:
+    """Unix seconds from a datetime, an ISO string (naive means UTC) or a number."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def parse_location(fields: Dict[str, Any]) -> Dict[str, Any]:
+    """``latitude``/``longitude``/``venue``/``occurred_at`` from a manifest
+    record or form, blanks as None; raises ValueError on bad values."""
+    lat, lon = fields.get("latitude"), fields.get("longitude")
+    has_coords = lat not in (None, "") and lon not in (None, "")
+    location = {
+        "latitude": float(lat) if has_coords else None,
+        "longitude": float(lon) if has_coords else None,
+        "venue": str(fields.get("venue") or "").strip() or None,
+        "occurred_at": str(fields.get("occurred_at") or "").strip() or None,
+    }
+    if has_coords and not (-90 <= location["latitude"] <= 90 and -180 <= location["longitude"] <= 180):
+        raise ValueError(f"coordinates out of range: {lat}, {lon}")
+    if location["occurred_at"]:
+        parse_time(location["occurred_at"])
+    return location
+
+
+def make_place(latitude=None, longitude=None, venue=None, occurred_at=None) -> ItemPlace:
+    has_coords = latitude is not None and longitude is not None
+    return ItemPlace(
+        float(latitude) if has_coords else None,
+        float(longitude) if has_coords else None,
+        normalize_venue(venue),
+        parse_time(occurred_at),
+    )
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def time_bounds(at: float, looking_for: str, window_days: float = TIME_WINDOW_DAYS,
+                slack_days: float = TIME_SLACK_DAYS) -> Tuple[float, float]:
+    """Range of ``occurred_at`` that a ``looking_for`` item may have, given this item's time."""
+    if looking_for == "lost":  # this is the found item: the loss came before it
+        return at - window_days * DAY, at + slack_days * DAY
+    return at - slack_days * DAY, at + window_days * DAY
+
+
+def plausible(lost: ItemPlace, found: ItemPlace, radius_km: float = GEO_RADIUS_KM,
+              window_days: float = TIME_WINDOW_DAYS, slack_days: float = TIME_SLACK_DAYS) -> bool:
+    if lost.has_coords and found.has_coords:
+        if haversine_km(lost.latitude, lost.longitude, found.latitude, found.longitude) > radius_km:
+            return False
+    elif lost.venue and found.venue and lost.venue != found.venue:
+        return False
+    if lost.occurred_at is not None and found.occurred_at is not None:
+        lo, hi = time_bounds(found.occurred_at, "lost", window_days, slack_days)
+        return lo <= lost.occurred_at <= hi
+    return True
+
+
+@lru_cache(maxsize=None)
+def _row_columns(row: int, row_height: float, radius_km: float) -> int:
+    """Columns in a grid row, chosen so each is at least ``radius_km`` wide
+    even at the row's poleward edge."""
+    lat_lo = row * row_height - 90
+    edge = max(abs(lat_lo), abs(lat_lo + row_height))
+    if edge >= 90:  # the row around a pole is one cell
+        return 1
+    min_width = radius_km / (KM_PER_DEGREE * math.cos(math.radians(edge)))
+    return max(1, int(360 // min_width))
+
+
+class PlaceIndex:
+    """Items of one type by grid cell, venue and time, for ``candidates``."""
+
+    def __init__(self, radius_km: float = GEO_RADIUS_KM, window_days: float = TIME_WINDOW_DAYS,
+                 slack_days: float = TIME_SLACK_DAYS):
+        self.radius_km = radius_km
+        self.window_days = window_days
+        self.slack_days = slack_days
+        self._row_height = radius_km / KM_PER_DEGREE
+        self._places: Dict[int, ItemPlace] = {}
+        self._cells: Dict[Tuple[int, int], Set[int]] = {}
+        self._venue_only: Dict[str, Set[int]] = {}   # venue but no coordinates
+        self._all_venue_only: Set[int] = set()
+        self._by_venue: Dict[str, Set[int]] = {}
+        self._no_venue: Set[int] = set()
+        self._unplaced: Set[int] = set()            # neither coordinates nor venue
+        self._times: List[float] = []                # sorted, parallel to _time_ids
+        self._time_ids: List[int] = []
+        self._untimed: Set[int] = set()
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._places)
+
+    def __contains__(self, item_id: int) -> bool:
+        return item_id in self._places
+
+    def _cell(self, lat: float, lon: float, row: Optional[int] = None) -> Tuple[int, int]:
+        if row is None:
+            row = int((min(max(lat, -90.0), 90.0) + 90) // self._row_height)
+        columns = _row_columns(row, self._row_height, self.radius_km)
+        return row, int((lon + 180) // (360 / columns)) % columns
+
+    def add(self, item_id: int, place: ItemPlace):
+        with self._lock:
+            if item_id in self._places:
+                self.remove(item_id)
+            self._places[item_id] = place
+            if place.has_coords:
+                self._cells.setdefault(self._cell(place.latitude, place.longitude), set()).add(item_id)
+            elif place.venue:
+                self._venue_only.setdefault(place.venue, set()).add(item_id)
+                self._all_venue_only.add(item_id)
+            else:
+                self._unplaced.add(item_id)
+            if place.venue:
+                self._by_venue.setdefault(place.venue, set()).add(item_id)
+            else:
+                self._no_venue.add(item_id)
+            if place.occurred_at is None:
+                self._untimed.add(item_id)
+            else:
+                i = bisect.bisect_right(self._times, place.occurred_at)
+                self._times.insert(i, place.occurred_at)
+                self._time_ids.insert(i, item_id)
+
+    def remove(self, item_id: int) -> bool:
+        with self._lock:
+            place = self._places.pop(item_id, None)
+            if place is None:
+                return False
+            if place.has_coords:
+                self._discard(self._cells, self._cell(place.latitude, place.longitude), item_id)
+            elif place.venue:
+                self._discard(self._venue_only, place.venue, item_id)
+                self._all_venue_only.discard(item_id)
+            self._unplaced.discard(item_id)
+            if place.venue:
+                self._discard(self._by_venue, place.venue, item_id)
+            self._no_venue.discard(item_id)
+            self._untimed.discard(item_id)
+            if place.occurred_at is not None:
+                i = bisect.bisect_left(self._times, place.occurred_at)
+                while self._time_ids[i] != item_id:
+                    i += 1
+                del self._times[i], self._time_ids[i]
+            return True
+
+    @staticmethod
+    def _discard(buckets: Dict, key, item_id: int):
+        bucket = buckets.get(key)
+        if bucket is not None:
+            bucket.discard(item_id)
+            if not bucket:
+                del buckets[key]
+
+    def _near(self, lat: float, lon: float) -> Set[int]:
+        row, _ = self._cell(lat, lon)
+        found = set()
+        for r in (row - 1, row, row + 1):
+            if not 0 <= r * self._row_height <= 180:
+                continue
+            columns = _row_columns(r, self._row_height, self.radius_km)
+            _, col = self._cell(lat, lon, r)
+            for c in {(col - 1) % columns, col, (col + 1) % columns}:
+                for item_id in self._cells.get((r, c), ()):
+                    other = self._places[item_id]
+                    if haversine_km(lat, lon, other.latitude, other.longitude) <= self.radius_km:
+                        found.add(item_id)
+        return found
+
+    def _place_candidates(self, place: ItemPlace) -> Optional[Set[int]]:
+        if place.has_coords:
+            venue_only = self._venue_only.get(place.venue, set()) if place.venue else self._all_venue_only
+            return self._near(place.latitude, place.longitude) | self._unplaced | venue_only
+        if place.venue:
+            return self._by_venue.get(place.venue, set()) | self._no_venue
+        return None
+
+    def candidates(self, place: ItemPlace, looking_for: str) -> Optional[Set[int]]:
+        """Ids of indexed (``looking_for``-type) items plausible for ``place``,
+        or None if the place carries nothing to filter on."""
+        with self._lock:
+            ids = self._place_candidates(place)
+            if place.occurred_at is None:
+                return ids
+            lo, hi = time_bounds(place.occurred_at, looking_for, self.window_days, self.slack_days)
+            if ids is None:
+                start = bisect.bisect_left(self._times, lo)
+                end = bisect.bisect_right(self._times, hi)
+                return set(self._time_ids[start:end]) | self._untimed
+            places = self._places
+            return {i for i in ids
+                    if places[i].occurred_at is None or lo <= places[i].occurred_at <= hi}
@@ -0,0 +1,146 @@
+"""Content-addressed on-disk store for uploaded images.
+
+Each upload is kept once, under its SHA-256, next to WebP thumbnails in
+``THUMB_SIZES`` (longest side, in pixels):
+
+    <IMAGE_STORE_DIR>/ab/abcdef...          original bytes
+    <IMAGE_STORE_DIR>/ab/abcdef....256.webp thumbnail
+
+Resizing and WebP encoding cost several times the hashing an upload needs,
+so ``put`` writes the original and leaves the thumbnails to a background
+thread; ``thumbnail_path`` makes any still missing (not yet written, or
+lost to a crash) on demand. Files are written to a temporary name and
+renamed into place, so readers never see a partial file and concurrent
+writers of the same image (app threads, import worker processes) are
+harmless.
+"""
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, Optional, Sequence
+
+from PIL import Image
+
+from logs import get_logger
+
+IMAGE_STORE_DIR = os.getenv("IMAGE_STORE_DIR", "image_store")
+THUMB_SIZES = tuple(int(s) for s in os.getenv("IMAGE_THUMB_SIZES", "96,256,512").split(","))
+WEBP_QUALITY = int(os.getenv("IMAGE_WEBP_QUALITY", "80"))
+# Decoded images waiting for their thumbnails are held in memory; beyond
+# this many, put() makes the thumbnails itself.
+THUMB_QUEUE_MAX = int(os.getenv("IMAGE_THUMB_QUEUE_MAX", "32"))
+
+log = get_logger("image_store")
+
+
+def image_digest(image_bytes: bytes) -> str:
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def decode_for_thumbnails(image_bytes: bytes, sizes: Sequence[int] = THUMB_SIZES) -> Image.Image:
+    """Decode at the smallest scale that still covers the largest thumbnail."""
+    img = Image.open(io.BytesIO(image_bytes))
+    largest = max(sizes)
+    img.draft("RGB", (largest, largest))
+    img.load()
+    return img
+
+
+def make_thumbnails(img: Image.Image, sizes: Sequence[int] = THUMB_SIZES,
+                    quality: int = WEBP_QUALITY) -> Dict[int, bytes]:
+    """WebP thumbnails of a decoded image, largest size first; ``img`` is left as is."""
+    if img.mode in ("RGB", "RGBA"):
+        img = img.copy()
+    else:
+        img = img.convert("RGBA" if "transparency" in img.info or img.mode in ("LA", "PA") else "RGB")
+    thumbs = {}
+    for size in sorted(sizes, reverse=True):
+        img.thumbnail((size, size), Image.Resampling.LANCZOS)
+        buf = io.BytesIO()
+        img.save(buf, "WEBP", quality=quality)
+        thumbs[size] = buf.getvalue()
+    return thumbs
+
+
+class ImageStore:
+    def __init__(self, root: str = IMAGE_STORE_DIR, sizes: Sequence[int] = THUMB_SIZES):
+        self.root = root
+        self.sizes = tuple(sizes)
+        self._thumbnailer = ThreadPoolExecutor(1, thread_name_prefix="thumbnails")
+        self._queue_slots = threading.BoundedSemaphore(THUMB_QUEUE_MAX)
+
+    def path(self, digest: str, size: Optional[int] = None) -> str:
+        name = digest if size is None else f"{digest}.{size}.webp"
+        return os.path.join(self.root, digest[:2], name)
+
+    def __contains__(self, digest: str) -> bool:
+        return os.path.exists(self.path(digest))
+
+    def _write(self, path: str, data: bytes):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def _write_thumbnails(self, digest: str, decoded: Optional[Image.Image] = None):
+        if decoded is None:
+            with open(self.path(digest), "rb") as f:
+                decoded = decode_for_thumbnails(f.read(), self.sizes)
+        for size, data in make_thumbnails(decoded, self.sizes).items():
+            self._write(self.path(digest, size), data)
+
+    def _write_queued_thumbnails(self, digest: str, decoded: Optional[Image.Image]):
+        try:
+            self._write_thumbnails(digest, decoded)
+        except Exception:
+            log.exception("thumbnails for %s failed; they will be made when first read", digest)
+        finally:
+            self._queue_slots.release()
+
+    def put(self, image_bytes: bytes, decoded: Optional[Image.Image] = None) -> str:
+        """Store an upload and queue its thumbnails; returns its SHA-256 hex digest.
+
+        ``decoded`` is the upload already decoded to at least the largest
+        thumbnail size; the thumbnails are made from it instead of decoding
+        again, so it must not be changed afterwards. Identical uploads are
+        stored once: if the original is already there, nothing is written.
+        """
+        digest = image_digest(image_bytes)
+        if digest in self:
+            return digest
+        self._write(self.path(digest), image_bytes)
+        if self._queue_slots.acquire(blocking=False):
+            self._thumbnailer.submit(self._write_queued_thumbnails, digest, decoded)
+        else:
+            self._write_thumbnails(digest, decoded)
+        return digest
+
+    def thumbnail_size(self, size: int) -> int:
+        """The smallest stored thumbnail at least ``size`` pixels, else the largest."""
+        return min((s for s in self.sizes if s >= size), default=max(self.sizes))
+
+    def thumbnail_path(self, digest: str, size: int) -> Optional[str]:
+        """Path of the thumbnail for ``size`` (see ``thumbnail_size``), or
+        ``None`` for an unknown image. A missing thumbnail is made first."""
+        path = self.path(digest, self.thumbnail_size(size))
+        if os.path.exists(path):
+            return path
+        if digest not in self:
+            return None
+        self._write_thumbnails(digest)
+        return path
+
+
+@lru_cache(maxsize=None)
+def get_image_store() -> ImageStore:
+    return ImageStore()
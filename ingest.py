@@ -0,0 +1,100 @@
+import io
+import os
+import time
+from typing import Any, Dict, NamedTuple, Tuple
+
+import numpy as np
+from PIL import Image
+
+from image_store import get_image_store
+
+# Uploads above either cap are rejected before any pixel data is decoded.
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", str(50_000_000)))
+
+# pHash resizes to 32x32 and dHash to 9x8, so nothing is gained by decoding
+# beyond a few hundred pixels; JPEGs are decoded straight at 1/2..1/8 scale.
+WORK_SIZE = int(os.getenv("INGEST_WORK_SIZE", "256"))
+HIST_LEVELS = 4  # per channel, i.e. a 64-bin joint RGB histogram
+
+
+class ImageFeatures(NamedTuple):
+    phash: str
+    dhash: str
+    color_hist: np.ndarray
+    stats: Dict[str, Any]
+
+
+def color_histogram(img: Image.Image, levels: int = HIST_LEVELS) -> np.ndarray:
+    """Normalized joint RGB histogram with ``levels`` buckets per channel."""
+    pixels = np.asarray(img.convert("RGB"), dtype=np.uint8).reshape(-1, 3) // (256 // levels)
+    bins = (pixels[:, 0].astype(np.int32) * levels + pixels[:, 1]) * levels + pixels[:, 2]
+    hist = np.bincount(bins, minlength=levels ** 3).astype(np.float32)
+    return hist / max(hist.sum(), 1.0)
+
+
+def _decode(image_bytes: bytes, size: int) -> Tuple[Image.Image, Dict[str, Any]]:
+    """Check the upload caps, then decode it at reduced scale, no smaller
+    than ``size`` on the longest side where the format allows."""
+    if len(image_bytes) > MAX_UPLOAD_BYTES:
+        raise ValueError(f"Image is {len(image_bytes) // 1024} KB; the limit is {MAX_UPLOAD_BYTES // 1024} KB")
+    img = Image.open(io.BytesIO(image_bytes))
+    width, height = img.size
+    if width * height > MAX_IMAGE_PIXELS:
+        raise ValueError(f"Image is {width}x{height}; the limit is {MAX_IMAGE_PIXELS} pixels")
+    fmt = img.format
+    full_bytes = width * height * len(img.getbands())
+    # JPEGs are decoded at reduced scale; other formats are decoded in full.
+    img.draft("RGB", (size, size))
+    img.load()
+    decoded_bytes = img.width * img.height * len(img.getbands())
+    stats = {
+        "format": fmt,
+        "source_size": [width, height],
+        "upload_kb": round(len(image_bytes) / 1024, 1),
+        "decoded_kb": round(decoded_bytes / 1024, 1),
+        "full_decode_kb": round(full_bytes / 1024, 1),
+    }
+    return img, stats
+
+
+def _features(img: Image.Image, stats: Dict[str, Any], start: float) -> ImageFeatures:
+    """Hashes and histogram of a decoded upload, shrunk to ``WORK_SIZE`` first.
+
+    ``img`` itself is left as is: the image store may still be making
+    thumbnails from it.
+    """
+    import imagehash
+
+    img = img.convert("RGB") if img.mode not in ("RGB", "L") else img.copy()
+    img.thumbnail((WORK_SIZE, WORK_SIZE), Image.Resampling.BILINEAR)
+    img = img.convert("RGB")
+    gray = img.convert("L")
+
+    stats["decoded_size"] = [img.width, img.height]
+    features = ImageFeatures(
+        phash=str(imagehash.phash(gray)),
+        dhash=str(imagehash.dhash(gray)),
+        color_hist=color_histogram(img),
+        stats=stats,
+    )
+    stats["ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return features
+
+
+def prepare_image(image_bytes: bytes) -> Tuple[ImageFeatures, str]:
+    """Features and image-store digest of an upload: all of a report's
+    CPU-bound image work, picklable so it can run in a worker process.
+
+    The upload is decoded once, at the scale of the largest thumbnail, and
+    both the thumbnails and the features are made from that bitmap. It is
+    decoded at that scale even when already stored, so an image always
+    gets the same hashes. The features' ``stats`` report the source and
+    decoded dimensions, the bytes held by the decoded bitmap against what
+    a full decode would have needed, and the elapsed time.
+    """
+    start = time.perf_counter()
+    store = get_image_store()
+    img, stats = _decode(image_bytes, max(WORK_SIZE, *store.sizes))
+    digest = store.put(image_bytes, decoded=img)
+    return _features(img, stats, start), digest
@@ -0,0 +1,113 @@
+"""Logging for the app, the workers and the CLIs.
+
+Everything logs under the ``lostfound`` logger. Records go through a
+queue to a background listener, so the thread that logs never blocks on
+stdout. The listener writes to stdout at ``LOG_LEVEL`` and keeps the last
+``LOG_RING_SIZE`` records in a ring buffer that ``recent()`` returns on
+demand; ``LOG_RING_LEVEL`` lets the ring hold more detail than the console.
+
+Per-candidate traces in hot loops should use ``Sampler`` and check
+``tracing()`` once, before the loop starts.
+"""
+import atexit
+import logging
+import logging.handlers
+import math
+import os
+import queue
+import random
+import sys
+import threading
+from collections import deque
+from typing import List, Optional
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Fraction of per-candidate traces kept when DEBUG is on.
+TRACE_SAMPLE_RATE = float(os.getenv("LOG_TRACE_SAMPLE_RATE", "0.01"))
+RING_SIZE = int(os.getenv("LOG_RING_SIZE", "2000"))
+FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+
+ROOT = "lostfound"
+
+
+class RingBufferHandler(logging.Handler):
+    """Keeps the most recent formatted records in memory."""
+
+    def __init__(self, capacity: int = RING_SIZE):
+        super().__init__(logging.DEBUG)
+        self.records: deque = deque(maxlen=capacity)
+
+    def emit(self, record: logging.LogRecord):
+        self.records.append(self.format(record))
+
+
+class Sampler:
+    """Lets through roughly ``rate`` of the calls; ``rate`` 0 disables, 1 keeps all.
+
+    Gaps between kept calls are drawn from a geometric distribution, so
+    the common "skip" path is a single decrement.
+    """
+
+    def __init__(self, rate: float = TRACE_SAMPLE_RATE, seed: Optional[int] = None):
+        self.rate = rate
+        self._random = random.Random(seed)
+        self._countdown = self._gap()
+
+    def _gap(self) -> int:
+        if self.rate >= 1.0:
+            return 1
+        if self.rate <= 0.0:
+            return sys.maxsize
+        return int(math.log(1.0 - self._random.random()) / math.log(1.0 - self.rate)) + 1
+
+    def __call__(self) -> bool:
+        self._countdown -= 1
+        if self._countdown > 0:
+            return False
+        self._countdown = self._gap()
+        return True
+
+
+ring = RingBufferHandler()
+_listener: Optional[logging.handlers.QueueListener] = None
+_lock = threading.Lock()
+
+
+def configure(level: str = LOG_LEVEL):
+    """Install the queue, stdout and ring-buffer handlers once per process."""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return
+        formatter = logging.Formatter(FORMAT)
+        console = logging.StreamHandler(sys.stdout)
+        console.setLevel(level)
+        console.setFormatter(formatter)
+        ring.setFormatter(formatter)
+        records: queue.SimpleQueue = queue.SimpleQueue()
+        _listener = logging.handlers.QueueListener(records, console, ring, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+        root = logging.getLogger(ROOT)
+        root.addHandler(logging.handlers.QueueHandler(records))
+        ring_level = os.getenv("LOG_RING_LEVEL", level).upper()
+        ring.setLevel(ring_level)
+        # Records below both levels are never even created.
+        root.setLevel(min(logging.getLevelName(level), logging.getLevelName(ring_level)))
+        root.propagate = False
+
+
+def get_logger(name: str) -> logging.Logger:
+    configure()
+    return logging.getLogger(f"{ROOT}.{name}")
+
+
+def tracing(logger: logging.Logger) -> bool:
+    """Whether sampled per-candidate DEBUG traces would be kept at all."""
+    return TRACE_SAMPLE_RATE > 0 and logger.isEnabledFor(logging.DEBUG)
+
+
+def recent(limit: Optional[int] = None) -> List[str]:
+    """The newest ``limit`` buffered log lines, oldest first."""
+    lines = list(ring.records)
+    return lines[-limit:] if limit else lines
@@ -0,0 +1,72 @@
+import re
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+
+class MaskPolicy(NamedTuple):
+    """How much of a contact stays readable after masking."""
+    phone_visible_digits: int = 4
+    email_visible_chars: int = 1
+    show_email_domain: bool = True
+    mask_char: str = "*"
+
+
+POLICIES = {
+    "default": MaskPolicy(),
+    "strict": MaskPolicy(phone_visible_digits=2, email_visible_chars=0, show_email_domain=False),
+    "minimal": MaskPolicy(phone_visible_digits=6, email_visible_chars=3),
+}
+
+_EMAIL_RE = re.compile(r"^([A-Za-z0-9._%+\-]+)@([A-Za-z0-9.\-]+\.[A-Za-z]{2,})$")
+# Digits with the usual separators, optionally an international '+' prefix.
+_PHONE_RE = re.compile(r"^\+?[\d\s().\-]+$")
+_SCHEME_RE = re.compile(r"^(whatsapp:|tel:|sms:)", re.IGNORECASE)
+
+
+def mask_email(email: str, policy: MaskPolicy = POLICIES["default"]) -> Optional[str]:
+    m = _EMAIL_RE.match(email)
+    if not m:
+        return None
+    local, domain = m.groups()
+    visible = min(policy.email_visible_chars, max(len(local) - 1, 0))
+    masked_local = local[:visible] + policy.mask_char * max(len(local) - visible, 3)
+    if policy.show_email_domain:
+        return f"{masked_local}@{domain}"
+    tld = domain.rsplit(".", 1)[-1]
+    return f"{masked_local}@{policy.mask_char * 3}.{tld}"
+
+
+def mask_phone(phone: str, policy: MaskPolicy = POLICIES["default"]) -> Optional[str]:
+    if not _PHONE_RE.match(phone):
+        return None
+    total = sum(ch.isdigit() for ch in phone)
+    # E.164 allows at most 15 digits; fewer than 7 is not a dialable number.
+    if not 7 <= total <= 15:
+        return None
+    keep_from = total - min(policy.phone_visible_digits, total - 3)
+    out, seen = [], 0
+    for ch in phone:
+        if ch.isdigit():
+            out.append(ch if seen >= keep_from else policy.mask_char)
+            seen += 1
+        else:
+            out.append(ch)
+    return "".join(out)
+
+
+@lru_cache(maxsize=4096)
+def mask_contact(contact: str, policy: MaskPolicy = POLICIES["default"]) -> Optional[str]:
+    """Mask a phone number or email address deterministically.
+
+    Returns None when the string is neither, so the caller can decide on a
+    fallback for unusual formats.
+    """
+    contact = (contact or "").strip()
+    if not contact:
+        return ""
+    scheme = ""
+    m = _SCHEME_RE.match(contact)
+    if m:
+        scheme, contact = m.group(1), contact[m.end():].strip()
+    masked = mask_email(contact, policy) if "@" in contact else mask_phone(contact, policy)
+    return scheme + masked if masked is not None else None
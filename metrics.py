@@ -0,0 +1,151 @@
+"""In-process latency spans and counters for the pipeline.
+
+Spans keep their most recent samples per stage (for p50/p95/p99) plus a
+running count and sum; counters are monotonic totals with optional labels.
+Both can be read as a JSON-able snapshot or as Prometheus text, which
+``serve()`` exposes over HTTP when ``METRICS_PORT`` is set.
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from logs import get_logger, recent
+
+SAMPLE_WINDOW = int(os.getenv("METRICS_WINDOW", "2048"))
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+PREFIX = "lostfound"
+QUANTILES = (0.5, 0.95, 0.99)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Metrics:
+    def __init__(self, window: int = SAMPLE_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples: Dict[str, deque] = {}
+        self._totals: Dict[str, list] = {}
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+
+    def observe(self, stage: str, ms: float):
+        with self._lock:
+            samples = self._samples.get(stage)
+            if samples is None:
+                samples = self._samples[stage] = deque(maxlen=self.window)
+                self._totals[stage] = [0, 0.0]
+            samples.append(ms)
+            totals = self._totals[stage]
+            totals[0] += 1
+            totals[1] += ms
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    @contextmanager
+    def span(self, stage: str, timings: Optional[Dict[str, float]] = None):
+        """Time the block; also store the milliseconds in ``timings[stage]`` if given."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            ms = (time.perf_counter() - start) * 1000
+            if timings is not None:
+                timings[stage] = round(ms, 1)
+            self.observe(stage, ms)
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            samples = {stage: np.fromiter(s, dtype=np.float64) for stage, s in self._samples.items()}
+            totals = {stage: tuple(t) for stage, t in self._totals.items()}
+            counters = dict(self._counters)
+        stages = {}
+        for stage, values in samples.items():
+            count, total = totals[stage]
+            p50, p95, p99 = np.percentile(values, [q * 100 for q in QUANTILES])
+            stages[stage] = {
+                "count": count, "mean_ms": round(total / count, 2),
+                "p50_ms": round(p50, 2), "p95_ms": round(p95, 2), "p99_ms": round(p99, 2),
+            }
+        out_counters: Dict[str, Dict[str, float]] = {}
+        for (name, labels), value in sorted(counters.items()):
+            label_text = ",".join(f"{k}={v}" for k, v in labels) or "total"
+            out_counters.setdefault(name, {})[label_text] = value
+        return {"stages": stages, "counters": out_counters}
+
+    def render_prometheus(self) -> str:
+        with self._lock:
+            samples = {stage: np.fromiter(s, dtype=np.float64) for stage, s in self._samples.items()}
+            totals = {stage: tuple(t) for stage, t in self._totals.items()}
+            counters = dict(self._counters)
+        lines = [f"# TYPE {PREFIX}_stage_ms summary"]
+        for stage, values in sorted(samples.items()):
+            for q, v in zip(QUANTILES, np.percentile(values, [q * 100 for q in QUANTILES])):
+                lines.append(f'{PREFIX}_stage_ms{{stage="{stage}",quantile="{q}"}} {v:.3f}')
+            count, total = totals[stage]
+            lines.append(f'{PREFIX}_stage_ms_count{{stage="{stage}"}} {count}')
+            lines.append(f'{PREFIX}_stage_ms_sum{{stage="{stage}"}} {total:.3f}')
+        seen = set()
+        for (name, labels), value in sorted(counters.items()):
+            if name not in seen:
+                lines.append(f"# TYPE {PREFIX}_{name}_total counter")
+                seen.add(name)
+            label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+            lines.append(f"{PREFIX}_{name}_total{{{label_text}}} {value:g}" if label_text
+                         else f"{PREFIX}_{name}_total {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._totals.clear()
+            self._counters.clear()
+
+
+METRICS = Metrics()
+span = METRICS.span
+inc = METRICS.inc
+
+
+# ---------- HTTP endpoint ----------
+_server: Optional[ThreadingHTTPServer] = None
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith("/metrics.json"):
+            body, ctype = json.dumps(METRICS.snapshot()).encode(), "application/json"
+        elif self.path.startswith("/metrics"):
+            body, ctype = METRICS.render_prometheus().encode(), "text/plain; version=0.0.4"
+        elif self.path.startswith("/logs"):
+            body, ctype = "\n".join(recent()).encode(), "text/plain; charset=utf-8"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(port: int = METRICS_PORT, host: str = "127.0.0.1") -> Optional[ThreadingHTTPServer]:
+    """Serve /metrics (Prometheus text), /metrics.json and /logs (the log ring
+    buffer) on a daemon thread, once per process."""
+    global _server
+    if _server is None and port:
+        _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+        get_logger("metrics").info("serving on http://%s:%s/metrics", host, port)
+    return _server
@@ -0,0 +1,271 @@
+import hashlib
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence
+from xml.sax.saxutils import escape
+
+import db
+from logs import get_logger
+from metrics import inc, span
+
+CHANNELS = ("sms", "whatsapp", "call")
+CHANNEL_LABELS = {"sms": "SMS", "whatsapp": "WhatsApp", "call": "Call"}
+
+log = get_logger("outbox")
+
+# Sends per second allowed on each channel; Twilio long-code numbers take ~1 SMS/s.
+CHANNEL_RATES = {
+    "sms": float(os.getenv("OUTBOX_RATE_SMS", "1")),
+    "whatsapp": float(os.getenv("OUTBOX_RATE_WHATSAPP", "5")),
+    "call": float(os.getenv("OUTBOX_RATE_CALL", "1")),
+}
+MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+RETRY_BASE_SECONDS = float(os.getenv("OUTBOX_RETRY_BASE", "2"))
+# A row left 'sending' this long was claimed by a dispatcher that died
+# mid-send; a live one finishes (or records a failure) well within it.
+CLAIM_TIMEOUT_SECONDS = float(os.getenv("OUTBOX_CLAIM_TIMEOUT", "300"))
+
+# A sender delivers one message and returns the provider's id (e.g. Twilio SID).
+Sender = Callable[[str, str], str]
+
+# ---------- Twilio senders ----------
+def base_url_http_client(base_url: str, **kwargs):
+    """Twilio HTTP client that sends requests to another host, e.g. a local stub."""
+    from twilio.http.http_client import TwilioHttpClient
+
+    base_url = base_url.rstrip("/")
+
+    class BaseUrlHttpClient(TwilioHttpClient):
+        def request(self, method, url, *args, **kw):
+            if url.startswith("https://api.twilio.com"):
+                url = base_url + url[len("https://api.twilio.com"):]
+            return super().request(method, url, *args, **kw)
+
+    return BaseUrlHttpClient(**kwargs)
+
+def twilio_senders(client, sms_from: str, whatsapp_from: str) -> Dict[str, Sender]:
+    def sms(to_number: str, body: str) -> str:
+        return client.messages.create(body=body, from_=sms_from, to=to_number).sid
+
+    def whatsapp(to_number: str, body: str) -> str:
+        return client.messages.create(
+            body=body, from_=f"whatsapp:{whatsapp_from}", to=f"whatsapp:{to_number}"
+        ).sid
+
+    def call(to_number: str, body: str) -> str:
+        return client.calls.create(
+            twiml=f'<Response><Say voice="alice">{escape(body)}</Say></Response>',
+            from_=sms_from,
+            to=to_number
+        ).sid
+
+    return {"sms": sms, "whatsapp": whatsapp, "call": call}
+
+# ---------- Outbox table ----------
+def init_outbox():
+    with db.get_pool().transaction(immediate=True) as conn:
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS notification_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            idempotency_key TEXT NOT NULL UNIQUE,
+            channel TEXT NOT NULL,
+            to_number TEXT NOT NULL,
+            body TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL,
+            provider_id TEXT,
+            last_error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at REAL
+        )""")
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_outbox_due ON notification_outbox (status, next_attempt_at)"
+        )
+
+def idempotency_key(to_number: str, body: str, channel: str) -> str:
+    return hashlib.sha256(f"{channel}\0{to_number}\0{body}".encode("utf-8")).hexdigest()
+
+def enqueue_notification(to_number: str, body: str, channels: Sequence[str] = CHANNELS,
+                         key: Optional[str] = None) -> Dict[str, str]:
+    """Queue one message per channel and return immediately.
+
+    ``key`` identifies the logical notification; re-enqueueing the same key
+    (or, by default, the same recipient and text) is a no-op, so retries of
+    the surrounding request never notify anyone twice.
+    """
+    now = time.time()
+    rows = []
+    for channel in channels:
+        if channel not in CHANNELS:
+            raise ValueError(f"Unknown channel {channel!r}")
+        row_key = f"{key}:{channel}" if key else idempotency_key(to_number, body, channel)
+        rows.append((row_key, channel, to_number, body, now, now))
+    with db.get_pool().transaction(immediate=True) as conn:
+        conn.executemany("""INSERT OR IGNORE INTO notification_outbox
+            (idempotency_key, channel, to_number, body, next_attempt_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)""", rows)
+    if _dispatcher is not None:
+        _dispatcher.wake()
+    return {channel: f"⏳ {CHANNEL_LABELS[channel]} queued" for channel in channels}
+
+def outbox_counts() -> Dict[str, int]:
+    with db.get_pool().connection() as conn:
+        return dict(conn.execute("SELECT status, COUNT(*) FROM notification_outbox GROUP BY status").fetchall())
+
+# ---------- Dispatcher ----------
+class RateLimiter:
+    """Token bucket; ``acquire`` blocks until a send is allowed."""
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self._tokens = self.burst
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+                self._stamp = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                wait = (1.0 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class NotificationDispatcher:
+    """Background worker pool that drains ``notification_outbox``.
+
+    A polling thread claims due rows (only as many as there are free
+    workers), and the pool sends them concurrently under per-channel rate
+    limits. Failures are retried with exponential backoff and jitter until
+    MAX_ATTEMPTS, after which the row is marked failed.
+    """
+
+    def __init__(self, senders: Dict[str, Sender], workers: int = 8,
+                 rates: Optional[Dict[str, float]] = None, poll_interval: float = 1.0):
+        self.senders = senders
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.limiters = {ch: RateLimiter(rate) for ch, rate in (rates or CHANNEL_RATES).items()}
+        self._slots = threading.Semaphore(workers)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "NotificationDispatcher":
+        global _dispatcher
+        self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="outbox")
+        self._thread = threading.Thread(target=self._run, name="outbox-poller", daemon=True)
+        self._thread.start()
+        _dispatcher = self
+        return self
+
+    def stop(self, wait: bool = True):
+        global _dispatcher
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join()
+        if self._pool:
+            self._pool.shutdown(wait=wait)
+        if _dispatcher is self:
+            _dispatcher = None
+
+    def wake(self):
+        self._wake.set()
+
+    def _claim(self, limit: int) -> List[tuple]:
+        now = time.time()
+        with db.get_pool().transaction(immediate=True) as conn:
+            # Claims are leases: rows whose claim expired go back in the queue.
+            # Rows other dispatchers are still sending are left alone.
+            expired = conn.execute(
+                "UPDATE notification_outbox SET status = 'pending', updated_at = ? "
+                "WHERE status = 'sending' AND updated_at < ?", (now, now - CLAIM_TIMEOUT_SECONDS)
+            ).rowcount
+            if expired:
+                log.warning("requeued %d notifications whose claim expired", expired)
+                inc("outbox_claims_expired", expired)
+            rows = conn.execute("""SELECT id, channel, to_number, body, attempts FROM notification_outbox
+                WHERE status = 'pending' AND next_attempt_at <= ?
+                ORDER BY next_attempt_at LIMIT ?""", (now, limit)).fetchall()
+            conn.executemany(
+                "UPDATE notification_outbox SET status = 'sending', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                [(now, row[0]) for row in rows]
+            )
+        return rows
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            # Block for one free worker, then grab any others that are idle.
+            if not self._slots.acquire(timeout=self.poll_interval):
+                continue
+            free = 1
+            while free < self.workers and self._slots.acquire(blocking=False):
+                free += 1
+            try:
+                rows = self._claim(free)
+            except Exception as e:
+                log.error("claim failed: %s", e)
+                rows = []
+            for _ in range(free - len(rows)):
+                self._slots.release()
+            for row in rows:
+                self._pool.submit(self._deliver, *row)
+            if not rows:
+                self._wake.wait(self.poll_interval)
+
+    def _deliver(self, row_id: int, channel: str, to_number: str, body: str, attempts: int):
+        try:
+            sender = self.senders.get(channel)
+            try:
+                if sender is None:
+                    raise RuntimeError(f"No sender configured for {channel}")
+                limiter = self.limiters.get(channel)
+                if limiter:
+                    limiter.acquire()
+                with span("twilio_send"):
+                    provider_id = sender(to_number, body)
+            except Exception as e:
+                inc("twilio_calls", channel=channel, outcome="error")
+                self._record_failure(row_id, attempts + 1, e)
+            else:
+                inc("twilio_calls", channel=channel, outcome="sent")
+                self._update(row_id, "UPDATE notification_outbox SET status = 'sent', provider_id = ?, "
+                             "last_error = NULL, updated_at = ? WHERE id = ?", (provider_id, time.time(), row_id))
+        finally:
+            self._slots.release()
+            self._wake.set()
+
+    def _record_failure(self, row_id: int, attempts: int, error: Exception):
+        now = time.time()
+        if attempts >= MAX_ATTEMPTS:
+            self._update(row_id, "UPDATE notification_outbox SET status = 'failed', last_error = ?, "
+                         "updated_at = ? WHERE id = ?", (str(error), now, row_id))
+            return
+        delay = RETRY_BASE_SECONDS * (2 ** (attempts - 1)) * random.uniform(0.5, 1.5)
+        self._update(row_id, "UPDATE notification_outbox SET status = 'pending', last_error = ?, "
+                     "next_attempt_at = ?, updated_at = ? WHERE id = ?", (str(error), now + delay, now, row_id))
+
+    @staticmethod
+    def _update(row_id: int, sql: str, params: tuple):
+        try:
+            with db.get_pool().transaction(immediate=True) as conn:
+                conn.execute(sql, params)
+        except Exception as e:
+            log.error("could not update row %s: %s", row_id, e)
+
+
+_dispatcher: Optional[NotificationDispatcher] = None
@@ -0,0 +1,96 @@
+import threading
+from functools import lru_cache
+from itertools import combinations
+from typing import Dict, List, Optional, Set, Tuple
+
+BANDS = 4
+BAND_BITS = 16
+BAND_MASK = (1 << BAND_BITS) - 1
+
+
+@lru_cache(maxsize=None)
+def _band_probes(radius: int) -> Tuple[int, ...]:
+    """All 16-bit XOR masks with at most ``radius`` bits set."""
+    masks = []
+    for r in range(min(radius, BAND_BITS) + 1):
+        for bits in combinations(range(BAND_BITS), r):
+            m = 0
+            for b in bits:
+                m |= 1 << b
+            masks.append(m)
+    return tuple(masks)
+
+
+def _bands(value: int) -> List[int]:
+    return [(value >> (i * BAND_BITS)) & BAND_MASK for i in range(BANDS)]
+
+
+class PHashIndex:
+    """Multi-index hashing over four 16-bit bands of 64-bit perceptual hashes.
+
+    Two hashes within Hamming distance ``d`` must agree to within ``d // 4``
+    bits on at least one band (pigeonhole), so a radius query only probes the
+    band buckets near the query instead of scanning every stored hash.
+    """
+
+    def __init__(self):
+        self._hashes: Dict[int, int] = {}
+        self._tables: List[Dict[int, Set[int]]] = [{} for _ in range(BANDS)]
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def __contains__(self, item_id: int) -> bool:
+        return item_id in self._hashes
+
+    def add(self, item_id: int, phash: int):
+        with self._lock:
+            if item_id in self._hashes:
+                self.remove(item_id)
+            self._hashes[item_id] = phash
+            for table, band in zip(self._tables, _bands(phash)):
+                table.setdefault(band, set()).add(item_id)
+
+    def remove(self, item_id: int) -> bool:
+        with self._lock:
+            phash = self._hashes.pop(item_id, None)
+            if phash is None:
+                return False
+            for table, band in zip(self._tables, _bands(phash)):
+                bucket = table.get(band)
+                if bucket is not None:
+                    bucket.discard(item_id)
+                    if not bucket:
+                        del table[band]
+            return True
+
+    def search(self, phash: int, max_distance: int) -> List[Tuple[int, int]]:
+        """Return ``(item_id, distance)`` for every hash with distance <= max_distance."""
+        if max_distance < 0:
+            return []
+        probes = _band_probes(max_distance // BANDS)
+        candidates: Set[int] = set()
+        with self._lock:
+            for table, band in zip(self._tables, _bands(phash)):
+                if len(probes) > len(table):
+                    # Sparse table: cheaper to test each occupied bucket.
+                    for key, bucket in table.items():
+                        if (key ^ band).bit_count() <= max_distance // BANDS:
+                            candidates |= bucket
+                else:
+                    for mask in probes:
+                        bucket = table.get(band ^ mask)
+                        if bucket:
+                            candidates |= bucket
+            hashes = self._hashes
+            hits = []
+            for item_id in candidates:
+                dist = (hashes[item_id] ^ phash).bit_count()
+                if dist <= max_distance:
+                    hits.append((item_id, dist))
+        hits.sort(key=lambda t: (t[1], t[0]))
+        return hits
+
+    def get(self, item_id: int) -> Optional[int]:
+        return self._hashes.get(item_id)
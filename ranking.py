@@ -0,0 +1,142 @@
+import os
+from typing import Any, Callable, Collection, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from embedding_index import EmbeddingIndex, normalize
+from metrics import inc
+from phash_index import PHashIndex
+
+PHASH_BITS = 64
+# A place/time pre-filter smaller than this share of the index is scored
+# directly; a larger one only filters the regular index results.
+PREFILTER_MAX_FRACTION = float(os.getenv("PREFILTER_MAX_FRACTION", "0.1"))
+
+
+class RankingWeights(NamedTuple):
+    """Tunables for the fused match score.
+
+    A candidate is eligible when either signal clears its threshold (the
+    original ``sim > 0.6 or phash_diff < 20`` rule); eligible candidates are
+    then ordered by ``text * cosine + image * (1 - hamming / 64)``.
+    """
+    text: float = 0.6
+    image: float = 0.4
+    min_text_similarity: float = 0.6
+    max_phash_distance: int = 19
+
+
+DEFAULT_WEIGHTS = RankingWeights(
+    text=float(os.getenv("RANK_TEXT_WEIGHT", "0.6")),
+    image=float(os.getenv("RANK_IMAGE_WEIGHT", "0.4")),
+)
+
+
+def _reasons(sim: Optional[float], dist: Optional[int], weights: RankingWeights) -> List[str]:
+    reasons = []
+    if sim is not None:
+        label = "Strong" if sim > weights.min_text_similarity else "Weak"
+        reasons.append(f"{label} description similarity ({sim:.2f})")
+    if dist is not None:
+        label = "Similar" if dist <= weights.max_phash_distance else "Different"
+        reasons.append(f"{label} image (hash distance {dist}/{PHASH_BITS})")
+    return reasons
+
+
+def _subset_hits(embedding: Optional[Sequence[float]], phash: Optional[int], allowed: Collection[int],
+                 embedding_index: EmbeddingIndex, phash_index: PHashIndex,
+                 weights: RankingWeights) -> Tuple[Dict[int, float], Dict[int, int]]:
+    """The index searches' thresholds applied to the ``allowed`` items only."""
+    sim_hits: Dict[int, float] = {}
+    query = normalize(embedding) if embedding is not None else None
+    if query is not None:
+        ids, vecs = [], []
+        for item_id in allowed:
+            vec = embedding_index.get(item_id)
+            if vec is not None and vec.size == query.size:
+                ids.append(item_id)
+                vecs.append(vec)
+        if vecs:
+            scores = np.stack(vecs) @ query
+            sim_hits = {i: float(sc) for i, sc in zip(ids, scores) if sc > weights.min_text_similarity}
+    dist_hits: Dict[int, int] = {}
+    if phash is not None:
+        for item_id in allowed:
+            stored = phash_index.get(item_id)
+            if stored is not None:
+                dist = (stored ^ phash).bit_count()
+                if dist <= weights.max_phash_distance:
+                    dist_hits[item_id] = dist
+    return sim_hits, dist_hits
+
+
+def rank_candidates(embedding: Optional[Sequence[float]], phash: Optional[int],
+                    embedding_index: EmbeddingIndex, phash_index: PHashIndex,
+                    fetch_items: Callable[[List[int]], List[Dict[str, Any]]],
+                    weights: RankingWeights = DEFAULT_WEIGHTS,
+                    limit: Optional[int] = None,
+                    allowed: Optional[Collection[int]] = None) -> List[Dict[str, Any]]:
+    """Score index candidates locally and return match records, best first.
+
+    ``allowed`` (from the place/time pre-filter) restricts matching to
+    those ids; when it is small they are scored directly instead of
+    searching the whole index.
+
+    Records carry ``id/type/title/description/score/reasons/owner_contact/image_sha256``,
+    the shape the results page renders.
+    """
+    if allowed is not None and len(allowed) <= PREFILTER_MAX_FRACTION * max(len(embedding_index), len(phash_index)):
+        sim_hits, dist_hits = _subset_hits(embedding, phash, allowed, embedding_index, phash_index, weights)
+    else:
+        sim_hits = dict(embedding_index.search(embedding, min_score=weights.min_text_similarity)) \
+            if embedding is not None else {}
+        dist_hits = dict(phash_index.search(phash, weights.max_phash_distance)) if phash is not None else {}
+        if allowed is not None:
+            sim_hits = {i: v for i, v in sim_hits.items() if i in allowed}
+            dist_hits = {i: v for i, v in dist_hits.items() if i in allowed}
+    candidate_ids = sim_hits.keys() | dist_hits.keys()
+    inc("match_candidates", len(candidate_ids))
+    if not candidate_ids:
+        return []
+
+    query = normalize(embedding) if embedding is not None else None
+    scored = []
+    for item_id in candidate_ids:
+        sim = sim_hits.get(item_id)
+        if sim is None and query is not None:
+            # Image-only hit: still fold its text similarity into the score.
+            vec = embedding_index.get(item_id)
+            if vec is not None and vec.size == query.size:
+                sim = float(vec @ query)
+        dist = dist_hits.get(item_id)
+        if dist is None and phash is not None:
+            stored = phash_index.get(item_id)
+            if stored is not None:
+                dist = (stored ^ phash).bit_count()
+        score = weights.text * max(sim or 0.0, 0.0)
+        if dist is not None:
+            score += weights.image * (1.0 - dist / PHASH_BITS)
+        scored.append((score, item_id, sim, dist))
+
+    scored.sort(key=lambda t: (-t[0], t[1]))
+    if limit is not None:
+        scored = scored[:limit]
+    items = {item["id"]: item for item in fetch_items([item_id for _, item_id, _, _ in scored])}
+    records = []
+    for score, item_id, sim, dist in scored:
+        item = items.get(item_id)
+        if item is None:
+            continue
+        records.append({
+            "id": item_id,
+            "type": item["type"],
+            "title": item["title"],
+            "description": item["description"],
+            "score": round(float(np.clip(score, 0.0, 1.0)), 4),
+            "reasons": _reasons(sim, dist, weights),
+            "owner_contact": item["owner_contact"],
+            "image_sha256": item.get("image_sha256"),
+            "text_similarity": sim,
+            "phash_distance": dist,
+        })
+    return records
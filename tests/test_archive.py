@@ -0,0 +1,79 @@
+import sqlite3
+from contextlib import contextmanager
+
+import pytest
+
+import db
+
+
+@pytest.fixture
+def hot_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "items.db"))
+    monkeypatch.setattr(db, "ARCHIVE_DB_PATH", str(tmp_path / "items.archive.db"))
+    db.init_db()
+    ids = db.insert_items([{"type": "lost" if i % 2 else "found", "title": f"item {i}", "description": ""}
+                           for i in range(1200)])
+    db.set_item_status(ids[:700], "closed")
+    yield ids
+    db.get_pool().close()
+
+
+def _ids(path: str) -> list:
+    conn = sqlite3.connect(path)
+    try:
+        return [r[0] for r in conn.execute("SELECT id FROM items")]
+    finally:
+        conn.close()
+
+
+def _crash_before_delete(monkeypatch):
+    """Make archive_items fail after committing the copy, before the delete."""
+    real = db.in_transaction
+    calls = []
+
+    @contextmanager
+    def flaky(conn, immediate=False):
+        calls.append(immediate)
+        if len(calls) == 2:
+            raise RuntimeError("crash between copy and delete")
+        with real(conn, immediate) as c:
+            yield c
+
+    monkeypatch.setattr(db, "in_transaction", flaky)
+
+
+def test_archive_moves_closed_items(hot_db):
+    moved = db.archive_items("2000-01-01")
+    assert sorted(i for i, _ in moved) == hot_db[:700]
+    assert sorted(_ids(db.archive_path())) == hot_db[:700]
+    assert sorted(_ids(db.DB_PATH)) == hot_db[700:]
+
+
+def test_rerun_after_crash_loses_and_duplicates_nothing(hot_db, monkeypatch):
+    with monkeypatch.context() as m:
+        _crash_before_delete(m)
+        with pytest.raises(RuntimeError):
+            db.archive_items("2000-01-01")
+    # The copy was committed, the delete was not: the rows are in both files.
+    assert sorted(_ids(db.archive_path())) == hot_db[:700]
+    assert sorted(_ids(db.DB_PATH)) == hot_db
+
+    db.archive_items("2000-01-01")
+    hot, archived = _ids(db.DB_PATH), _ids(db.archive_path())
+    assert sorted(hot) == hot_db[700:]
+    assert sorted(archived) == hot_db[:700]
+    assert db.count_archived() == 700
+
+
+def test_rows_reopened_after_crash_leave_the_archive(hot_db, monkeypatch):
+    with monkeypatch.context() as m:
+        _crash_before_delete(m)
+        with pytest.raises(RuntimeError):
+            db.archive_items("2000-01-01")
+    reopened = hot_db[:10]
+    db.set_item_status(reopened, "open")
+
+    moved = db.archive_items("2000-01-01")
+    assert sorted(i for i, _ in moved) == hot_db[10:700]
+    assert sorted(_ids(db.archive_path())) == hot_db[10:700]
+    assert sorted(_ids(db.DB_PATH)) == reopened + hot_db[700:]
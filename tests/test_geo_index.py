@@ -0,0 +1,81 @@
+import random
+
+import pytest
+
+from geo_index import DAY, ItemPlace, PlaceIndex, plausible
+
+T0 = 1.7e9
+# Dense spots, plus points next to both poles and on either side of the antimeridian.
+SPOTS = [(51.5, -0.12), (40.7, -74.0), (-33.9, 151.2), (0.0, 179.99), (0.0, -179.99),
+         (89.99, 10.0), (-89.97, -120.0), (64.0, 179.95)]
+VENUES = ["central station", "airport", "museum"]
+
+
+def _random_place(rng: random.Random) -> ItemPlace:
+    latitude = longitude = None
+    if rng.random() < 0.7:
+        lat, lon = rng.choice(SPOTS)
+        latitude = min(90.0, max(-90.0, lat + rng.uniform(-0.08, 0.08)))
+        longitude = (lon + rng.uniform(-0.1, 0.1) + 180) % 360 - 180
+    venue = rng.choice(VENUES + [None])
+    occurred_at = None if rng.random() < 0.2 else T0 + rng.uniform(0, 120) * DAY
+    return ItemPlace(latitude, longitude, venue, occurred_at)
+
+
+def _expected(places, query: ItemPlace, looking_for: str):
+    if looking_for == "found":
+        return {i for i, p in places.items() if plausible(query, p)}
+    return {i for i, p in places.items() if plausible(p, query)}
+
+
+@pytest.fixture
+def indexed():
+    rng = random.Random(3)
+    places = {i: _random_place(rng) for i in range(3000)}
+    index = PlaceIndex()
+    for i, p in places.items():
+        index.add(i, p)
+    return index, places, rng
+
+
+def _check(index, places, rng, queries: int = 300):
+    for _ in range(queries):
+        query = _random_place(rng)
+        for looking_for in ("found", "lost"):
+            got = index.candidates(query, looking_for)
+            assert (set(places) if got is None else got) == _expected(places, query, looking_for)
+
+
+def test_candidates_match_plausible(indexed):
+    _check(*indexed)
+
+
+def test_candidates_after_remove_and_move(indexed):
+    index, places, rng = indexed
+    for i in range(0, 3000, 7):
+        assert index.remove(i)
+        del places[i]
+    for i in range(1, 3000, 11):
+        places[i] = _random_place(rng)
+        index.add(i, places[i])
+    assert not index.remove(0)
+    assert len(index) == len(places)
+    _check(index, places, rng)
+
+
+def test_candidates_near_poles_and_antimeridian():
+    index = PlaceIndex(radius_km=5)
+    places = {
+        1: ItemPlace(89.99, 0.0), 2: ItemPlace(89.99, 180.0),    # ~2 km apart across the north pole
+        3: ItemPlace(10.0, 179.99), 4: ItemPlace(10.0, -179.99),  # ~2 km apart across the antimeridian
+        5: ItemPlace(10.0, 179.0),
+    }
+    for i, p in places.items():
+        index.add(i, p)
+    assert index.candidates(ItemPlace(89.995, 90.0), "found") == {1, 2}
+    assert index.candidates(ItemPlace(10.0, -179.995), "found") == {3, 4}
+
+
+def test_place_without_filters_is_unrestricted(indexed):
+    index, _, _ = indexed
+    assert index.candidates(ItemPlace(), "found") is None
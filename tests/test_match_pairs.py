@@ -0,0 +1,34 @@
+import pytest
+
+import db
+
+
+@pytest.fixture
+def pairs_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "items.db"))
+    db.init_db()
+    yield
+    db.get_pool().close()
+
+
+def _pairs():
+    with db.get_pool().connection() as conn:
+        return dict(((l, f), score) for l, f, score in
+                    conn.execute("SELECT lost_id, found_id, score FROM match_pairs"))
+
+
+def test_rescored_pair_takes_the_new_score(pairs_db):
+    assert db.record_match_pairs([(1, 2, 0.5, 0.4, 10)]) == {(1, 2)}
+    assert db.record_match_pairs([(1, 2, 0.9, 0.8, 3), (1, 3, 0.6, 0.5, None)]) == {(1, 3)}
+    assert _pairs() == {(1, 2): 0.9, (1, 3): 0.6}
+
+
+def test_prune_drops_only_unscored_pairs_of_the_given_items(pairs_db, monkeypatch):
+    clock = iter([100.0, 200.0])
+    monkeypatch.setattr(db.time, "time", lambda: next(clock))
+    db.record_match_pairs([(1, 2, 0.5, 0.4, 10), (1, 3, 0.5, 0.4, 10), (9, 2, 0.5, 0.4, 10)])
+    db.record_match_pairs([(1, 3, 0.7, 0.6, 5)])  # re-scored by the run starting at 150
+
+    assert db.prune_match_pairs(150.0, [1], [2, 3]) == 1
+    # (9, 2) involves a lost item the run did not see.
+    assert _pairs() == {(1, 3): 0.7, (9, 2): 0.5}
@@ -0,0 +1,116 @@
+import pytest
+
+import db
+import outbox
+from outbox import CLAIM_TIMEOUT_SECONDS, MAX_ATTEMPTS, RETRY_BASE_SECONDS, NotificationDispatcher
+
+T0 = 1.7e9
+
+
+class Clock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "outbox.db"))
+    outbox.init_outbox()
+    clock = Clock(T0)
+    monkeypatch.setattr(outbox.time, "time", clock)
+    yield clock
+    db.get_pool().close()
+
+
+def _dispatcher(sender) -> NotificationDispatcher:
+    # Not started: the tests claim and deliver by hand. Rate 0 means unlimited.
+    return NotificationDispatcher({ch: sender for ch in outbox.CHANNELS},
+                                  rates={ch: 0 for ch in outbox.CHANNELS})
+
+
+def _drain(dispatcher: NotificationDispatcher) -> int:
+    rows = dispatcher._claim(100)
+    for row in rows:
+        dispatcher._deliver(*row)
+    return len(rows)
+
+
+def _rows():
+    with db.get_pool().connection() as conn:
+        return conn.execute("SELECT idempotency_key, status, attempts, next_attempt_at FROM notification_outbox "
+                            "ORDER BY id").fetchall()
+
+
+def test_unacknowledged_claim_is_reclaimed_after_the_lease(clock):
+    outbox.enqueue_notification("+15550001", "hello", ["sms"], key="k")
+    dispatcher = _dispatcher(lambda to, body: "SM1")
+    assert len(dispatcher._claim(10)) == 1  # claimed, then the dispatcher "dies"
+    assert _rows()[0][1:3] == ("sending", 1)
+
+    clock.now += CLAIM_TIMEOUT_SECONDS - 1
+    assert dispatcher._claim(10) == []  # the lease is still live
+
+    clock.now += 2
+    rows = dispatcher._claim(10)
+    assert [r[0] for r in rows] == [1]
+    assert _rows()[0][1:3] == ("sending", 2)
+
+
+def test_failures_back_off_exponentially_then_fail(clock, monkeypatch):
+    monkeypatch.setattr(outbox.random, "uniform", lambda a, b: 1.0)  # no jitter
+
+    def failing(to, body):
+        raise RuntimeError("provider down")
+
+    outbox.enqueue_notification("+15550001", "hello", ["sms"], key="k")
+    dispatcher = _dispatcher(failing)
+    delays = []
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        assert _drain(dispatcher) == 1
+        _, status, attempts, next_attempt_at = _rows()[0]
+        assert attempts == attempt
+        if attempt < MAX_ATTEMPTS:
+            assert status == "pending"
+            delays.append(next_attempt_at - clock.now)
+            clock.now += 1
+            assert dispatcher._claim(10) == []  # not due yet
+            clock.now = next_attempt_at
+    assert status == "failed"
+    assert delays == pytest.approx([RETRY_BASE_SECONDS * 2 ** i for i in range(MAX_ATTEMPTS - 1)])
+
+
+def test_backoff_jitter_stays_within_half_to_one_and_a_half(clock, monkeypatch):
+    bounds = []
+
+    def extreme(a, b):
+        bounds.append((a, b))
+        return a if len(bounds) == 1 else b
+
+    monkeypatch.setattr(outbox.random, "uniform", extreme)
+    dispatcher = _dispatcher(None)
+    for key in ("a", "b"):
+        outbox.enqueue_notification("+15550001", key, ["sms"], key=key)
+        row_id = dispatcher._claim(10)[0][0]
+        dispatcher._record_failure(row_id, 1, RuntimeError("x"))
+    assert bounds == [(0.5, 1.5)] * 2
+    assert [r[3] - clock.now for r in _rows()] == pytest.approx([RETRY_BASE_SECONDS * 0.5, RETRY_BASE_SECONDS * 1.5])
+
+
+def test_repeated_key_is_sent_once(clock):
+    sent = []
+    dispatcher = _dispatcher(lambda to, body: sent.append((to, body)) or f"SM{len(sent)}")
+    for _ in range(3):
+        outbox.enqueue_notification("+15550001", "hello", ["sms", "whatsapp"], key="match:1:2")
+    # Without a key, the recipient and text are the key.
+    outbox.enqueue_notification("+15550002", "hi", ["sms"])
+    outbox.enqueue_notification("+15550002", "hi", ["sms"])
+    assert _drain(dispatcher) == 3
+    assert _drain(dispatcher) == 0
+
+    outbox.enqueue_notification("+15550001", "hello", ["sms", "whatsapp"], key="match:1:2")
+    assert _drain(dispatcher) == 0
+    assert len(sent) == 3
+    assert [r[1] for r in _rows()] == ["sent"] * 3
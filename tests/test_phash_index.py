@@ -0,0 +1,71 @@
+import random
+
+import pytest
+
+from phash_index import PHashIndex
+from utils import phash_hamming
+
+
+def _hex(value: int) -> str:
+    return f"{value:016x}"
+
+
+def _flip(value: int, rng: random.Random, bits: int) -> int:
+    for b in rng.sample(range(64), bits):
+        value ^= 1 << b
+    return value
+
+
+def _brute_force(hashes, query: int, max_distance: int):
+    hits = [(i, phash_hamming(_hex(h), _hex(query))) for i, h in hashes.items()]
+    return sorted((i, d) for i, d in hits if d <= max_distance)
+
+
+@pytest.fixture
+def indexed():
+    """2000 hashes: random ones plus clusters a few bits from a handful of centres."""
+    rng = random.Random(7)
+    centres = [rng.getrandbits(64) for _ in range(8)]
+    hashes = {}
+    for i in range(2000):
+        if i % 2:
+            hashes[i] = rng.getrandbits(64)
+        else:
+            hashes[i] = _flip(rng.choice(centres), rng, rng.randint(0, 24))
+    index = PHashIndex()
+    for i, h in hashes.items():
+        index.add(i, h)
+    return index, hashes, centres, rng
+
+
+@pytest.mark.parametrize("max_distance", [0, 3, 4, 8, 12, 19, 24, 40])
+def test_search_matches_brute_force(indexed, max_distance):
+    index, hashes, centres, rng = indexed
+    queries = [_flip(c, rng, rng.randint(0, 6)) for c in centres] + [rng.getrandbits(64) for _ in range(8)]
+    for query in queries:
+        assert sorted(index.search(query, max_distance)) == _brute_force(hashes, query, max_distance)
+
+
+def test_search_after_remove_and_readd(indexed):
+    index, hashes, centres, rng = indexed
+    for i in range(0, 2000, 3):
+        assert index.remove(i)
+        del hashes[i]
+    for i in range(1, 2000, 9):
+        hashes[i] = _flip(rng.choice(centres), rng, rng.randint(0, 8))
+        index.add(i, hashes[i])
+    assert not index.remove(0)
+    assert len(index) == len(hashes)
+    for query in centres:
+        assert sorted(index.search(query, 19)) == _brute_force(hashes, query, 19)
+
+
+def test_search_orders_by_distance_then_id(indexed):
+    index, _, centres, _ = indexed
+    hits = index.search(centres[0], 24)
+    assert hits == sorted(hits, key=lambda t: (t[1], t[0]))
+
+
+def test_negative_distance_finds_nothing(indexed):
+    index, hashes, _, _ = indexed
+    assert index.search(hashes[0], -1) == []
@@ -0,0 +1,73 @@
+import math
+
+import numpy as np
+
+# ---------- Vector math ----------
+def cosine_similarity(a: list, b: list) -> float:
+    dot = sum(x*y for x,y in zip(a,b))
+    norm_a = math.sqrt(sum(x*x for x in a))
+    norm_b = math.sqrt(sum(y*y for y in b))
+    if norm_a==0 or norm_b==0: return 0.0
+    return dot / (norm_a*norm_b)
+
+# ---------- Perceptual hashes ----------
+def phash_hamming(ph1: str, ph2: str) -> int:
+    return bin(int(ph1, 16) ^ int(ph2, 16)).count('1')
+
+def phash_to_int(ph: str) -> int:
+    return int(ph, 16)
+
+def phash_to_db(value: int) -> int:
+    """Map an unsigned 64-bit hash onto SQLite's signed INTEGER range."""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+def phash_from_db(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+# ---------- Embedding storage ----------
+# Every blob starts with a 4-byte tag so float32 payloads stay aligned and
+# np.frombuffer can view them without copying.
+_EMBEDDING_TAGS = {"float32": b"F32\0", "float16": b"F16\0", "int8": b"I8\0\0"}
+_EMBEDDING_FORMATS = {tag: fmt for fmt, tag in _EMBEDDING_TAGS.items()}
+EMBEDDING_FORMATS = tuple(_EMBEDDING_TAGS)
+
+def as_embedding_array(vec):
+    """Return ``vec`` as a flat float32 array, or None if it is empty or not numeric."""
+    if vec is None:
+        return None
+    try:
+        arr = np.asarray(vec, dtype=np.float32).ravel()
+    except (TypeError, ValueError):
+        return None
+    return arr if arr.size else None
+
+def encode_embedding(vec, fmt: str = "float32") -> bytes:
+    if fmt not in _EMBEDDING_TAGS:
+        raise ValueError(f"Unknown embedding format {fmt!r}; expected one of {EMBEDDING_FORMATS}")
+    arr = np.asarray(vec, dtype=np.float32).ravel()
+    tag = _EMBEDDING_TAGS[fmt]
+    if fmt == "float32":
+        return tag + arr.tobytes()
+    if fmt == "float16":
+        return tag + arr.astype(np.float16).tobytes()
+    # Symmetric per-vector quantization; the scale is stored after the tag.
+    peak = float(np.abs(arr).max()) if arr.size else 0.0
+    scale = peak / 127.0 if peak > 0 else 1.0
+    quantized = np.clip(np.rint(arr / scale), -127, 127).astype(np.int8)
+    return tag + np.float32(scale).tobytes() + quantized.tobytes()
+
+def decode_embedding(blob: bytes):
+    """Decode a blob from encode_embedding into a float32 array.
+
+    float32 blobs are returned as a read-only view over ``blob``; the other
+    formats have to be widened and therefore allocate.
+    """
+    fmt = _EMBEDDING_FORMATS.get(bytes(blob[:4]))
+    if fmt == "float32":
+        return np.frombuffer(blob, dtype=np.float32, offset=4)
+    if fmt == "float16":
+        return np.frombuffer(blob, dtype=np.float16, offset=4).astype(np.float32)
+    if fmt == "int8":
+        scale = np.frombuffer(blob, dtype=np.float32, count=1, offset=4)[0]
+        return np.frombuffer(blob, dtype=np.int8, offset=8).astype(np.float32) * scale
+    raise ValueError("Unrecognised embedding blob header")